@@ -1,12 +1,18 @@
 from audio.audio import AudioSupport
-from audio.midi_router import MIDIRouter, MIDIPort
+from audio.midi_router import MIDIRouter, MIDIPort, MIDISubscriber
+from audio.midi_filter import MIDIFilter
 from audio.midi_metronome import MIDIMetronome
 from audio.midi_parser import MIDIParser, MIDINote
 from audio.synth import Synth
 from audio.tuning import Tuning
-from audio.transforms import STFT, CZT
-from audio.input_device import SDInputDevice, PAInputDevice
+from audio.transforms import STFT, CZT, MultiBandCZT, YIN
+from audio.plan_cache import PlanCache
+from audio.input_device import SDInputDevice, PAInputDevice, GeneratorInputDevice, FileInputDevice
 from audio.fifo_queue import FIFOQueue
+from audio.metrics import Metrics, Histogram, JSONLinesSink, PrometheusSink
 
-__all__ = ["AudioSupport", "MIDIRouter", "MIDIPort", "MIDIMetronome", "MIDIParser", "MIDINote",
-           "Synth", "Tuning", "STFT", "CZT", "SDInputDevice", "PAInputDevice", "FIFOQueue"]
+__all__ = ["AudioSupport", "MIDIRouter", "MIDIPort", "MIDISubscriber", "MIDIFilter", "MIDIMetronome",
+           "MIDIParser", "MIDINote",
+           "Synth", "Tuning", "STFT", "CZT", "MultiBandCZT", "YIN", "PlanCache", "SDInputDevice", "PAInputDevice",
+           "GeneratorInputDevice", "FileInputDevice", "FIFOQueue",
+           "Metrics", "Histogram", "JSONLinesSink", "PrometheusSink"]
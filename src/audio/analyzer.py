@@ -0,0 +1,221 @@
+import csv
+import math
+import wave
+from pathlib import Path
+from multiprocessing import Pool
+from typing import Tuple, List
+
+import numpy as np
+
+from audio.tuner import Tuner, PitchEstimator
+from theory import Note
+
+# FLAC and the other formats are read with soundfile (libsndfile), WAV files do not need it
+try:
+    import soundfile
+except:
+    soundfile = None
+
+
+class AudioFileReader:
+    """
+    Reads an audio file frame by frame as mono float32 samples, the channels are averaged.
+    WAV files (PCM 8, 16, 24 and 32 bit) are read with the wave module.
+    The other formats, e.g. FLAC or float WAV, need the soundfile package.
+    """
+    WAV_SCALE = {1: 128.0, 2: 32768.0, 3: 8388608.0, 4: 2147483648.0}
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._wav = None
+        self._sf = None
+
+        try:
+            self._wav = wave.open(str(self.path), "rb")
+            self.sample_rate = self._wav.getframerate()
+            self.channel_cnt = self._wav.getnchannels()
+            self.sample_cnt = self._wav.getnframes()
+            self._sample_width = self._wav.getsampwidth()
+        except:
+            if self._wav is not None:
+                self._wav.close()
+                self._wav = None
+            if soundfile is None:
+                raise
+            self._sf = soundfile.SoundFile(str(self.path))
+            self.sample_rate = self._sf.samplerate
+            self.channel_cnt = self._sf.channels
+            self.sample_cnt = self._sf.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+        if self._sf is not None:
+            self._sf.close()
+
+    def frames(self, samples_per_frame, start_frame=0, frame_cnt=None):
+        """
+        Reads the whole frames, the incomplete frame at the end of the file is skipped.
+        :param samples_per_frame: samples per frame
+        :param start_frame: the first frame to read
+        :param frame_cnt: number of frames to read, None reads to the end of the file
+        :return: a generator of float32 arrays
+        """
+        total_cnt = self.sample_cnt // samples_per_frame - start_frame
+        frame_cnt = total_cnt if frame_cnt is None else min(frame_cnt, total_cnt)
+        self._seek(start_frame * samples_per_frame)
+
+        for _ in range(frame_cnt):
+            yield self._read(samples_per_frame)
+
+    def _seek(self, sample):
+        if self._wav is not None:
+            self._wav.setpos(sample)
+        else:
+            self._sf.seek(sample)
+
+    def _read(self, sample_cnt):
+        if self._sf is not None:
+            data = self._sf.read(sample_cnt, dtype="float32", always_2d=True)
+            return data.mean(axis=1, dtype=np.float32)
+
+        raw = self._wav.readframes(sample_cnt)
+        width = self._sample_width
+        if width == 1:
+            data = np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0
+        elif width == 3:
+            # little endian 24 bit samples are sign extended to 32 bit
+            b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            data = ((b[:, 0] << 8) | (b[:, 1] << 16) | (b[:, 2] << 24)) >> 8
+        else:
+            data = np.frombuffer(raw, dtype=np.int16 if width == 2 else np.int32)
+
+        data = data.reshape(-1, self.channel_cnt).astype(np.float32) / AudioFileReader.WAV_SCALE[width]
+        return data.mean(axis=1, dtype=np.float32)
+
+
+class Analyzer:
+    """
+    Offline tuning analysis of audio files.
+    The files are read frame by frame and passed through the same transform and peak logic as the live Tuner.
+    The long files are split into chunks and the chunks are processed in a pool of processes.
+    Every chunk starts with a fresh transform, so the STFT and YIN transforms warm up again at every chunk.
+    The noise floor of a chunk is measured on its first noise_s seconds, the frames pass threshold_db above it,
+    so the silence and the room tone do not make rows.  The floor might include a note, the threshold is
+    lower than the Tuner's: the noise peaks about 10 dB above its average, a tone over 20 dB.
+    The result is a list of rows (dicts) with the COLUMNS keys, one row per frame that has a note.
+    """
+    COLUMNS = ["file", "frame", "time_s", "freq_hz", "note", "midi", "cents"]
+    CHUNK_S = 60.0   # None keeps the files whole
+    NOISE_S = 5.0
+    THRESHOLD_DB = 18
+
+    def __init__(self, note_range: Tuple[str, str], samples_per_frame: int = Tuner.SAMPLES_PER_FRAME,
+                 freq_step: float = Tuner.FREQ_STEP, note_a_freq_hz: float = 440.0,
+                 transform_type: int = Tuner.TRANSFORM, estimator: PitchEstimator = None,
+                 chunk_s: float = CHUNK_S, process_cnt: int = None, noise_s: float = NOISE_S,
+                 threshold_db: float = THRESHOLD_DB):
+        """
+        :param note_range: a tuple of the lowest and the highest note, e.g. ("E2", "E6")
+        :param samples_per_frame: samples per frame, e.g. 8192
+        :param freq_step: resolution of the CZT transform, Hz
+        :param note_a_freq_hz: A4 frequency, Hz
+        :param transform_type: one of the Tuner transforms, e.g. Tuner.CZT_TRANSFORM
+        :param estimator: the pitch estimator, see Tuner
+        :param chunk_s: the files are split into the chunks of this length for the process pool, s
+        :param process_cnt: number of processes, None uses all the CPUs, 1 runs in this process
+        :param noise_s: the noise floor is measured on this many seconds at the start of every chunk,
+                        None does not measure it and only the absolute level is checked
+        :param threshold_db: the frames with a note are this much above the noise floor, dB
+        """
+        self.note_range = note_range
+        self.samples_per_frame = samples_per_frame
+        self.freq_step = freq_step
+        self.note_a_freq_hz = note_a_freq_hz
+        self.transform_type = transform_type
+        self.estimator = estimator
+        self.chunk_s = chunk_s
+        self.process_cnt = process_cnt
+        self.noise_s = noise_s
+        self.threshold_db = threshold_db
+
+    def tasks(self, paths):
+        """
+        :return: a list of (path, start frame, frame count) chunks of the files
+        """
+        tasks = []
+        for path in paths:
+            with AudioFileReader(path) as reader:
+                frame_cnt = reader.sample_cnt // self.samples_per_frame
+                chunk_cnt = max(1, frame_cnt)
+                if self.chunk_s is not None:
+                    chunk_cnt = max(1, int(self.chunk_s * reader.sample_rate / self.samples_per_frame))
+            for start in range(0, frame_cnt, chunk_cnt):
+                tasks.append((str(path), start, min(chunk_cnt, frame_cnt - start)))
+        return tasks
+
+    def _make_tuner(self, sample_rate):
+        tuner = Tuner(None, self.note_range, samples_per_frame=self.samples_per_frame, freq_step=self.freq_step,
+                      note_a_freq_hz=self.note_a_freq_hz, estimator=self.estimator,
+                      transform_type=self.transform_type, sample_rate=sample_rate)
+        tuner.threshold = self.threshold_db
+        return tuner
+
+    def analyze_chunk(self, path, start_frame=0, frame_cnt=None) -> List[dict]:
+        with AudioFileReader(path) as reader:
+            frame_s = self.samples_per_frame / reader.sample_rate
+            tuner = self._make_tuner(reader.sample_rate)
+            if self.noise_s is not None:
+                # the transform of the measurement is not reused, the analysis starts from the chunk's start
+                noise_cnt = max(1, int(self.noise_s / frame_s))
+                if frame_cnt is not None:
+                    noise_cnt = min(noise_cnt, frame_cnt)
+                noise_frames = reader.frames(self.samples_per_frame, start_frame, noise_cnt)
+                tuner.data.noise_floor = self._make_tuner(reader.sample_rate).measure_noise_floor(noise_frames)
+
+            rows = []
+            frames = reader.frames(self.samples_per_frame, start_frame, frame_cnt)
+            for idx, data in tuner.analyze(frames):
+                frame = start_frame + idx
+                f0 = data.curr_freq - data.delta_freq
+                rows.append({"file": str(path), "frame": frame, "time_s": round(frame * frame_s, 6),
+                             "freq_hz": float(data.curr_freq),
+                             "note": Note.midi_number_to_note_name(data.midi_num, use_subscript=False),
+                             "midi": data.midi_num, "cents": 1200 * math.log2(data.curr_freq / f0)})
+        return rows
+
+    def analyze(self, paths) -> List[dict]:
+        """
+        Analyzes the files.
+        :param paths: a list of the file paths
+        :return: a list of rows ordered by the file and the frame
+        """
+        tasks = self.tasks(paths)
+        if self.process_cnt == 1 or len(tasks) <= 1:
+            results = [self.analyze_chunk(*task) for task in tasks]
+        else:
+            with Pool(self.process_cnt) as pool:
+                results = pool.starmap(self.analyze_chunk, tasks)
+        return [row for rows in results for row in rows]
+
+    @classmethod
+    def write(cls, rows: List[dict], path):
+        """
+        Writes the rows to a .csv file, or to a .parquet file (needs pandas with pyarrow or fastparquet).
+        """
+        path = Path(path)
+        if path.suffix == ".parquet":
+            import pandas
+            pandas.DataFrame(rows, columns=cls.COLUMNS).to_parquet(path, index=False)
+            return
+
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=cls.COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,111 @@
+import time
+import asyncio
+from dataclasses import replace
+from typing import Tuple
+
+from audio.input_device import InputDevice, SDInputDevice, PAInputDevice
+from audio.tuner import Tuner, TunerData
+
+
+class AsyncTuner:
+    """
+    asyncio front end of the Tuner:
+
+        async for data in AsyncTuner(device, ("E2", "E6")).readings():
+            print(data.note, data.delta_freq)
+
+    The input device does not queue the frames, its callback hands every frame over to the event loop
+    (call_soon_threadsafe) and the loop puts it in a bounded asyncio.Queue.  When the consumer falls behind,
+    the oldest frame is dropped and counted in errors.queue, so the audio callback never blocks.
+    The transform runs in an executor, the event loop only waits for it.  Many tuners (and MIDI streams)
+    can share one event loop and one executor, with no thread per device besides the device's own.
+    """
+    MAX_QUEUE_LEN = 4
+
+    def __init__(self, device: int, note_range: Tuple[str, str], samples_per_frame: int = Tuner.SAMPLES_PER_FRAME,
+                 max_queue_len: int = MAX_QUEUE_LEN, executor=None, input_device: InputDevice = None, **kwargs):
+        """
+        :param device: the input device number, see Tuner
+        :param note_range: a tuple of the lowest and the highest note, e.g. ("E2", "E6")
+        :param samples_per_frame: samples per frame
+        :param max_queue_len: the max number of frames waiting for the transform
+        :param executor: the executor of the transforms, None uses the loop's default executor
+        :param input_device: the input device that does not queue the data, None opens the device
+        :param kwargs: the other Tuner parameters, e.g. transform_type
+        """
+        self.input_device = input_device
+        if self.input_device is None:
+            # the device delivers the hops, see Tuner
+            # the callback posts to the event loop, so it has to run in this process
+            # the device only delivers the tuner's channel, it is the frame's only row
+            hop_size = kwargs.get("hop_size", None) or samples_per_frame
+            channel = kwargs.pop("channel", 0)
+            if Tuner.USE_SD:
+                self.input_device = SDInputDevice(device=device, channel_cnt=channel + 1, samples_per_frame=hop_size,
+                                                  queue_data=False, multiprocess=False, channels=[channel])
+            else:
+                self.input_device = PAInputDevice(device=device, channel_cnt=channel + 1, samples_per_frame=hop_size,
+                                                  queue_data=False, multiprocess=False, channels=[channel])
+
+        # the tuner only transforms the frames, the device is owned by this class
+        self.tuner = Tuner(None, note_range, samples_per_frame=samples_per_frame,
+                           sample_rate=self.input_device.get_sample_rate(), **kwargs)
+        self.errors = self.tuner.errors
+        self.max_queue_len = max_queue_len
+        self.executor = executor
+        self.init_time_s = Tuner.INIT_TIME_S
+
+        self._loop = None
+        self._queue = None
+
+    @property
+    def data(self) -> TunerData:
+        return self.tuner.data
+
+    async def readings(self):
+        """
+        Starts the device and yields a copy of the tuner data for every frame with a note.
+        The first init_time_s seconds the noise floor is measured, as in the Tuner.
+        The device is stopped when the consumer leaves the loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_len)
+        self.input_device.set_process_fn(self._on_frame)
+
+        self.tuner.data.state = Tuner.INIT_STATE
+        start_time = time.monotonic()
+        self.input_device.start()
+        try:
+            while True:
+                timestamp, frame = await self._queue.get()
+
+                if self.tuner.data.state == Tuner.INIT_STATE:
+                    if time.monotonic() - start_time <= self.init_time_s:
+                        await self._loop.run_in_executor(self.executor, self.tuner._determine_noise_floor, frame)
+                        continue
+                    self.tuner.data.state = Tuner.PROCESS_STATE
+
+                if not await self._loop.run_in_executor(self.executor, self.tuner._process, frame):
+                    continue
+
+                self.errors.sample = self.input_device.sample_error_cnt
+                yield replace(self.tuner.data, samples=None, queue_size=self._queue.qsize(),
+                              latency_s=time.monotonic() - timestamp)
+        finally:
+            self.input_device.stop()
+            self.input_device.set_process_fn(None)
+
+    def _on_frame(self, data):
+        # the device's thread
+        try:
+            self._loop.call_soon_threadsafe(self._put, time.monotonic(), data)
+        except:
+            # the loop is closed
+            pass
+
+    def _put(self, timestamp, data):
+        # the event loop's thread
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.errors.queue += 1
+        self._queue.put_nowait((timestamp, data))
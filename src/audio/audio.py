@@ -1,9 +1,11 @@
+from time import monotonic
 from threading import Thread
 
 from .synth import Synth
-from .midi_router import MIDIRouter
+from .midi_router import MIDIRouter, GET_TIMEOUT_S
 from .midi_parser import MIDIParser
 from .tuning import Tuning
+from .metrics import Metrics
 
 
 class AudioSupport:
@@ -20,6 +22,11 @@ class AudioSupport:
         self.parser = None
         self.parser_thread = Thread(target=self._parse_midi_events)
 
+        # the latency of the MIDI path from the ingest of the message by the router:
+        # midi_forward_s - to the end of port_out.send(), midi_note_s - to the return of the parser's note_fn,
+        # midi_jitter_s - the change of midi_note_s between the notes, midi_ui_s - to the UI, see record_ui_latency()
+        self.midi_metrics = Metrics()
+
     @classmethod
     def available_midi_ports(cls):
         synth = Synth()
@@ -70,7 +77,9 @@ class AudioSupport:
                 _port_out = port
                 break
 
-        self.midi_router = MIDIRouter(port_in=_port_in, port_out=_port_out, message_filter=["aftertouch"])
+        self.midi_router = MIDIRouter(port_in=_port_in, port_out=_port_out, message_filter=["aftertouch"],
+                                      metrics=self.midi_metrics)
+        self.midi_metrics.counter("midi_messages_dropped", lambda: self.midi_router.drop_cnt)
         ret = self.midi_router.start()                  # true if both input and output ports are initialized
         if not port_in_mandatory:
             ret = self.midi_router.port_out.is_open()   # true if only output port is initialized
@@ -87,15 +96,16 @@ class AudioSupport:
         self.synth.stop()
 
     def _parse_midi_events(self):
-        self.parser = MIDIParser(enable_print=self.enable_print)
-
+        # the thread sleeps until the messages arrive, and parses the ones that piled up in one batch
         while self.is_active:
-            self.parser.parse(self.midi_router.get_message())
+            self.parser.parse_timestamped(self.midi_router.drain_timestamped(timeout=GET_TIMEOUT_S))
 
     def start_midi_parser(self):
         if self.is_active:
             return
 
+        # the parser exists before the thread starts, so note_fn can be set right after start_midi()
+        self.parser = MIDIParser(enable_print=self.enable_print, metrics=self.midi_metrics)
         self.is_active = True
         self.parser_thread.start()
 
@@ -108,3 +118,22 @@ class AudioSupport:
 
     def send_midi_message(self, message):
         self.midi_router.put_message(message)
+
+    def record_ui_latency(self, timestamp):
+        """
+        Records the latency of the UI, call it when the UI shows the note.
+        :param timestamp: the ingest time of the note's message, the parser's timestamp in note_fn
+        """
+        if timestamp is not None:
+            self.midi_metrics.record("midi_ui_s", monotonic() - timestamp)
+
+    def midi_latency(self, reset=False):
+        """
+        :param reset: the histograms are reset after the snapshot, so the next one covers a new window
+        :return: the snapshot of the MIDI metrics (see Metrics.snapshot()) with the smoothed jitter, s
+        """
+        snapshot = self.midi_metrics.snapshot()
+        snapshot["jitter_s"] = 0.0 if self.parser is None else self.parser.jitter_s
+        if reset:
+            self.midi_metrics.reset()
+        return snapshot
@@ -1,21 +1,174 @@
+import time
+import weakref
 from queue import Queue
+from threading import Condition
 from multiprocessing import Queue as MPQueue
+from multiprocessing import Semaphore, shared_memory
 from collections import deque
 
+import numpy as np
 
-# The class implements non-blocking FIFO queue.
+
+# The class implements a lock-free single-producer/single-consumer ring of fixed-size frames
+# in shared memory, so the frames are passed between processes with a memcpy and no pickling.
+# The producer only writes the write and the overrun counters, the consumer only writes the read counter.
+# The counters are never reset, the number of frames in the ring is write_cnt - read_cnt.
+# get() returns a view of the slot.  The ring has a spare slot, so the view stays valid until the next get().
+# A semaphore counts the published frames, so get() can block until a frame arrives.
+# Every slot keeps the time.monotonic() of the put, the clock is shared by the processes.
+# The process that creates the ring owns the shared memory and unlinks it.  The ring is re-attached
+# by the name when it is pickled to another process (the spawn start method).
+class SharedRingBuffer:
+    WRITE_CNT = 0
+    READ_CNT = 1
+    OVERRUN_CNT = 2
+    HEADER_LEN = 8   # int64 counters, the header keeps the frames 64-byte aligned
+
+    def __init__(self, frame_shape, dtype=np.float32, max_len=5, name=None, available=None):
+        """
+        :param frame_shape: the shape of a frame, e.g. (2048, 1)
+        :param dtype: the NumPy type of the sample
+        :param max_len: the max number of frames in the ring, a frame that does not fit is dropped
+        :param name: the name of the existing shared memory to attach to, None creates the ring
+        :param available: the semaphore of the existing ring
+        """
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.max_len = max_len
+        self.slot_cnt = max_len + 1
+        self.timestamp = 0.0   # put time of the frame returned by the last get()
+        self._available = Semaphore(0) if available is None else available
+
+        # header, timestamps, frames, every part starts at a 64-byte boundary
+        frame_size = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        header_size = SharedRingBuffer.HEADER_LEN * 8
+        timestamps_size = (self.slot_cnt * 8 + 63) // 64 * 64
+        size = header_size + timestamps_size + self.slot_cnt * frame_size
+
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._finalizer = weakref.finalize(self, SharedRingBuffer._release, self._shm, True)
+        else:
+            try:
+                # Python 3.13+, the owner is responsible for unlinking
+                self._shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                self._shm = shared_memory.SharedMemory(name=name)
+            self._finalizer = weakref.finalize(self, SharedRingBuffer._release, self._shm, False)
+
+        self._header = np.ndarray((SharedRingBuffer.HEADER_LEN,), dtype=np.int64, buffer=self._shm.buf)
+        self._timestamps = np.ndarray((self.slot_cnt,), dtype=np.float64, buffer=self._shm.buf, offset=header_size)
+        self._slots = np.ndarray((self.slot_cnt,) + self.frame_shape, dtype=self.dtype,
+                                 buffer=self._shm.buf, offset=header_size + timestamps_size)
+        if self._owner:
+            self._header[:] = 0
+
+    @classmethod
+    def _release(cls, shm, unlink):
+        try:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        except:
+            pass
+
+    def __getstate__(self):
+        return {"frame_shape": self.frame_shape, "dtype": self.dtype.str, "max_len": self.max_len,
+                "name": self._shm.name, "available": self._available}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def overrun_cnt(self):
+        return int(self._header[SharedRingBuffer.OVERRUN_CNT])
+
+    def close(self):
+        """
+        Releases the shared memory, the owner also unlinks it.  The ring cannot be used after that.
+        """
+        self._header = None
+        self._timestamps = None
+        self._slots = None
+        self._finalizer()
+
+    def clear(self):
+        # consumer side
+        while self._available.acquire(block=False):
+            pass
+        self._header[SharedRingBuffer.READ_CNT] = self._header[SharedRingBuffer.WRITE_CNT]
+
+    def size(self):
+        return int(self._header[SharedRingBuffer.WRITE_CNT] - self._header[SharedRingBuffer.READ_CNT])
+
+    def put(self, x, timestamp=None):
+        """
+        Producer side.  Copies the frame into the next slot.
+        :param x: a frame, an array or a buffer of frame_shape samples
+        :param timestamp: the time.monotonic() of the frame, None uses the current time
+        :return: False if the ring is full and the frame is dropped
+        """
+        write_cnt = self._header[SharedRingBuffer.WRITE_CNT]
+        if write_cnt - self._header[SharedRingBuffer.READ_CNT] >= self.max_len:
+            self._header[SharedRingBuffer.OVERRUN_CNT] += 1
+            return False
+
+        idx = write_cnt % self.slot_cnt
+        self._slots[idx] = np.frombuffer(x, dtype=self.dtype).reshape(self.frame_shape)
+        self._timestamps[idx] = time.monotonic() if timestamp is None else timestamp
+
+        # the frame is published after it is written
+        self._header[SharedRingBuffer.WRITE_CNT] = write_cnt + 1
+        self._available.release()
+        return True
+
+    def get(self, timeout=0.0):
+        """
+        Consumer side.
+        :param timeout: 0 does not wait, None waits until a frame arrives, otherwise the max wait, s
+        :return: a view of the oldest frame, valid until the next get(), or None if the ring is empty
+        """
+        if not self._available.acquire(block=timeout != 0, timeout=timeout):
+            return None
+
+        # clear() might have raced with a put
+        read_cnt = self._header[SharedRingBuffer.READ_CNT]
+        if read_cnt >= self._header[SharedRingBuffer.WRITE_CNT]:
+            return None
+
+        idx = read_cnt % self.slot_cnt
+        frame = self._slots[idx]
+        self.timestamp = float(self._timestamps[idx])
+        self._header[SharedRingBuffer.READ_CNT] = read_cnt + 1
+        return frame
+
+
+# The class implements FIFO queue, get() does not block unless a timeout is supplied.
 # The queue can be either - regular queue or deque.
 # It also can be limited in size.
+# For multiple processes and fixed-size frames (frame_shape is supplied), the queue is a shared memory ring.
+# The queue keeps the put time (time.monotonic()) of every item, see timestamp.
 class FIFOQueue:
-    def __init__(self, multiprocess=False, is_deque=True, max_len=200):
+    def __init__(self, multiprocess=False, is_deque=True, max_len=200, frame_shape=None, dtype=np.float32):
         if multiprocess:
             is_deque = False
 
         self._queue = None
         self._size = 0  # qsize() might not be implemented for MP queue
+        self._overrun_cnt = 0
+        self._timestamp = 0.0
+        self._not_empty = Condition()   # deque only
         self._use_deque = is_deque
         self._use_mpqueue = multiprocess
-        if self._use_deque:
+        self._use_ring = multiprocess and frame_shape is not None
+        if self._use_ring:
+            self._queue = SharedRingBuffer(frame_shape, dtype=dtype, max_len=max_len if max_len else 200)
+        elif self._use_deque:
             if max_len == 0:
                 max_len = None
             self._queue = deque(maxlen=max_len)
@@ -27,15 +180,48 @@ class FIFOQueue:
             else:
                 self._queue = Queue(maxsize=max_len)
 
+    def __getstate__(self):
+        # the condition is only used by the deque, which is never passed to another process
+        state = self.__dict__.copy()
+        del state["_not_empty"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._not_empty = Condition()
+
+    @property
+    def timestamp(self):
+        """
+        :return: put time of the item returned by the last get(), time.monotonic()
+        """
+        if self._use_ring:
+            return self._queue.timestamp
+        return self._timestamp
+
+    @property
+    def overrun_cnt(self):
+        """
+        :return: number of frames lost because the queue was full, counted across the processes for the ring
+        """
+        if self._use_ring:
+            return self._queue.overrun_cnt
+        return self._overrun_cnt
+
     def clear(self):
-        self._size = 0
-        if self._use_deque:
+        if self._use_ring:
             self._queue.clear()
+        elif self._use_deque:
+            with self._not_empty:
+                self._queue.clear()
         else:
-            while self._queue.get() is not None:
+            while self.get() is not None:
                 pass
+        self._size = 0
 
     def size(self):
+        if self._use_ring:
+            return self._queue.size()
         if self._use_deque:
             return len(self._queue)
 
@@ -44,26 +230,52 @@ class FIFOQueue:
         except NotImplementedError:
             return self._size
 
-    def put(self, x):
+    def put(self, x, timestamp=None):
+        """
+        :param x: the item
+        :param timestamp: the time.monotonic() of the item, e.g. the capture time of the frame, None uses the current time
+        :return: False if the queue is full and the item is dropped
+        """
+        if self._use_ring:
+            return self._queue.put(x, timestamp)
+
+        item = (time.monotonic() if timestamp is None else timestamp, x)
         if self._use_deque:
-            self._queue.append(x)
+            with self._not_empty:
+                # the deque drops the oldest item when it is full
+                if self._queue.maxlen is not None and len(self._queue) == self._queue.maxlen:
+                    self._overrun_cnt += 1
+                self._queue.append(item)
+                self._not_empty.notify()
         else:
             try:
-                self._queue.put_nowait(x)
+                self._queue.put_nowait(item)
                 self._size += 1
             except:
+                self._overrun_cnt += 1
                 return False
         return True
 
-    def get(self):
+    def get(self, timeout=0.0):
+        """
+        :param timeout: 0 does not wait, None waits until an item arrives, otherwise the max wait, s
+        :return: the oldest item or None if the queue is empty
+        """
+        if self._use_ring:
+            return self._queue.get(timeout)
+
         if self._use_deque:
-            try:
-                return self._queue.popleft()
-            except:
-                return None
+            with self._not_empty:
+                if timeout != 0:
+                    self._not_empty.wait_for(lambda: len(self._queue) > 0, timeout)
+                try:
+                    self._timestamp, x = self._queue.popleft()
+                except:
+                    return None
+            return x
 
         try:
-            x = self._queue.get_nowait()
+            self._timestamp, x = self._queue.get(block=timeout != 0, timeout=timeout)
         except:
             return None
 
@@ -1,5 +1,9 @@
-from threading import Thread
+import numpy as np
+from time import monotonic
+from typing import List
+from threading import Thread, Event
 from multiprocessing import Process
+from multiprocessing import Event as MPEvent
 from audio.fifo_queue import FIFOQueue
 
 import sounddevice as sd
@@ -14,28 +18,39 @@ class InputDevice:
 
     def __init__(self, device, channel_cnt: int, samples_per_frame: int,
                  queue_data: bool, max_queue_len: int,
-                 multiprocess: bool):
+                 multiprocess: bool, channels: List[int] = None, downmix: bool = False):
         self._device = device
         self._sample_rate = InputDevice.DEFAULT_SAMPLE_RATE
         self._channel_cnt = channel_cnt
 
+        # the frames are (channel, sample) arrays, every channel is contiguous
+        self._channels = channels   # the device's channels in the frame, None selects all
+        self._downmix = downmix     # the selected channels are averaged into one
+        self._buffers = None
+        self._buffer_idx = 0
+        self._buffer_write_no = None
+        self._write_cnt = 0
+        self._held_frame = None   # the frame returned by the last get_data()
+
         self._multiprocess = multiprocess
         self._active = False
         self._thread = None
 
+        # the capture loop waits for the event rather than polling _active, which the other process does not see
+        self._stop_event = MPEvent() if multiprocess else Event()
+
         self._samples_per_frame = samples_per_frame
 
         # data will either be queued or processed by the supplied process function
         self._process_fn = None
         self._queue = None
         self._queue_data = queue_data
-        if self._queue_data:
-            self._queue = FIFOQueue(multiprocess=multiprocess, max_len=max_queue_len)
+        self._max_queue_len = max_queue_len
+        self._create_queue()
 
         # stats
         self.sample_cnt = 0
         self.sample_error_cnt = 0
-        self.queue_error_cnt = 0
 
     @classmethod
     def available_devices(cls):
@@ -52,9 +67,63 @@ class InputDevice:
 
     def set_samples_per_frame(self, samples_per_frame):
         self._samples_per_frame = samples_per_frame
+        self._create_queue()
 
     def set_channel_cnt(self, cnt):
         self._channel_cnt = cnt
+        self._create_queue()
+
+    def set_channels(self, channels: List[int] = None, downmix: bool = False):
+        """
+        Selects the channels of the device that make the frame.
+        :param channels: a list of the device's channels, None selects all
+        :param downmix: the selected channels are averaged into one
+        """
+        self._channels = channels
+        self._downmix = downmix
+        self._create_queue()
+
+    @property
+    def frame_shape(self):
+        """
+        :return: the shape of the frame, (channel, sample)
+        """
+        if self._downmix:
+            return 1, self._samples_per_frame
+        return len(self._selected_channels()), self._samples_per_frame
+
+    def _selected_channels(self):
+        return list(range(self._channel_cnt)) if self._channels is None else self._channels
+
+    def _create_queue(self):
+        # the frames are float32, in multiprocess mode they go through a shared memory ring
+        if self._queue_data:
+            self._queue = FIFOQueue(multiprocess=self._multiprocess, max_len=self._max_queue_len,
+                                    frame_shape=self.frame_shape, dtype=np.float32)
+
+        # The queued frames are de-interleaved into preallocated buffers.  The deque holds at most the last
+        # max_queue_len frames and the consumer uses one more until the next get(), so there is a free buffer
+        # among max_queue_len + 2.  The shared memory ring copies the frame, a single buffer will do.
+        # The frames passed to the process function are allocated, the function might keep them.
+        self._buffers = None
+        self._buffer_idx = 0
+        self._write_cnt = 0
+        self._held_frame = None
+        if self._queue_data and self._multiprocess:
+            self._buffers = [np.empty(self.frame_shape, dtype=np.float32)]
+        elif self._queue_data and self._max_queue_len:
+            self._buffers = list(np.empty((self._max_queue_len + 2,) + self.frame_shape, dtype=np.float32))
+        if self._buffers is not None:
+            self._buffer_write_no = [-len(self._buffers)] * len(self._buffers)
+
+    @property
+    def queue_error_cnt(self):
+        """
+        :return: number of frames dropped because the queue was full, the queue counts them in the capturing process
+        """
+        if self._queue is None:
+            return 0
+        return self._queue.overrun_cnt
 
     def set_process_fn(self, process_fn):
         """
@@ -77,6 +146,7 @@ class InputDevice:
         :return:
         """
         self._active = True
+        self._stop_event.clear()
         if self._multiprocess:
             self._thread = Process(target=self._main_loop)
         else:
@@ -90,16 +160,28 @@ class InputDevice:
         :return:
         """
         self._active = False
+        self._stop_event.set()
         self._thread.join()
 
-    def get_data(self):
+    def get_data(self, timeout=0.0):
         """
-        This method returnes the data from the queue (when the data is queued)
-        :return:
+        This method returnes the data from the queue (when the data is queued).
+        In multiprocess mode the data is a view of the shared memory, valid until the next call.
+        :param timeout: 0 does not wait, None waits until the data arrives, otherwise the max wait, s
+        :return: the data or None
         """
         if self._queue is None:
             return None
-        return self._queue.get()
+        self._held_frame = self._queue.get(timeout)
+        return self._held_frame
+
+    def data_timestamp(self):
+        """
+        :return: the time.monotonic() when the data returned by the last get_data() was captured
+        """
+        if self._queue is None:
+            return None
+        return self._queue.timestamp
 
     def queue_size(self):
         if self._queue is None:
@@ -110,19 +192,49 @@ class InputDevice:
         """
         This method is used when the data that is read from a device, such as SoundDevice,
          needs to be buffered before it can be processed.
-         SoundDevice data needs data[:, 0]  or data.copy to be copied.
+         The interleaved data is copied channel by channel (strided copies) into a (channel, sample) frame.
          Overwrite this method if another way to buffer data is needed.
-        :param data: raw data from the device's stream
-        :return: a copy of the supplied data
+        :param data: interleaved data from the device's stream, a (sample, channel) array
+        :return: a copy of the selected channels of the supplied data
         """
-        return data.copy()   # data[:, 0]
+        if self._buffers is None:
+            frame = np.empty(self.frame_shape, dtype=np.float32)
+        else:
+            frame = self._next_buffer()
+
+        channels = self._selected_channels()
+        if self._downmix:
+            np.copyto(frame[0], data[:, channels[0]])
+            for ch in channels[1:]:
+                frame[0] += data[:, ch]
+            if len(channels) > 1:
+                frame[0] *= 1.0 / len(channels)
+        else:
+            for i, ch in enumerate(channels):
+                np.copyto(frame[i], data[:, ch])
+        return frame
+
+    def _next_buffer(self):
+        # a buffer that is neither one of the last max_queue_len frames nor the consumer's frame
+        min_write_no = self._write_cnt - (0 if self._multiprocess else self._max_queue_len)
+        while True:
+            idx = self._buffer_idx
+            self._buffer_idx = (idx + 1) % len(self._buffers)
+            if self._buffer_write_no[idx] < min_write_no and self._buffers[idx] is not self._held_frame:
+                break
+
+        self._buffer_write_no[idx] = self._write_cnt
+        self._write_cnt += 1
+        return self._buffers[idx]
 
     def _callback_fn(self, indata, frames, time, status):
         """
         This method is used as a callback in SoundDevice and other streams.
         Most likely, there is no need to overwrite it.
         """
-        if not any(indata):
+        # SoundDevice passes a (sample, channel) array, PyAudio passes the bytes
+        data = np.frombuffer(indata, dtype=np.float32).reshape(-1, self._channel_cnt)
+        if not data.any():
             return
 
         if status:
@@ -133,18 +245,33 @@ class InputDevice:
 
         if self._queue_data:
             if self._queue is not None:
-                if not self._queue.put(self._data_copy(indata)):
-                    self.queue_error_cnt += 1
+                self._queue.put(self._data_copy(data), self._capture_time(time))
             return
 
         if self._process_fn is not None:
-            self._process_fn(self._data_copy(indata))
+            self._process_fn(self._data_copy(data))
+
+    @classmethod
+    def _capture_time(cls, time_info):
+        """
+        :param time_info: the time argument of the SoundDevice callback
+        :return: the time.monotonic() of the frame's first sample, the callback time if the stream does not tell
+        """
+        now = monotonic()
+        try:
+            # the stream's clock is not monotonic(), only the difference is used
+            delay = time_info.currentTime - time_info.inputBufferAdcTime
+            if 0.0 < delay < 1.0:
+                return now - delay
+        except:
+            pass
+        return now
 
     def _main_loop(self):
         """
         Overwrite this method to receive data from the device
         """
-        if not self._active:
+        if self._stop_event.is_set():
             return
 
 
@@ -154,14 +281,16 @@ class SDInputDevice(InputDevice):
     """
     def __init__(self, device=None, channel_cnt=1, samples_per_frame=2048,
                  queue_data=True, max_queue_len=5,
-                 multiprocess=True):
+                 multiprocess=True, channels=None, downmix=False):
 
         super(SDInputDevice, self).__init__(device=device,
                                             channel_cnt=channel_cnt,
                                             samples_per_frame=samples_per_frame,
                                             queue_data=queue_data,
                                             max_queue_len=max_queue_len,
-                                            multiprocess=multiprocess)
+                                            multiprocess=multiprocess,
+                                            channels=channels,
+                                            downmix=downmix)
 
         if device is not None:
             self.set_device(device)
@@ -195,18 +324,17 @@ class SDInputDevice(InputDevice):
         self._sample_rate = sd.query_devices(self._device, 'input')['default_samplerate']
 
     def _main_loop(self):
-        if not self._active:
+        if self._stop_event.is_set():
             return
 
+        # the stream calls back from its own thread, the loop only waits for stop()
         with sd.InputStream(device=self._device,
                             channels=self._channel_cnt,
                             dtype="float32",   # "int16",
                             callback=self._callback_fn,
                             blocksize=self._samples_per_frame,
                             samplerate=self._sample_rate):
-            while True:
-                if not self._active:
-                    break
+            self._stop_event.wait()
 
 
 class PAInputDevice(InputDevice):
@@ -215,14 +343,16 @@ class PAInputDevice(InputDevice):
     """
     def __init__(self, device=None, channel_cnt=1, samples_per_frame=2048,
                  queue_data=True, max_queue_len=5,
-                 multiprocess=True):
+                 multiprocess=True, channels=None, downmix=False):
 
         super(PAInputDevice, self).__init__(device=device,
                                             channel_cnt=channel_cnt,
                                             samples_per_frame=samples_per_frame,
                                             queue_data=queue_data,
                                             max_queue_len=max_queue_len,
-                                            multiprocess=multiprocess)
+                                            multiprocess=multiprocess,
+                                            channels=channels,
+                                            downmix=downmix)
 
         self._stream = None
 
@@ -251,14 +381,129 @@ class PAInputDevice(InputDevice):
         self._stream.start_stream()
         super(PAInputDevice, self).stop()
 
-    def _data_copy(self, data):
-        return data
-
     def _main_loop(self):
-        if not self._active:
+        if self._stop_event.is_set():
             return
 
+        # read() blocks until the frame is captured
         while self._stream.is_active():
             self._callback_fn(self._stream.read(self._samples_per_frame), self._samples_per_frame, 0, 0)
-            if not self._active:
+            if self._stop_event.is_set():
                 break
+
+
+class GeneratorInputDevice(InputDevice):
+    """
+    The class feeds the frames of a signal through the same callback and queue as the sound devices,
+    so the tuner runs with no audio hardware, e.g. on a server or in the soak tests.
+    The source is an iterable of sample arrays of any length, mono or (sample, channel), they are cut into frames.
+    The frames are paced to the wall clock at the speed (1.0 is real time, 2.0 twice as fast),
+    speed 0 (THROUGHPUT) delivers them as fast as possible and the full queue drops them as the device would.
+    """
+    REALTIME = 1.0
+    THROUGHPUT = 0.0
+
+    def __init__(self, source=None, sample_rate=InputDevice.DEFAULT_SAMPLE_RATE, channel_cnt=1,
+                 samples_per_frame=2048, queue_data=True, max_queue_len=5,
+                 multiprocess=False, channels=None, downmix=False, speed=REALTIME):
+
+        super(GeneratorInputDevice, self).__init__(device=None,
+                                                   channel_cnt=channel_cnt,
+                                                   samples_per_frame=samples_per_frame,
+                                                   queue_data=queue_data,
+                                                   max_queue_len=max_queue_len,
+                                                   multiprocess=multiprocess,
+                                                   channels=channels,
+                                                   downmix=downmix)
+
+        self._source = source
+        self._sample_rate = sample_rate
+        self.speed = speed
+        self._done_event = MPEvent() if multiprocess else Event()
+
+    def start(self):
+        self._done_event.clear()
+        super(GeneratorInputDevice, self).start()
+
+    def wait(self, timeout=None):
+        """
+        Waits until the whole source is delivered.
+        :param timeout: the max wait, s, None waits forever
+        :return: True if the source is delivered
+        """
+        return self._done_event.wait(timeout)
+
+    def _chunks(self):
+        """
+        Overwrite this method to read the samples from another source.
+        :return: an iterable of sample arrays
+        """
+        return self._source
+
+    def _frames(self):
+        # the frame is reused, the callback copies it
+        frame = np.empty((self._samples_per_frame, self._channel_cnt), dtype=np.float32)
+        fill = 0
+        for chunk in self._chunks():
+            chunk = np.asarray(chunk, dtype=np.float32).reshape(-1, self._channel_cnt)
+            pos = 0
+            while pos < len(chunk):
+                cnt = min(self._samples_per_frame - fill, len(chunk) - pos)
+                frame[fill:fill + cnt] = chunk[pos:pos + cnt]
+                fill += cnt
+                pos += cnt
+                if fill == self._samples_per_frame:
+                    yield frame
+                    fill = 0
+
+    def _main_loop(self):
+        frame_s = self._samples_per_frame / self._sample_rate
+        start_time = monotonic()
+        for frame_no, frame in enumerate(self._frames(), start=1):
+            # the frame is captured when its last sample is
+            if self.speed > 0:
+                delay = start_time + frame_no * frame_s / self.speed - monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    return
+            if self._stop_event.is_set():
+                return
+
+            self._callback_fn(frame, self._samples_per_frame, None, 0)
+        self._done_event.set()
+
+
+class FileInputDevice(GeneratorInputDevice):
+    """
+    The class plays an audio file as the input device, see GeneratorInputDevice.
+    The file is read with AudioFileReader, the channels are averaged into one.
+    """
+    def __init__(self, path, samples_per_frame=2048, queue_data=True, max_queue_len=5,
+                 multiprocess=False, speed=GeneratorInputDevice.REALTIME, loop=False):
+        """
+        :param path: the path of the file, e.g. a WAV file
+        :param loop: the file is played again and again until stop()
+        """
+        # the analyzer imports the tuner, which imports this module
+        from audio.analyzer import AudioFileReader
+
+        with AudioFileReader(path) as reader:
+            sample_rate = reader.sample_rate
+
+        super(FileInputDevice, self).__init__(sample_rate=sample_rate,
+                                              samples_per_frame=samples_per_frame,
+                                              queue_data=queue_data,
+                                              max_queue_len=max_queue_len,
+                                              multiprocess=multiprocess,
+                                              speed=speed)
+
+        self.path = path
+        self.loop = loop
+
+    def _chunks(self):
+        from audio.analyzer import AudioFileReader
+
+        while True:
+            with AudioFileReader(self.path) as reader:
+                yield from reader.frames(self._samples_per_frame)
+            if not self.loop or self._stop_event.is_set():
+                return
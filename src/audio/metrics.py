@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import tempfile
+from pathlib import Path
+from threading import Thread, Event, Lock
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+# The class implements a histogram with the HDR (high dynamic range) layout: the values under 2 ** SUB_BITS units
+# have a bucket each and every higher power of two is split into 2 ** (SUB_BITS - 1) linear sub-buckets,
+# so a bucket is at most 1/128 (0.8%) of its values wide from 256 ns to MAX_S, in a fixed array of counts.
+# record() is O(1) and does not allocate.
+# The values are in seconds and stored as whole nanoseconds.
+class Histogram:
+    SUB_BITS = 8
+    UNIT_S = 1e-9
+    MAX_S = 60.0   # the longer values are recorded as MAX_S
+    PERCENTILES = [50.0, 90.0, 99.0, 99.9]
+
+    def __init__(self):
+        self._max_value = int(Histogram.MAX_S / Histogram.UNIT_S)
+        self.counts = np.zeros(self._index(self._max_value) + 1, dtype=np.int64)
+        self.count = 0
+        self.total_s = 0.0
+        self.min_s = 0.0
+        self.max_s = 0.0
+
+    @classmethod
+    def _index(cls, value):
+        # the top SUB_BITS bits of the value, their highest bit is set above the first 2 ** SUB_BITS buckets
+        shift = max(value.bit_length() - cls.SUB_BITS, 0)
+        return (shift << (cls.SUB_BITS - 1)) + (value >> shift)
+
+    @classmethod
+    def _value(cls, idx):
+        # the upper bound of the bucket, s
+        shift = max((idx >> (cls.SUB_BITS - 1)) - 1, 0)
+        return ((idx - (shift << (cls.SUB_BITS - 1)) + 1) << shift) * cls.UNIT_S
+
+    def record(self, value_s):
+        value = min(max(int(value_s / Histogram.UNIT_S), 0), self._max_value)
+        self.counts[self._index(value)] += 1
+
+        if self.count == 0 or value_s < self.min_s:
+            self.min_s = value_s
+        if value_s > self.max_s:
+            self.max_s = value_s
+        self.count += 1
+        self.total_s += value_s
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total_s = 0.0
+        self.min_s = 0.0
+        self.max_s = 0.0
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self.counts += other.counts
+        self.min_s = other.min_s if self.count == 0 else min(self.min_s, other.min_s)
+        self.max_s = max(self.max_s, other.max_s)
+        self.count += other.count
+        self.total_s += other.total_s
+
+    @property
+    def mean_s(self):
+        return self.total_s / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """
+        :param p: the percentile, 0 - 100
+        :return: the value that p% of the values do not exceed, s
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(np.ceil(p / 100 * self.count)))
+        if rank >= self.count:
+            return self.max_s
+        idx = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(Histogram._value(idx), self.max_s)
+
+    def snapshot(self):
+        snapshot = {"count": self.count, "sum": self.total_s, "min": self.min_s, "mean": self.mean_s,
+                    "max": self.max_s}
+        for p in Histogram.PERCENTILES:
+            snapshot[f"p{p:g}"] = self.percentile(p)
+        return snapshot
+
+
+class MetricsSink(ABC):
+    """
+    Base class for the metrics sinks.  A sink gets the snapshots of Metrics, see Metrics.snapshot().
+    """
+    @abstractmethod
+    def write(self, snapshot: dict):
+        pass
+
+
+class JSONLinesSink(MetricsSink):
+    """
+    Appends every snapshot as a line of JSON.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def write(self, snapshot):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Writes the most recent snapshot in the Prometheus text format, e.g. for the textfile collector
+    of the node exporter.  The histograms are exported as summaries with the quantiles, the counters as counters.
+    """
+    PREFIX = "music_audio_"
+
+    def __init__(self, path, prefix=PREFIX):
+        self.path = Path(path)
+        self.prefix = prefix
+
+    def write(self, snapshot):
+        lines = []
+        for name, value in snapshot["counters"].items():
+            name = self.prefix + name + "_total"
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+
+        for name, hist in snapshot["histograms"].items():
+            name = self.prefix + (name[:-2] + "_seconds" if name.endswith("_s") else name)
+            lines.append(f"# TYPE {name} summary")
+            for p in Histogram.PERCENTILES:
+                lines.append(f'{name}{{quantile="{p / 100:g}"}} {hist[f"p{p:g}"]:.6g}')
+            lines += [f"{name}_sum {hist['sum']:.6g}", f"{name}_count {hist['count']}"]
+
+        # write to a temporary file first, so the collector never reads a partial file
+        tmp_name = None
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_name, self.path)
+        except:
+            # e.g. the disk is full, the partial file is not left behind
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except:
+                    pass
+
+
+# The class keeps the named histograms and counters of the audio path and exports their snapshots
+# to the sinks, either on request or periodically from its own thread.
+# The counters are functions that are read at the snapshot time, e.g. the counters of the input device.
+# The histograms are recorded from many threads (the tuners, the MIDI callbacks), the lock guards them.
+class Metrics:
+    EXPORT_INTERVAL_S = 10.0
+
+    def __init__(self, sinks=None):
+        self.histograms = {}
+        self.counters = {}
+        self.sinks = list(sinks or [])
+        self._lock = Lock()
+        self._stop_event = Event()
+        self._thread = None
+
+    def histogram(self, name) -> Histogram:
+        hist = self.histograms.get(name, None)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, Histogram())
+        return hist
+
+    def record(self, name, value_s):
+        hist = self.histogram(name)
+        with self._lock:
+            hist.record(value_s)
+
+    def counter(self, name, fn):
+        """
+        Registers a counter.
+        :param name: the name of the counter, e.g. "frames_dropped"
+        :param fn: a function that returns the value of the counter
+        """
+        self.counters[name] = fn
+
+    def reset(self):
+        """
+        Resets the histograms, e.g. to start a new window.
+        """
+        with self._lock:
+            for hist in self.histograms.values():
+                hist.reset()
+
+    def add_sink(self, sink: MetricsSink):
+        self.sinks.append(sink)
+
+    def snapshot(self):
+        counters = {}
+        for name, fn in self.counters.items():
+            try:
+                counters[name] = int(fn())
+            except:
+                pass
+
+        with self._lock:
+            histograms = {name: hist.snapshot() for name, hist in self.histograms.items()}
+        return {"time": time.time(), "counters": counters, "histograms": histograms}
+
+    def export(self):
+        if not self.sinks:
+            return
+
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.write(snapshot)
+
+    def start(self, interval_s=EXPORT_INTERVAL_S):
+        """
+        Starts the periodic export, does nothing with no sinks.
+        """
+        if not self.sinks or self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = Thread(target=self._main_loop, args=(interval_s,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the periodic export and exports the last snapshot.
+        """
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.export()
+
+    def _main_loop(self, interval_s):
+        while not self._stop_event.wait(interval_s):
+            self.export()
@@ -0,0 +1,100 @@
+from typing import Tuple, Dict
+
+
+NOTE_TYPES = frozenset(["note_on", "note_off", "polytouch"])
+CHANNEL_TYPES = frozenset(["note_on", "note_off", "polytouch", "control_change", "program_change",
+                           "aftertouch", "pitchwheel"])
+CHANNEL_CNT = 16
+NOTE_CNT = 128
+
+
+# The class is a MIDI message filter that is compiled once, so the ports and the router can filter
+# high-rate streams (aftertouch, clock) on the callback thread at the cost of a set lookup.
+# The filter skips the message types, the channels outside the channel mask, the notes outside the range
+# and the soft note_on messages, then transposes the notes and remaps the channels.
+# The type mask (skip_types) is a frozenset the caller checks inline, a function call costs more than
+# the lookup.  The rest of the filter is compiled into one function (fn), None if there is nothing else to do.
+# A note_on with velocity 0 is a note off and is never skipped for the velocity.
+# The messages are not changed in place, the transform returns a copy (the message is shared by the outputs).
+class MIDIFilter:
+    def __init__(self, skip_types=None, channels=None, note_range: Tuple[int, int] = None, min_velocity: int = 0,
+                 transpose: int = 0, channel_map: Dict[int, int] = None):
+        """
+        :param skip_types: a list of Mido message types to skip, ex "aftertouch"
+        :param channels: a list of the channels to pass, None passes all
+        :param note_range: the lowest and the highest MIDI number to pass, the note messages only
+        :param min_velocity: the softer note_on messages are skipped
+        :param transpose: semitones added to the notes, the notes out of the MIDI range are skipped
+        :param channel_map: a dict of the channel to the new channel
+        """
+        self.skip_types = frozenset(skip_types or [])
+        self.channels = None if channels is None else frozenset(channels)
+        self.note_range = note_range
+        self.min_velocity = min_velocity
+        self.transpose = transpose
+        self.channel_map = channel_map
+        self.fn = self.compile()
+
+    @classmethod
+    def make(cls, message_filter):
+        """
+        :param message_filter: None, a MIDIFilter or a list of Mido message types to skip
+        :return: None or a MIDIFilter
+        """
+        if message_filter is None or isinstance(message_filter, MIDIFilter):
+            return message_filter
+        return MIDIFilter(skip_types=message_filter)
+
+    def __call__(self, message):
+        """
+        :return: the message, a transformed copy of it or None if the message is skipped
+        """
+        if message.type in self.skip_types:
+            return None
+        return message if self.fn is None else self.fn(message)
+
+    def compile(self):
+        """
+        :return: the function of the filter without the type mask, None if the filter only skips the types
+        """
+        if (self.channels is None and self.note_range is None and not self.min_velocity and not self.transpose
+                and not self.channel_map):
+            # e.g. the aftertouch filter of the synth's port
+            return None
+
+        # the masks are indexed by the channel and the note, the transforms are lookup tables as well
+        channel_mask = [self.channels is None or ch in self.channels for ch in range(CHANNEL_CNT)]
+        low, high = (0, NOTE_CNT - 1) if self.note_range is None else self.note_range
+        note_mask = [low <= n <= high and 0 <= n + self.transpose < NOTE_CNT for n in range(NOTE_CNT)]
+        min_velocity = self.min_velocity
+        transpose = self.transpose
+        channel_map = None
+        if self.channel_map:
+            channel_map = [self.channel_map.get(ch, ch) for ch in range(CHANNEL_CNT)]
+
+        def fn(message):
+            msg_type = message.type
+            if msg_type not in CHANNEL_TYPES:
+                return message
+
+            channel = message.channel
+            if not channel_mask[channel]:
+                return None
+
+            changes = None
+            if msg_type in NOTE_TYPES:
+                note = message.note
+                if not note_mask[note]:
+                    return None
+                if msg_type == "note_on" and 0 < message.velocity < min_velocity:
+                    return None
+                if transpose:
+                    changes = {"note": note + transpose}
+
+            if channel_map is not None and channel_map[channel] != channel:
+                changes = changes or {}
+                changes["channel"] = channel_map[channel]
+
+            return message if changes is None else message.copy(**changes)
+
+        return fn
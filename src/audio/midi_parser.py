@@ -1,4 +1,4 @@
-import re
+from time import monotonic
 from dataclasses import dataclass
 
 from theory import Chord
@@ -10,15 +10,8 @@ NOTE = "note"
 VELOCITY = "velocity"
 NOTE_ON = "note_on"
 NOTE_OFF = "note_off"
-CHANNEL_RE = f"(?P<{CHANNEL}>" + "[0-9]{1,2})"
-NOTE_RE = f"(?P<{NOTE}>" + "[0-9]{1,3})"
-VELOCITY_RE = f"(?P<{VELOCITY}>" + "[0-9]{1,3})"
-
-# note_on channel=0 note=55 velocity=64 time=0
-NOTE_ON_RE = f"^({NOTE_ON}) ({CHANNEL}=){CHANNEL_RE} ({NOTE}=){NOTE_RE} ({VELOCITY}=){VELOCITY_RE}"
-
-# note_off channel=0 note=55 velocity=64 time=0
-NOTE_OFF_RE = f"^({NOTE_OFF}) ({CHANNEL}=){CHANNEL_RE} ({NOTE}=){NOTE_RE} ({VELOCITY}=){VELOCITY_RE}"
+CHANNEL_CNT = 16
+JITTER_GAIN = 1 / 16   # the smoothing of the jitter estimate, as in RFC 3550
 
 
 @dataclass
@@ -28,12 +21,21 @@ class MIDINote:
     velocity: int
 
 
+# With the ingest times of the messages (parse_timestamped()) and the metrics, the parser records
+# midi_note_s, the time from the ingest to the return of note_fn, and midi_jitter_s, the change
+# of that latency between the notes.  jitter_s is the smoothed jitter.
 class MIDIParser:
-    def __init__(self, enable_print=True):
+    def __init__(self, enable_print=True, metrics=None):
         self.print = enable_print
         self.chords = Chord.semitones_to_chords()
-        self.notes = set()
+        self.notes = set()   # the notes held on any channel
+        self.channel_notes = [set() for _ in range(CHANNEL_CNT)]
         self.note_fn = None
+        self.metrics = metrics
+        self.timestamp = None   # ingest time of the message being parsed, time.monotonic()
+        self.jitter_s = 0.0
+        self._latency_s = None
+        self._handlers = {NOTE_ON: self._note_on, NOTE_OFF: self._note_off}
 
     def get_notes(self, midi_notes_set):
         midi_notes = sorted(list(midi_notes_set))
@@ -59,40 +61,82 @@ class MIDIParser:
 
     def parse(self, message):
         """
-        :param message:
+        Dispatches the message on its type, the types with no handler (e.g. the controllers) are skipped.
+        :param message: a Mido message or None
         :return:
         """
         if message is None:
             return
 
-        msg = str(message)
+        handler = self._handlers.get(message.type, None)
+        if handler is not None:
+            handler(message)
 
-        n = re.search(NOTE_ON_RE, msg)
-        if n is not None:
-            # note = MIDINote(int(n.group(CHANNEL)), int(n.group(NOTE)), int(n.group(VELOCITY)))
-            note_num = int(n.group(NOTE))
-            self.notes.add(note_num)
-            if self.print:
-                self.print_notes()
+    def parse_batch(self, messages):
+        """
+        Parses the messages in order, e.g. a batch taken with MIDIRouter.drain().
+        :param messages: a list of Mido messages
+        """
+        handlers = self._handlers
+        for message in messages:
+            handler = handlers.get(message.type, None)
+            if handler is not None:
+                handler(message)
 
-            if self.note_fn is not None:
-                self.note_fn(note_num, True)
+    def parse_timestamped(self, items):
+        """
+        Parses the messages in order and records the latency of the notes, see MIDIRouter.drain_timestamped().
+        :param items: a list of (ingest time, Mido message), the time is time.monotonic()
+        """
+        handlers = self._handlers
+        for timestamp, message in items:
+            self.timestamp = timestamp
+            handler = handlers.get(message.type, None)
+            if handler is not None:
+                handler(message)
+        self.timestamp = None
+
+    def _record_latency(self):
+        if self.metrics is None or self.timestamp is None:
             return
 
-        if len(self.notes) == 0:
+        latency_s = monotonic() - self.timestamp
+        self.metrics.record("midi_note_s", latency_s)
+        if self._latency_s is not None:
+            jitter_s = abs(latency_s - self._latency_s)
+            self.metrics.record("midi_jitter_s", jitter_s)
+            self.jitter_s += (jitter_s - self.jitter_s) * JITTER_GAIN
+        self._latency_s = latency_s
+
+    def _note_on(self, message):
+        # note_on with velocity 0 is the running status form of note_off
+        if message.velocity == 0:
+            self._note_off(message)
             return
 
-        n = re.search(NOTE_OFF_RE, msg)
-        if n is not None:
-            # note = MIDINote(int(n.group(CHANNEL)), int(n.group(NOTE)), int(n.group(VELOCITY)))
-            note_num = int(n.group(NOTE))
-            try:
-                self.notes.remove(note_num)
-            except:
-                pass
-            if self.note_fn is not None:
-                self.note_fn(note_num, False)
-            return
+        note_num = message.note
+        self.channel_notes[message.channel].add(note_num)
+        self.notes.add(note_num)
+        if self.print:
+            self.print_notes()
+
+        if self.note_fn is not None:
+            self.note_fn(note_num, True)
+        self._record_latency()
+
+    def _note_off(self, message):
+        note_num = message.note
+        held = self.channel_notes[message.channel]
+        # the off of a note that is not held (e.g. held before the start) is still passed on
+        if note_num in held:
+            held.remove(note_num)
+            # the note might still sound on another channel
+            if not any(note_num in notes for notes in self.channel_notes):
+                self.notes.discard(note_num)
+
+        if self.note_fn is not None:
+            self.note_fn(note_num, False)
+        self._record_latency()
 
     @classmethod
     def semitones(cls, notes):
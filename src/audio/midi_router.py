@@ -1,12 +1,20 @@
-from queue import Queue
+from time import monotonic
+from collections import deque
+from threading import Event
+from typing import List
 import mido
 
+from .midi_filter import MIDIFilter
+from .metrics import Metrics
+
 
 # This module is inspired by:
 # https://github.com/icaroferre/MIDIRouter
 
 
 MAX_MESSAGE_QUEUE_SIZE = 100
+MAX_BATCH_SIZE = 64
+GET_TIMEOUT_S = 0.1   # max wait of the blocking calls, they check for stop() at least this often
 
 
 class MIDIPort:
@@ -52,8 +60,11 @@ class MIDIPort:
         if self.port is None:
             return
 
-        if self.filter is not None:
-            if message.type in self.filter:
+        if message.type in self._skip_types:
+            return
+        if self._filter_fn is not None:
+            message = self._filter_fn(message)
+            if message is None:
                 return
 
         try:
@@ -64,16 +75,12 @@ class MIDIPort:
     def set_filter(self, message_filter=None):
         """
         Deines the filter for send()
-        :param message_filter: a list of Mido Message types, ex "aftertouch"
+        :param message_filter: a MIDIFilter or a list of Mido Message types to skip, ex "aftertouch"
         :return:
         """
-        if message_filter is None:
-            self.filter = None
-            return
-
-        self.filter = []
-        for msg in message_filter:
-            self.filter.append(msg)
+        self.filter = MIDIFilter.make(message_filter)
+        self._skip_types = frozenset() if self.filter is None else self.filter.skip_types
+        self._filter_fn = None if self.filter is None else self.filter.fn
 
     def is_open(self):
         return self.port is not None
@@ -85,16 +92,166 @@ class MIDIPort:
         return self.name
 
 
+# The class is a subscriber of the MIDI router: a ring of the most recent messages for one consumer,
+# e.g. the parser or the UI.  The router's callback only appends to the ring, it never waits for the consumer.
+# The ring drops the oldest message when it is full and counts the drops.
+# The deque's append() and popleft() are atomic, the event wakes the blocked consumer.
+# The ring keeps the ingest time (time.monotonic()) of every message, see timestamp and drain_timestamped().
+class MIDISubscriber:
+    def __init__(self, max_len=MAX_MESSAGE_QUEUE_SIZE, message_filter=None):
+        """
+        :param max_len: the max number of messages waiting for the consumer
+        :param message_filter: a MIDIFilter or a list of Mido message types the subscriber skips, ex "aftertouch"
+        """
+        self.filter = MIDIFilter.make(message_filter)
+        self._skip_types = frozenset() if self.filter is None else self.filter.skip_types
+        self._filter_fn = None if self.filter is None else self.filter.fn
+        self.drop_cnt = 0
+        self.timestamp = 0.0   # ingest time of the message returned by the last get_message()
+        self._messages = deque(maxlen=max_len)
+        self._available = Event()
+        self._stop_event = Event()
+
+    def put(self, message, timestamp=None):
+        """
+        The router's side.
+        :param message: a Mido message
+        :param timestamp: the time.monotonic() when the message was ingested, None uses the current time
+        """
+        if message.type in self._skip_types:
+            return
+        if self._filter_fn is not None:
+            message = self._filter_fn(message)
+            if message is None:
+                return
+
+        if len(self._messages) == self._messages.maxlen:
+            self.drop_cnt += 1
+        self._messages.append((monotonic() if timestamp is None else timestamp, message))
+        self._available.set()
+
+    def size(self):
+        return len(self._messages)
+
+    def get_message(self, timeout=0.0):
+        """
+        :param timeout: 0 does not wait, None waits until a message arrives or stop(), otherwise the max wait, s
+        :return: the oldest message or None
+        """
+        item = self._get(timeout)
+        if item is None:
+            return None
+
+        self.timestamp, message = item
+        return message
+
+    def _get(self, timeout):
+        try:
+            return self._messages.popleft()
+        except IndexError:
+            if timeout == 0:
+                return None
+
+        # a message that arrives after clear() sets the event again
+        # after stop() the wait still takes the timeout, so the consumer loops do not spin
+        self._available.clear()
+        if not self._messages and (timeout is not None or not self._stop_event.is_set()):
+            self._available.wait(timeout)
+        try:
+            return self._messages.popleft()
+        except IndexError:
+            return None
+
+    def drain(self, max_n=MAX_BATCH_SIZE, timeout=0.0):
+        """
+        Waits for the first message and takes the ones that are already queued, up to max_n.
+        :param max_n: the max number of messages
+        :param timeout: the max wait for the first message, see get_message()
+        :return: a list of the messages, the oldest first, empty if none arrived
+        """
+        return [message for _, message in self.drain_timestamped(max_n, timeout)]
+
+    def drain_timestamped(self, max_n=MAX_BATCH_SIZE, timeout=0.0):
+        """
+        See drain().
+        :return: a list of (ingest time, message), the time is time.monotonic()
+        """
+        item = self._get(timeout)
+        if item is None:
+            return []
+
+        batch = [item]
+        popleft = self._messages.popleft
+        while len(batch) < max_n:
+            try:
+                batch.append(popleft())
+            except IndexError:
+                break
+        return batch
+
+    def __iter__(self):
+        return self.iter_messages()
+
+    def iter_messages(self, timeout=None):
+        """
+        Yields the messages as they arrive, blocking in between.  The iteration ends at stop().
+        :param timeout: the iteration also ends when no message arrives for this long, s, None never
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while not self._stop_event.is_set():
+            wait = GET_TIMEOUT_S
+            if deadline is not None:
+                wait = min(wait, deadline - monotonic())
+                if wait <= 0:
+                    return
+
+            message = self.get_message(wait)
+            if message is None:
+                continue
+
+            yield message
+            if deadline is not None:
+                deadline = monotonic() + timeout
+
+    def clear(self):
+        self._messages.clear()
+
+    def start(self):
+        self._stop_event.clear()
+
+    def stop(self):
+        # wakes the blocked consumer
+        self._stop_event.set()
+        self._available.set()
+
+
 class MIDIRouter:
-    def __init__(self, port_in: str = None, port_out: str = None, message_filter=None):
+    """
+    Routes the messages of N input ports to M output ports and to the subscribers.
+    Every input forwards to its own outputs (all the outputs unless route() says otherwise), every output
+    has its own filter.  The forwarding happens in the callback of the input port, before the subscribers
+    get the message, so a slow subscriber (e.g. the UI) never delays the synth.
+    The routes and the subscribers are tuples that are replaced as a whole, the callback reads them with no lock.
+    The first input and output are port_in and port_out, the default subscriber keeps the router's messages
+    for get_message() and drain().
+    Every message is timestamped (time.monotonic()) when the callback gets it, the subscribers keep the time.
+    With metrics, the time from the ingest to the end of the forwarding is recorded in midi_forward_s.
+    """
+    def __init__(self, port_in: str = None, port_out: str = None, message_filter=None, metrics: Metrics = None):
         self.port_in = MIDIPort()
         self.port_out = MIDIPort(message_filter=message_filter)
+        self.inputs = [self.port_in]
+        self.outputs = [self.port_out]
+        self._routes = {}   # input port -> a tuple of output ports, no entry routes to all the outputs
+        self._all_outputs = (self.port_out,)
 
         self.enabled = False
-        self.messages = Queue(maxsize=MAX_MESSAGE_QUEUE_SIZE)
+        self.metrics = metrics
+        self.subscriber = MIDISubscriber()
+        self._subscribers = (self.subscriber,)
 
         if port_in is not None:
-            self.port_in.open(port_in, output=False, callback=self.input_message_handler)
+            self.port_in.open(port_in, output=False, callback=self._input_handler(self.port_in))
 
         if port_out is not None:
             self.port_out.open(port_out, output=True)
@@ -113,46 +270,139 @@ class MIDIRouter:
         if output:
             self.port_out.open(port, output=True)
         else:
-            self.port_in.open(port, output=False, callback=self.input_message_handler)
+            self.port_in.open(port, output=False, callback=self._input_handler(self.port_in))
 
-    def input_message_handler(self, message):
+    def add_input(self, port: str, outputs: List[MIDIPort] = None) -> MIDIPort:
+        """
+        Opens another input port.
+        :param port: the name of the port
+        :param outputs: the outputs of the input, None routes to all the outputs
+        :return: the port, not open if the port cannot be opened
+        """
+        midi_port = MIDIPort()
+        midi_port.open(port, output=False, callback=self._input_handler(midi_port))
+        self.inputs.append(midi_port)
+        if outputs is not None:
+            self.route(midi_port, outputs)
+        return midi_port
+
+    def add_output(self, port, message_filter=None) -> MIDIPort:
+        """
+        Adds another output port, the inputs with no route() send to it.
+        :param port: the name of the port to open, or an open MIDIPort
+        :param message_filter: the filter of the opened port, see MIDIPort.set_filter()
+        :return: the port, not open if the port cannot be opened
+        """
+        if isinstance(port, MIDIPort):
+            midi_port = port
+        else:
+            midi_port = MIDIPort(message_filter=message_filter)
+            midi_port.open(port, output=True)
+        self.outputs.append(midi_port)
+        self._all_outputs = tuple(self.outputs)
+        return midi_port
+
+    def route(self, port_in: MIDIPort, outputs: List[MIDIPort] = None):
+        """
+        Sets the outputs of the input port.
+        :param port_in: one of the inputs
+        :param outputs: a list of the outputs, None routes to all the outputs
+        """
+        if outputs is None:
+            self._routes.pop(port_in, None)
+        else:
+            self._routes[port_in] = tuple(outputs)
+
+    def subscribe(self, max_len=MAX_MESSAGE_QUEUE_SIZE, message_filter=None) -> MIDISubscriber:
+        """
+        Adds a subscriber that gets every message of the inputs and put_message().
+        :param max_len: the max number of messages waiting for the subscriber
+        :param message_filter: a MIDIFilter or a list of Mido message types the subscriber skips
+        :return: the subscriber
+        """
+        subscriber = MIDISubscriber(max_len=max_len, message_filter=message_filter)
+        self._subscribers = self._subscribers + (subscriber,)
+        return subscriber
+
+    def unsubscribe(self, subscriber: MIDISubscriber):
+        subscriber.stop()
+        self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+
+    @property
+    def drop_cnt(self):
+        """
+        :return: number of messages dropped because a subscriber fell behind
+        """
+        return sum(subscriber.drop_cnt for subscriber in self._subscribers)
+
+    def _input_handler(self, port_in):
+        # the callback of the input port, it runs in the port's thread
+        def handler(message):
+            self.input_message_handler(message, port_in)
+        return handler
+
+    def input_message_handler(self, message, port_in: MIDIPort = None):
         if not self.enabled:
             return
 
-        self.port_out.send(message)
+        self._forward(message, self._routes.get(port_in, self._all_outputs))
 
-        try:
-            self.messages.put_nowait(message)
-        except:
-            pass
+    def _forward(self, message, outputs):
+        timestamp = monotonic()
+        for port in outputs:
+            port.send(message)
+        if self.metrics is not None:
+            self.metrics.record("midi_forward_s", monotonic() - timestamp)
 
-    def get_message(self):
-        try:
-            message = self.messages.get_nowait()
-        except:
-            return None
+        for subscriber in self._subscribers:
+            subscriber.put(message, timestamp)
 
-        return message
+    def get_message(self, timeout=0.0):
+        """
+        :param timeout: 0 does not wait, None waits until a message arrives, otherwise the max wait, s
+        :return: the oldest message of the default subscriber or None
+        """
+        return self.subscriber.get_message(timeout)
 
-    def put_message(self, message):
-        self.port_out.send(message)
+    def drain(self, max_n=MAX_BATCH_SIZE, timeout=0.0):
+        """
+        See MIDISubscriber.drain(), the messages of the default subscriber.
+        """
+        return self.subscriber.drain(max_n, timeout)
 
-        try:
-            self.messages.put_nowait(message)
-        except:
-            pass
+    def drain_timestamped(self, max_n=MAX_BATCH_SIZE, timeout=0.0):
+        """
+        See MIDISubscriber.drain_timestamped(), the messages of the default subscriber.
+        """
+        return self.subscriber.drain_timestamped(max_n, timeout)
+
+    def __iter__(self):
+        return self.iter_messages()
+
+    def iter_messages(self, timeout=None):
+        """
+        See MIDISubscriber.iter_messages(), the messages of the default subscriber.
+        """
+        return self.subscriber.iter_messages(timeout)
+
+    def put_message(self, message):
+        self._forward(message, self._all_outputs)
 
     def clear_messages(self):
-        while True:
-            if self.get_message() is None:
-                return
+        for subscriber in self._subscribers:
+            subscriber.clear()
 
     def start(self):
-        self.enabled = self.port_in.is_open() and self.port_out.is_open()
+        for subscriber in self._subscribers:
+            subscriber.start()
+        self.enabled = (any(port.is_open() for port in self.inputs) and
+                        any(port.is_open() for port in self.outputs))
         return self.enabled
 
     def stop(self):
         self.enabled = False
-        self.port_in.close()
-        self.port_out.close()
+        for subscriber in self._subscribers:
+            subscriber.stop()
+        for port in self.inputs + self.outputs:
+            port.close()
         self.clear_messages()
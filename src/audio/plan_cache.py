@@ -0,0 +1,117 @@
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from threading import Lock
+from collections import OrderedDict
+
+import numpy as np
+
+
+# The class implements the cache of precomputed transform kernels (plans).
+# A plan is a dict of NumPy arrays and scalars.  The plans are kept in an in-process LRU
+# and optionally stored as .npz files, so they survive the process restart.
+# The cached arrays are shared by the transforms and are read-only.
+# The stored plans are keyed by PLAN_VERSION as well, bump it when the content of a plan changes
+# and the plans stored by the older code are ignored.
+class PlanCache:
+    MAX_LEN = 16
+    PLAN_VERSION = 1
+
+    def __init__(self, max_len=MAX_LEN, path=None):
+        self.max_len = max_len
+        self.path = None
+        self._plans = OrderedDict()
+        self._lock = Lock()
+
+        # stats
+        self.hit_cnt = 0
+        self.disk_hit_cnt = 0
+        self.miss_cnt = 0
+
+        self.set_path(path)
+
+    def set_path(self, path=None):
+        """
+        Enables the on-disk store.
+        :param path: a folder for the .npz files, None disables the on-disk store
+        """
+        self.path = None if path is None else Path(path).expanduser()
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def get(self, key, make_plan):
+        """
+        Returns the plan for the key.
+        :param key: a tuple of all the parameters the plan depends on
+        :param make_plan: a function that computes the plan when it is not cached
+        :return: the plan dict
+        """
+        with self._lock:
+            plan = self._plans.get(key, None)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hit_cnt += 1
+                return plan
+
+        plan = self._load(key)
+        if plan is not None:
+            self.disk_hit_cnt += 1
+        else:
+            plan = make_plan()
+            self.miss_cnt += 1
+            self._save(key, plan)
+
+        for value in plan.values():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_len:
+                self._plans.popitem(last=False)
+        return plan
+
+    def __len__(self):
+        return len(self._plans)
+
+    def _stored_key(self, key):
+        return repr((self.PLAN_VERSION, key))
+
+    def _file_name(self, key):
+        return self.path / (hashlib.sha1(self._stored_key(key).encode()).hexdigest() + ".npz")
+
+    def _load(self, key):
+        if self.path is None:
+            return None
+
+        try:
+            with np.load(self._file_name(key)) as data:
+                if str(data["_key"]) != self._stored_key(key):
+                    return None
+                return {name: (data[name][()] if data[name].ndim == 0 else data[name])
+                        for name in data.files if name != "_key"}
+        except:
+            return None
+
+    def _save(self, key, plan):
+        if self.path is None:
+            return
+
+        # write to a temporary file first, so other processes never load a partial plan
+        tmp_name = None
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, _key=self._stored_key(key), **plan)
+            os.replace(tmp_name, self._file_name(key))
+        except:
+            # e.g. the disk is full, the partial file is not left behind
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except:
+                    pass
@@ -0,0 +1,132 @@
+import math
+import wave
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+from theory import Note
+
+
+# The class generates deterministic synthetic instrument signals for the tests and the benchmarks,
+# so the DSP path can be measured without a microphone.
+# A tone is a sum of harmonics with the string inharmonicity (the partial k is at k * f0 * sqrt(1 + B * k^2)),
+# an optional vibrato and white noise.  Every note is detuned by a random amount, so the estimators have to
+# resolve the pitch rather than land on the nominal frequency.  The same seed gives the same signals.
+class SignalGenerator:
+    SAMPLE_RATE = 48000
+    HARMONICS = [1.0, 0.6, 0.4, 0.25, 0.15, 0.1]   # the amplitudes of the partials
+    INHARMONICITY = 1e-4   # B, about a guitar string, a piano bass string is ~1e-3
+    LEVEL = 0.3            # the peak of the tone
+    NOISE_LEVEL = 0.01     # rms of the noise
+    VIBRATO_HZ = 5.0
+    VIBRATO_CENTS = 0.0    # depth, 0 is no vibrato
+    DETUNE_CENTS = 20.0    # max detune of a note
+
+    def __init__(self, sample_rate=SAMPLE_RATE, harmonics=None, inharmonicity=INHARMONICITY,
+                 noise_level=NOISE_LEVEL, vibrato_hz=VIBRATO_HZ, vibrato_cents=VIBRATO_CENTS,
+                 detune_cents=DETUNE_CENTS, note_a_freq_hz=440.0, seed=0):
+        """
+        :param sample_rate: the sample rate, Hz
+        :param harmonics: the amplitudes of the partials, the first is the fundamental
+        :param inharmonicity: the inharmonicity coefficient B, 0 is a harmonic tone
+        :param noise_level: rms of the white noise relative to full scale
+        :param vibrato_hz: the vibrato rate, Hz
+        :param vibrato_cents: the vibrato depth, cents
+        :param detune_cents: every note is detuned by a random amount up to this, cents
+        :param note_a_freq_hz: A4 frequency, Hz
+        :param seed: the seed of the random phases, detune and noise
+        """
+        self.sample_rate = sample_rate
+        self.harmonics = SignalGenerator.HARMONICS if harmonics is None else list(harmonics)
+        self.inharmonicity = inharmonicity
+        self.noise_level = noise_level
+        self.vibrato_hz = vibrato_hz
+        self.vibrato_cents = vibrato_cents
+        self.detune_cents = detune_cents
+        self.note_a_freq_hz = note_a_freq_hz
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+
+    def reset(self):
+        """
+        Restarts the random sequence, the next signals repeat the ones generated after the construction.
+        """
+        self._rng = np.random.default_rng(self.seed)
+
+    def partial_freqs(self, freq):
+        """
+        :param freq: the fundamental, Hz
+        :return: the frequencies of the partials, Hz
+        """
+        k = np.arange(1, len(self.harmonics) + 1)
+        return k * freq * np.sqrt(1 + self.inharmonicity * k ** 2)
+
+    def tone(self, freq, sample_cnt) -> np.array:
+        """
+        :param freq: the fundamental, Hz, the vibrato swings around it
+        :param sample_cnt: number of samples
+        :return: float32 samples
+        """
+        t = np.arange(sample_cnt) / self.sample_rate
+        # the vibrato modulates the instantaneous frequency, the phase is its integral
+        ratio = np.ones(sample_cnt)
+        if self.vibrato_cents:
+            ratio = 2 ** (self.vibrato_cents / 1200 * np.sin(2 * np.pi * self.vibrato_hz * t))
+        phase = 2 * np.pi * np.cumsum(ratio) / self.sample_rate
+
+        x = np.zeros(sample_cnt)
+        for amp, partial in zip(self.harmonics, self.partial_freqs(freq)):
+            if partial >= self.sample_rate / 2:
+                break
+            x += amp * np.sin(partial * phase + self._rng.uniform(0, 2 * np.pi))
+
+        x *= self.LEVEL / np.max(np.abs(x))
+        x += self.noise_level * self._rng.standard_normal(sample_cnt)
+        return x.astype(np.float32)
+
+    def note(self, midi_num, sample_cnt) -> Tuple[float, np.array]:
+        """
+        :param midi_num: MIDI number of the note
+        :param sample_cnt: number of samples
+        :return: a tuple of (the detuned fundamental, Hz, float32 samples)
+        """
+        f0, _, _ = Note.midi_number_to_freq_hz(midi_num, note_a_freq_hz=self.note_a_freq_hz)
+        freq = f0 * 2 ** (self._rng.uniform(-self.detune_cents, self.detune_cents) / 1200)
+        return freq, self.tone(freq, sample_cnt)
+
+    def notes(self, note_range: Tuple[str, str], duration_s):
+        """
+        :param note_range: a tuple of the lowest and the highest note, e.g. ("E2", "E6")
+        :param duration_s: the length of every note, s
+        :return: a generator of (MIDI number, fundamental, Hz, float32 samples) for every note of the range
+        """
+        midi_1 = Note.note_name_to_midi_number(note_range[0])
+        midi_2 = Note.note_name_to_midi_number(note_range[1])
+        sample_cnt = int(duration_s * self.sample_rate)
+        for midi_num in range(midi_1, midi_2 + 1):
+            freq, x = self.note(midi_num, sample_cnt)
+            yield midi_num, freq, x
+
+    @classmethod
+    def frames(cls, x, samples_per_frame):
+        """
+        :return: a generator of the whole frames of x, the incomplete frame at the end is skipped
+        """
+        for start in range(0, len(x) - samples_per_frame + 1, samples_per_frame):
+            yield x[start:start + samples_per_frame]
+
+    @classmethod
+    def cents(cls, freq, ref_freq):
+        return 1200 * math.log2(freq / ref_freq)
+
+    def write_wav(self, path, x):
+        """
+        Writes the samples to a 16-bit mono WAV file, see AudioFileReader.
+        """
+        data = (np.clip(x, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        with wave.open(str(Path(path)), "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(data)
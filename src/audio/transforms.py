@@ -8,22 +8,86 @@
 # Sukhoy, V., Stoytchev, A. Generalizing the inverse FFT off the unit circle. Sci Rep 9, 14443 (2019).
 # https://doi.org/10.1038/s41598-019-50234-9
 
+# the YIN code below follows
+# de Cheveigné, A., Kawahara, H. YIN, a fundamental frequency estimator for speech and music.
+# J. Acoust. Soc. Am. 111, 1917 (2002).
+
 import numpy as np
 import math
-from copy import copy
-from typing import Tuple
+from typing import Tuple, List
 from abc import ABC, abstractmethod
 
+from audio.plan_cache import PlanCache
+
 fft = np.fft.fft
 rfft = np.fft.rfft
 ifft = np.fft.ifft
+irfft = np.fft.irfft
+
+# NumPy 2.0 added the "out" argument to the FFT functions.  The same release computes the float32/complex64
+# FFT in single precision, before that the FFT is always done in double precision.
+try:
+    fft(np.zeros(2, dtype=complex), out=np.empty(2, dtype=complex))
+    FFT_OUT = True
+except TypeError:
+    FFT_OUT = False
+
+
+def _fft(x, out):
+    if FFT_OUT:
+        return fft(x, out=out)
+    out[:] = fft(x)
+    return out
+
+
+def _ifft(x, out):
+    if FFT_OUT:
+        return ifft(x, out=out)
+    out[:] = ifft(x)
+    return out
+
+
+def _rfft(x, out):
+    if FFT_OUT:
+        return rfft(x, out=out)
+    out[:] = rfft(x)
+    return out
 
 
 class Transform(ABC):
+    PRECISION_DOUBLE = 0   # float64/complex128
+    # float32/complex64, halves the memory traffic per frame.  Needs NumPy 2, the older FFT computes
+    # in complex128 and the single precision only adds the casts, it is slower than double (see bench_precision)
+    PRECISION_SINGLE = 1
+
+    @classmethod
+    def precision_dtypes(cls, precision):
+        """
+        :param precision: PRECISION_DOUBLE or PRECISION_SINGLE
+        :return: a tuple of (real dtype, complex dtype) for the precision
+        """
+        if precision == cls.PRECISION_SINGLE:
+            return np.float32, np.complex64
+        return np.float64, np.complex128
+
     @abstractmethod
     def process(self, data: np.array) -> np.array:
         return None
 
+    def process_batch(self, frames) -> np.array:
+        """
+        Processes several frames at once, e.g. the frames that piled up in the input queue.
+        The default implementation calls process() for every frame.
+        :param frames: ndarray[k, n] or a list of k frames
+        :return: ndarray[k, bins], the spectrum of every frame
+        """
+        return np.stack([np.array(self.process(frame)) for frame in frames])
+
+    def _stack_frames(self, frames):
+        if isinstance(frames, np.ndarray) and frames.ndim == 2 and frames.dtype == self.sample_dtype:
+            return frames
+        return np.stack([np.frombuffer(frame, self.sample_dtype) for frame in frames])
+
     @abstractmethod
     def bin_to_freq(self, bin: int) -> float:
         return 0.0
@@ -33,8 +97,71 @@ class Transform(ABC):
         return 0
 
 
+# The class implements the analysis window of window_size samples that slides by hop_size samples.
+# The samples are kept in a ring, ingesting a hop copies hop_size samples and nothing is shifted.
+# The oldest sample is at the write position, so the window is applied in two segments.
+class SlidingWindow:
+    def __init__(self, window_size, hop_size, sample_dtype=np.float32):
+        if hop_size > window_size:
+            raise ValueError("The hop cannot be longer than the window")
+
+        self.window_size = int(window_size)
+        self.hop_size = int(hop_size)
+        self.sample_dtype = sample_dtype
+        self.buffer = np.zeros(self.window_size, dtype=sample_dtype)
+        self.write_pos = 0
+        self.frame_cnt = 0
+
+    def clear(self):
+        self.buffer[:] = 0
+        self.write_pos = 0
+        self.frame_cnt = 0
+
+    def update(self, data):
+        x = np.frombuffer(data, self.sample_dtype)
+        pos = self.write_pos
+        first = min(len(x), self.window_size - pos)
+        self.buffer[pos:pos + first] = x[:first]
+        self.buffer[:len(x) - first] = x[first:]
+        self.write_pos = (pos + len(x)) % self.window_size
+        self.frame_cnt += 1
+
+    def multiply(self, weights, out):
+        """
+        :param weights: window_size weights, e.g. the window function
+        :param out: the output buffer, the first window_size elements are written
+        :return: out, the samples in time order times the weights
+        """
+        split = self.window_size - self.write_pos
+        np.multiply(weights[:split], self.buffer[self.write_pos:], out=out[:split])
+        np.multiply(weights[split:self.window_size], self.buffer[:self.write_pos], out=out[split:self.window_size])
+        return out
+
+    def samples(self):
+        """
+        :return: a copy of the window in time order
+        """
+        return np.concatenate((self.buffer[self.write_pos:], self.buffer[:self.write_pos]))
+
+    def windows(self, frames):
+        """
+        Ingests k hops and returns the k windows that update() would leave one by one.
+        :param frames: ndarray[k, hop_size]
+        :return: ndarray[k, window_size], a strided view
+        """
+        history = np.concatenate((self.samples(), frames.ravel()))
+        windows = np.lib.stride_tricks.sliding_window_view(history, self.window_size)
+        windows = windows[self.hop_size::self.hop_size]
+
+        self.buffer[:] = history[-self.window_size:]
+        self.write_pos = 0
+        self.frame_cnt += len(frames)
+        return windows
+
+
 class STFT(Transform):
-    def __init__(self, sample_rate, samples_per_frame=2048, frames_per_fft=16, sample_dtype=np.float32):
+    def __init__(self, sample_rate, samples_per_frame=2048, frames_per_fft=16, sample_dtype=np.float32,
+                 precision=Transform.PRECISION_DOUBLE, ring_buffer=False):
         """
         Creates an STFT transofm object
         The algorithm uses short time Fourier transform (STFT) in order to
@@ -62,15 +189,28 @@ class STFT(Transform):
         new frame is received.
         The window is Hann window function (raised cosine).
 
+        With ring_buffer set, the buffer is circular and nothing is shifted.
+        The new frame overwrites the oldest one at the write position, and the window is applied
+        in two segments (oldest part first) into a reused buffer.  The FFT and the magnitude are
+        computed into preallocated buffers as well, therefore the spectrum returned by process()
+        is overwritten by the next call.  Ingesting a frame costs SAMPLES_PER_FRAME samples no matter
+        how large FRAMES_PER_FFT is; the window multiply and the FFT still cover the whole buffer.
+
         :param sample_rate:       Sampling frequency in Hz
         :param samples_per_frame: How many samples per frame?
         :param frames_per_fft:    FFT takes average across how many frames?
         :param sample_dtype:      NumPy type of sample data
+        :param precision:         PRECISION_DOUBLE or PRECISION_SINGLE, the precision of the window and the FFT,
+                                  see Transform.PRECISION_SINGLE
+        :param ring_buffer:       use the circular buffer instead of shifting the buffer on every frame
         """
         self.sample_rate = np.int32(sample_rate)
         self.samples_per_frame = np.int32(samples_per_frame)
         self.frames_per_fft = np.int32(frames_per_fft)
         self.sample_dtype = sample_dtype
+        self.precision = precision
+        self.real_dtype, self.complex_dtype = Transform.precision_dtypes(precision)
+        self.ring_buffer = ring_buffer
 
         self.samples_per_fft = np.int32(self.samples_per_frame * self.frames_per_fft)
         self.freq_step = np.float32(self.sample_rate / self.samples_per_fft)
@@ -83,16 +223,24 @@ class STFT(Transform):
         #
         # Matlab hann(n) - creates zeroes on both endpoints.
         self.window = []
-        pad = np.zeros(self.samples_per_fft, dtype=self.sample_dtype)
+        pad = np.zeros(self.samples_per_fft, dtype=self.real_dtype)
         self.window.append(pad)  # window[0] is all zeroes
         for i in range(1, self.frames_per_fft+1):
             sample_cnt = i*self.samples_per_frame
-            window = np.hanning(sample_cnt)
+            window = np.hanning(sample_cnt).astype(self.real_dtype)
             if sample_cnt < self.samples_per_fft:
-                pad = np.zeros(self.samples_per_fft-sample_cnt, dtype=self.sample_dtype)
+                pad = np.zeros(self.samples_per_fft-sample_cnt, dtype=self.real_dtype)
                 window = np.append(window, pad)
             self.window.append(window)
 
+        # ring buffer mode: the position of the oldest frame, where the next frame is written,
+        # and the buffers reused by every frame
+        self._write_pos = 0
+        if self.ring_buffer:
+            self._windowed = np.empty(self.samples_per_fft, dtype=self.real_dtype)
+            self._freq_data = np.empty(self.samples_per_fft // 2 + 1, dtype=self.complex_dtype)
+            self._spectrum = np.empty(self.samples_per_fft // 2 + 1, dtype=self.real_dtype)
+
         self.buffer = None
         self.frame_cnt = 1
         self._clear()
@@ -103,13 +251,29 @@ class STFT(Transform):
 
         self.buffer = np.zeros(self.samples_per_fft, dtype=self.sample_dtype)
         self.frame_cnt = 0
+        self._write_pos = 0
 
     def _update(self, data):
+        if self.ring_buffer:
+            # Overwrite the oldest frame
+            pos = self._write_pos
+            self.buffer[pos:pos+self.samples_per_frame] = np.frombuffer(data, self.sample_dtype)
+            self._write_pos = (pos + self.samples_per_frame) % self.samples_per_fft
+            self.frame_cnt += 1
+            return
+
         # Shift the buffer down and new data in
         self.buffer[:-self.samples_per_frame] = self.buffer[self.samples_per_frame:]
         self.buffer[-self.samples_per_frame:] = np.frombuffer(data, self.sample_dtype)
         self.frame_cnt += 1
 
+    def _window_ring(self, window):
+        # the oldest sample is at the write position, the window is applied in two segments
+        split = self.samples_per_fft - self._write_pos
+        np.multiply(self.buffer[self._write_pos:], window[:split], out=self._windowed[:split])
+        np.multiply(self.buffer[:self._write_pos], window[split:], out=self._windowed[split:])
+        return self._windowed
+
     def process(self, data):
         if data is None:
             self._clear()
@@ -119,7 +283,46 @@ class STFT(Transform):
 
         # Run the FFT on the windowed buffer
         window = self.window[min(self.frames_per_fft, self.frame_cnt)]
-        return np.abs(rfft(self.buffer * window))
+        if self.ring_buffer:
+            freq_data = _rfft(self._window_ring(window), self._freq_data)
+            return np.abs(freq_data, out=self._spectrum)
+
+        windowed = np.multiply(self.buffer, window, dtype=self.real_dtype)
+        return np.abs(rfft(windowed).astype(self.complex_dtype, copy=False))
+
+    def process_batch(self, frames):
+        """
+        Adds k frames to the buffer and returns the k spectra that process() would return one by one.
+        All windowed buffers are transformed with a single 2-D FFT.
+        :param frames: ndarray[k, samples_per_frame] or a list of k frames
+        :return: ndarray[k, samples_per_fft/2 + 1]
+        """
+        frames = self._stack_frames(frames)
+        frame_cnt = len(frames)
+
+        # the buffer in time order followed by the new frames
+        if self.ring_buffer:
+            history = np.concatenate((self.buffer[self._write_pos:], self.buffer[:self._write_pos], frames.ravel()))
+        else:
+            history = np.concatenate((self.buffer, frames.ravel()))
+
+        # the buffer after each new frame, a strided view into the history
+        buffers = np.lib.stride_tricks.sliding_window_view(history, self.samples_per_fft)
+        buffers = buffers[self.samples_per_frame::self.samples_per_frame]
+
+        window_idx = np.minimum(self.frames_per_fft, self.frame_cnt + np.arange(1, frame_cnt + 1))
+        if window_idx[0] == self.frames_per_fft:
+            windows = self.window[self.frames_per_fft]
+        else:
+            windows = np.stack([self.window[i] for i in window_idx])
+
+        windowed = np.multiply(buffers, windows, dtype=self.real_dtype)
+        spectra = np.abs(rfft(windowed, axis=1).astype(self.complex_dtype, copy=False))
+
+        self.buffer[:] = history[-self.samples_per_fft:]
+        self._write_pos = 0
+        self.frame_cnt += frame_cnt
+        return spectra
 
     def bin_to_freq(self, bin):
         return bin * self.freq_step
@@ -129,50 +332,103 @@ class STFT(Transform):
 
 
 class CZT(Transform):
+    plan_cache = PlanCache()
+
     def __init__(self, sample_rate: int, samples_per_frame: int, freq_range: Tuple[float, float], freq_step: float,
-                 sample_dtype=np.float32):
+                 sample_dtype=np.float32, precision=Transform.PRECISION_DOUBLE, window: bool = False,
+                 hop_size: int = None):
         """
         The class implements the Chirp Z transform.
         The class works on samples that delivered in a frame.
         The frequency range should be a lot narrower than the Nyquist frequency for the CZT to work fast.
+        All per-frame work is done in NumPy on preallocated buffers, therefore the spectrum returned
+        by process() is overwritten by the next call.
+        The kernels are kept in CZT.plan_cache, so the transforms with the same parameters are created
+        instantly.  Use CZT.plan_cache.set_path() to keep the kernels on disk between runs.
         :param sample_rate: sampling frequency, e.g. 48000
         :param samples_per_frame:number of samples per frame, e.g. 2048
         :param freq_range: a tuple of (min_freq, max_freq), Hz, e.g. (65, 250)
         :param freq_step: Desired resolution, Hz, e.g. 0.1
         :param sample_dtype: The NumPy type for the sample, e.g. np.float32
+        :param precision: PRECISION_DOUBLE or PRECISION_SINGLE.  With single precision
+                          the kernels are computed in double precision and stored as complex64.
+                          See Transform.PRECISION_SINGLE.
+        :param window: apply Hann window to the frame, it lowers the sidelobes of the strong partials.
+                       The window is folded into the premultiplication and costs nothing per frame.
+        :param hop_size: the samples passed to process().  The analysis window of samples_per_frame samples
+                         slides by hop_size samples, so a long window gives a spectrum every hop.
+                         None - the frames do not overlap, process() gets the whole frame.
         """
         self.sample_rate = np.int32(sample_rate)
         self.samples_per_frame = np.int32(samples_per_frame)
         self.freq_range = freq_range
         self.freq_step = np.float32(freq_step)
         self.sample_dtype = sample_dtype
+        self.precision = precision
+        self.window = window
+        self.real_dtype, self.complex_dtype = Transform.precision_dtypes(precision)
         self.frame_cnt = 0
 
-        # precompute values for CZT
+        self.hop_size = self.samples_per_frame if hop_size is None else np.int32(hop_size)
+        self.sliding_window = None
+        if self.hop_size != self.samples_per_frame:
+            self.sliding_window = SlidingWindow(self.samples_per_frame, self.hop_size, sample_dtype)
+
+        # precomputed values for CZT are shared by the transforms with the same parameters
+        key = ("CZT", int(self.sample_rate), int(self.samples_per_frame), tuple(float(f) for f in self.freq_range),
+               float(self.freq_step), self.precision, self.window)
+        plan = CZT.plan_cache.get(key, self._make_plan)
+        self.k = plan["k"]       # correction factor (normalization)
+        self.Nf = int(plan["Nf"])  # number of frequency points
+        self.W = plan["W"]       # step
+        self.A = plan["A"]       # starting point
+        self.n = int(plan["n"])  # FFT length
+        self.WA = plan["WA"]
+        self.C = plan["C"]
+        self.twiddle = plan["twiddle"]
+
+        self.N = np.arange(self.samples_per_frame)
+        self.M = np.arange(self.Nf)
+
+        # scratch buffers reused by every frame, the tail of xhat is never written and stays zero
+        self._xhat = np.zeros(self.n, dtype=self.complex_dtype)
+        self._X = np.empty(self.n, dtype=self.complex_dtype)
+        self._y = np.empty(self.n, dtype=self.complex_dtype)
+        self._spectrum = np.empty(self.Nf, dtype=self.real_dtype)
+
+    def _make_plan(self):
         Fs = self.sample_rate
         f = np.arange(self.freq_range[0], self.freq_range[1], self.freq_step)
         f1, f2 = f.min(), f.max()
         bw = f2 - f1  # bandwidth
-        self.k = Fs / bw   # correction factor (normalization)
-        self.Nf = len(f)                                        # number of frequency points
-        self.W = np.exp(-2j * np.pi * bw / (self.Nf - 1) / Fs)  # step
-        self.A = np.exp(2j * np.pi * f1 / Fs)                   # starting point
-
-        self.N = np.arange(self.samples_per_frame)
-        self.M = np.arange(self.Nf)
-        self.WA = self.W ** (self.N ** 2 / 2) * self.A ** -self.N
+        k = Fs / bw   # correction factor (normalization)
+        Nf = len(f)                                        # number of frequency points
+        W = np.exp(-2j * np.pi * bw / (Nf - 1) / Fs)  # step
+        A = np.exp(2j * np.pi * f1 / Fs)                   # starting point
+
+        N = np.arange(self.samples_per_frame)
+        M = np.arange(Nf)
+        WA = W ** (N ** 2 / 2) * A ** -N
+        if self.window:
+            WA *= np.hanning(self.samples_per_frame)
+        WA = WA.astype(self.complex_dtype)
 
         # first row and first column of Toeplitz matrix
-        self.r = self.W ** (-(self.N ** 2) / 2)
-        self.c = self.W ** (-(self.M ** 2) / 2)
+        r = W ** (-(N ** 2) / 2)
+        c = W ** (-(M ** 2) / 2)
 
-        N = len(self.r)
-        M = len(self.c)
-        self.n = int(2 ** np.ceil(np.log2(M + N - 1)))
+        N = len(r)
+        M = len(c)
+        n = int(2 ** np.ceil(np.log2(M + N - 1)))
 
         # first column of circulant matrix G
-        self.chat = np.r_[self.c, np.zeros(self.n - (M + N - 1)), self.r[-(N - 1):][::-1]]
-        self.C = fft(self.chat)
+        chat = np.r_[c, np.zeros(n - (M + N - 1)), r[-(N - 1):][::-1]]
+        C = fft(chat).astype(self.complex_dtype)
+
+        # post-twiddle W^(k^2/2) for the Nf output bins
+        twiddle = (W ** (np.arange(Nf) ** 2 / 2)).astype(self.complex_dtype)
+
+        return {"k": k, "Nf": Nf, "W": W, "A": A, "n": n, "WA": WA, "C": C, "twiddle": twiddle}
 
     def _toeplitz_mult_ce(self, x):
         """
@@ -182,16 +438,14 @@ class CZT(Transform):
         first column c = (c[0], c[1], c[2],...,c[M-1]), where r[0] = c[0]."
         See algorithm S1 in Sukhoy & Stoytchev 2019.
         :param x: (np.ndarray): vector to multiply the Toeplitz matrix
-        :return: np.ndarray: product of Toeplitz matrix and vector x
+        :return: np.ndarray: product of Toeplitz matrix and vector x, a view of the scratch buffer
         """
         # zero-pad x
         m = len(x)
-        xhat = np.zeros(self.n, dtype=complex)
-        xhat[:m] = x
+        self._xhat[:m] = x
 
-        yhat = self._circulant_multiply(xhat)
-        y = yhat[:len(self.c)]
-        return y
+        yhat = self._circulant_multiply(self._xhat)
+        return yhat[:self.Nf]
 
     def _circulant_multiply(self, x):
         """
@@ -201,38 +455,362 @@ class CZT(Transform):
         Runs in O(n log n) time.
         See algorithm S4 in Sukhoy & Stoytchev 2019.
         :param x: (np.ndarray): vector x
-        :return: np.ndarray: product Gx
+        :return: np.ndarray: product Gx, a view of the scratch buffer
         """
-        n = len(self.chat)
+        X = _fft(x, self._X)
+        X *= self.C
+        return _ifft(X, self._y)
 
-        X = fft(x)
+    def _premultiply(self, data):
+        # x * WA is written straight into the zero-padded scratch buffer
+        if self.sliding_window is not None:
+            self.sliding_window.update(data)
+            self.sliding_window.multiply(self.WA, self._xhat)
+            return self._xhat
 
-        Y = np.empty(n, dtype=complex)
-        for k in range(n):
-            Y[k] = self.C[k] * X[k]
-
-        y = ifft(Y)
-        return y
+        x = np.frombuffer(data, self.sample_dtype)
+        np.multiply(self.WA, x, out=self._xhat[:len(x)])
+        return self._xhat
 
     def czt(self, x):
         X = self._toeplitz_mult_ce(self.WA * x)
-
-        for k in range(self.Nf):
-            X[k] = self.W ** (k ** 2 / 2) * X[k]
-
-        return X
+        return X * self.twiddle
 
     def process(self, data):
         if data is None:
+            if self.sliding_window is not None:
+                self.sliding_window.clear()
             return None
 
         self.frame_cnt += 1
-        buffer = copy(np.frombuffer(data, self.sample_dtype))
-        freq_data = self.czt(buffer)
-        return np.abs(freq_data)
+        yhat = self._circulant_multiply(self._premultiply(data))
+
+        # the post-twiddle has unit magnitude and does not change the spectrum
+        return np.abs(yhat[:self.Nf], out=self._spectrum)
+
+    def process_batch(self, frames):
+        """
+        Transforms k frames with a single 2-D FFT/IFFT pair.
+        :param frames: ndarray[k, samples_per_frame] or a list of k frames (k hops with hop_size)
+        :return: ndarray[k, Nf]
+        """
+        frames = self._stack_frames(frames)
+        self.frame_cnt += len(frames)
+        if self.sliding_window is not None:
+            frames = self.sliding_window.windows(frames)
+
+        xhat = np.zeros((len(frames), self.n), dtype=self.complex_dtype)
+        np.multiply(frames, self.WA, out=xhat[:, :self.samples_per_frame])
+        X = fft(xhat, axis=1)
+        X *= self.C
+        yhat = ifft(X, axis=1)
+        return np.abs(yhat[:, :self.Nf]).astype(self.real_dtype, copy=False)
 
     def bin_to_freq(self, bin):
         return bin * self.freq_step + self.freq_range[0]
 
     def freq_to_bin(self, freq):
         return np.int32(np.floor((freq-self.freq_range[0]) / self.freq_step))
+
+
+class MultiBandCZT(Transform):
+    GUARD_BIN_CNT = 2
+
+    def __init__(self, sample_rate: int, samples_per_frame: int, center_freqs: List[float], freq_step: float,
+                 band_cents: float = 100.0, guard_bin_cnt: int = GUARD_BIN_CNT, sample_dtype=np.float32,
+                 precision=Transform.PRECISION_DOUBLE, hop_size: int = None):
+        """
+        The class implements narrow zooms around several frequencies, e.g. the fundamentals of the strings
+        of an instrument.  Each band gives the same values as a CZT of the Hann windowed frame over the band would.
+
+        The bands share a single real FFT of the input frame.  The spectrum (DTFT) of the frame at any
+        frequency is a linear combination of the FFT bins (Dirichlet kernel interpolation).
+        For every band only the FFT bins of the band and GUARD_BIN_CNT bins on each side are used,
+        and the interpolation matrix is precomputed.  The frame is Hann windowed, so the bins that are
+        left out carry little energy: the magnitudes are within ~2% of the peak and the peak is within
+        one bin of the exact values.
+        Per frame, the cost is one FFT of the frame plus bands * bins * (band FFT bins) multiplications,
+        which is a lot less than a CZT over the whole range at the same resolution.
+
+        The spectrum is the concatenation of the bands: bin = band * band_bin_cnt + k.
+        The bands are sorted by frequency.
+
+        :param sample_rate: sampling frequency, e.g. 48000
+        :param samples_per_frame: number of samples per frame, e.g. 4096
+        :param center_freqs: the frequencies to zoom at, Hz
+        :param freq_step: Desired resolution, Hz, e.g. 0.1
+        :param band_cents: the band spans +/- band_cents around each center frequency
+        :param guard_bin_cnt: FFT bins used on each side of the band
+        :param sample_dtype: The NumPy type for the sample, e.g. np.float32
+        :param precision: PRECISION_DOUBLE or PRECISION_SINGLE, see Transform.PRECISION_SINGLE
+        :param hop_size: the samples passed to process(), see CZT
+        """
+        self.sample_rate = np.int32(sample_rate)
+        self.samples_per_frame = np.int32(samples_per_frame)
+        self.center_freqs = sorted(center_freqs)
+        self.freq_step = np.float32(freq_step)
+        self.band_cents = band_cents
+        self.guard_bin_cnt = guard_bin_cnt
+        self.sample_dtype = sample_dtype
+        self.precision = precision
+        self.real_dtype, self.complex_dtype = Transform.precision_dtypes(precision)
+        self.frame_cnt = 0
+
+        key = ("MultiBandCZT", int(self.sample_rate), int(self.samples_per_frame),
+               tuple(float(f) for f in self.center_freqs), float(self.freq_step), float(band_cents),
+               int(guard_bin_cnt), self.precision)
+        plan = CZT.plan_cache.get(key, self._make_plan)
+        self.band_bin_cnt = int(plan["band_bin_cnt"])
+        self.n = int(plan["n"])
+        self.band_starts = plan["band_starts"]
+        self.fft_bins = plan["fft_bins"]
+        self.kernel = plan["kernel"]
+        self.band_cnt = len(self.band_starts)
+        self.freq_range = (self.band_starts[0], self.band_starts[-1] + (self.band_bin_cnt - 1) * self.freq_step)
+
+        self.hop_size = self.samples_per_frame if hop_size is None else np.int32(hop_size)
+        self.sliding_window = None
+        if self.hop_size != self.samples_per_frame:
+            self.sliding_window = SlidingWindow(self.samples_per_frame, self.hop_size, sample_dtype)
+
+        self.window = np.hanning(self.samples_per_frame).astype(self.real_dtype)
+        self._windowed = np.zeros(self.n, dtype=self.real_dtype)
+        self._X = np.empty(self.n // 2 + 1, dtype=self.complex_dtype)
+
+    def _make_plan(self):
+        Fs = float(self.sample_rate)
+        N = int(self.samples_per_frame)
+        n = int(2 ** np.ceil(np.log2(N)))
+        step = float(self.freq_step)
+
+        ratio = 2 ** (self.band_cents / 1200)
+        band_starts = np.array(self.center_freqs) / ratio
+        band_ends = np.array(self.center_freqs) * ratio
+
+        # the widest band defines the bin count of all the bands
+        M = int(np.ceil(np.max(band_ends - band_starts) / step)) + 1
+        freqs = band_starts[:, np.newaxis] + step * np.arange(M)[np.newaxis, :]
+
+        # FFT bins of every band, the bands are padded to the same count
+        # the guard covers the main lobe of the Hann window (2 bins of N samples) plus guard_bin_cnt bins
+        guard = int(np.ceil(2 * n / N)) + self.guard_bin_cnt
+        lo = np.floor(freqs[:, 0] * n / Fs).astype(np.int64) - guard
+        hi = np.ceil(freqs[:, -1] * n / Fs).astype(np.int64) + guard
+        K = int(np.max(hi - lo)) + 1
+        lo = np.clip(lo, 0, n // 2 + 1 - K)
+        fft_bins = lo[:, np.newaxis] + np.arange(K)[np.newaxis, :]
+
+        # DTFT of the N samples at f from the FFT bins j of the zero-padded frame:
+        # X(f) = sum_j X[j] * 1/n * sum_t exp(-2pi i (f/Fs - j/n) t), t = 0..N-1
+        theta = freqs[:, :, np.newaxis] / Fs - fft_bins[:, np.newaxis, :] / n
+        z = np.exp(-2j * np.pi * theta)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kernel = np.where(np.abs(1 - z) > 1e-12, (1 - z ** N) / (1 - z), N) / n
+
+        # rfft bins (other than DC and Nyquist) stand for two conjugate bins, the negative one is at -f
+        # and only contributes leakage, so it is left out as the other partials are
+        return {"band_bin_cnt": M, "n": n, "band_starts": band_starts, "fft_bins": fft_bins,
+                "kernel": kernel.astype(self.complex_dtype)}
+
+    def process(self, data):
+        if data is None:
+            if self.sliding_window is not None:
+                self.sliding_window.clear()
+            return None
+
+        self.frame_cnt += 1
+        if self.sliding_window is not None:
+            self.sliding_window.update(data)
+            self.sliding_window.multiply(self.window, self._windowed)
+        else:
+            x = np.frombuffer(data, self.sample_dtype)
+            np.multiply(x, self.window, out=self._windowed[:len(x)])
+        X = _rfft(self._windowed, self._X)
+
+        # bands x bins x FFT bins times bands x FFT bins
+        bands = np.matmul(self.kernel, X[self.fft_bins][:, :, np.newaxis])
+        return np.abs(bands).astype(self.real_dtype, copy=False).ravel()
+
+    def freq_to_band(self, freq):
+        """
+        :return: the index of the band that contains the frequency, or the closest band
+        """
+        band = int(np.searchsorted(self.band_starts, freq, side="right")) - 1
+        if band < 0:
+            return 0
+        if band < self.band_cnt - 1:
+            band_end = self.band_starts[band] + (self.band_bin_cnt - 1) * self.freq_step
+            if freq - band_end > self.band_starts[band + 1] - freq:
+                return band + 1
+        return band
+
+    def bin_to_freq(self, bin):
+        band = min(int(bin // self.band_bin_cnt), self.band_cnt - 1)
+        return self.band_starts[band] + (bin - band * self.band_bin_cnt) * self.freq_step
+
+    def freq_to_bin(self, freq):
+        band = self.freq_to_band(freq)
+        k = np.floor((freq - self.band_starts[band]) / self.freq_step)
+        if band == self.band_cnt - 1 and k >= self.band_bin_cnt:
+            return np.int32(self.band_cnt * self.band_bin_cnt)
+        k = min(max(k, 0), self.band_bin_cnt - 1)
+        return np.int32(band * self.band_bin_cnt + k)
+
+
+class YIN(Transform):
+    THRESHOLD = 0.15
+
+    def __init__(self, sample_rate: int, samples_per_frame: int, freq_range: Tuple[float, float],
+                 window_size: int = None, threshold: float = THRESHOLD, sample_dtype=np.float32):
+        """
+        The class implements the YIN pitch detector in time domain as a streaming transform.
+        Every frame is a hop: the analysis window slides by SAMPLES_PER_FRAME samples on every process().
+
+        The difference function d(lag) = sum (x[j] - x[j+lag])^2 is a sum over the window.
+        The window is split into blocks of SAMPLES_PER_FRAME start indices.  The contribution of each block
+        is computed once, with an FFT based cross-correlation, as soon as MAX_LAG samples after the block
+        are available, and it is kept until the block leaves the window.
+        Therefore, every hop costs one small FFT no matter how long the window is.
+
+        process() returns the salience 1 - d'(lag), where d' is the cumulative mean normalized difference.
+        The bins are lags (in samples), bin_to_freq(lag) = sample_rate / lag.
+        The salience is zero unless d' dips below the threshold, and it is zero after the first dip,
+        so the argmax picks the first dip as YIN does.  Fractional bins are valid for interpolation.
+
+        :param sample_rate: sampling frequency, e.g. 48000
+        :param samples_per_frame: the hop, e.g. 512
+        :param freq_range: a tuple of (min_freq, max_freq), Hz, e.g. (70, 400)
+        :param window_size: integration window, samples.  The default is one period of min_freq.
+                            It is rounded up to a multiple of samples_per_frame.
+        :param threshold: YIN absolute threshold, e.g. 0.15
+        :param sample_dtype: The NumPy type for the sample, e.g. np.float32
+        """
+        self.sample_rate = np.int32(sample_rate)
+        self.samples_per_frame = np.int32(samples_per_frame)
+        self.freq_range = freq_range
+        self.threshold = threshold
+        self.sample_dtype = sample_dtype
+        self.frame_cnt = 0
+
+        self.min_lag = max(2, int(np.floor(self.sample_rate / self.freq_range[1])))
+        self.max_lag = int(np.ceil(self.sample_rate / self.freq_range[0])) + 1
+        if window_size is None:
+            window_size = self.max_lag
+
+        hop = int(self.samples_per_frame)
+        self.block_cnt = int(np.ceil(window_size / hop))           # blocks per window
+        self.window_size = self.block_cnt * hop
+        self.delay_cnt = int(np.ceil(self.max_lag / hop))          # hops to wait for the lagged samples
+
+        # the samples of the oldest block that is not computed yet and the lagged samples after it
+        self.buffer = np.zeros((self.delay_cnt + 1) * hop, dtype=np.float64)
+        self.n = int(2 ** np.ceil(np.log2(hop + self.max_lag)))
+
+        # contributions of the blocks in the window, a ring of block_cnt rows
+        self.blocks = np.zeros((self.block_cnt, self.max_lag + 1), dtype=np.float64)
+        self._block_idx = 0
+        self._lags = np.arange(self.max_lag + 1)
+        self._d = np.zeros(self.max_lag + 1, dtype=np.float64)
+        self._salience = np.zeros(self.max_lag + 1, dtype=np.float64)
+
+    def _clear(self):
+        self.buffer[:] = 0
+        self.blocks[:] = 0
+        self._block_idx = 0
+        self.frame_cnt = 0
+
+    def _update(self, data):
+        hop = self.samples_per_frame
+        self.buffer[:-hop] = self.buffer[hop:]
+        self.buffer[-hop:] = np.frombuffer(data, self.sample_dtype)
+        self.frame_cnt += 1
+
+        # the block at the start of the buffer has all of its lagged samples now
+        if self.frame_cnt <= self.delay_cnt:
+            return
+
+        a = self.buffer[:hop]
+        b = self.buffer[:hop + self.max_lag]
+        acf = irfft(np.conj(rfft(a, self.n)) * rfft(b, self.n), self.n)[:self.max_lag + 1]
+        cs = np.concatenate(([0.0], np.cumsum(b * b)))
+        lagged = cs[self._lags + hop] - cs[self._lags]
+        self.blocks[self._block_idx] = cs[hop] + lagged - 2 * acf
+        self._block_idx = (self._block_idx + 1) % self.block_cnt
+
+    def process(self, data):
+        if data is None:
+            self._clear()
+            return None
+
+        self._update(data)
+
+        np.sum(self.blocks, axis=0, out=self._d)
+        np.maximum(self._d, 0.0, out=self._d)
+        cmndf = YIN.normalize(self._d)
+
+        self._salience[:] = 0.0
+        below = np.nonzero(cmndf[self.min_lag:self.max_lag] < self.threshold)[0]
+        if len(below) == 0:
+            return self._salience
+
+        # keep the first dip and one lag after it
+        lag = below[0] + self.min_lag
+        while lag < self.max_lag and cmndf[lag] < self.threshold:
+            lag += 1
+        self._salience[self.min_lag - 1:lag + 1] = 1.0 - cmndf[self.min_lag - 1:lag + 1]
+        return self._salience
+
+    def bin_to_freq(self, bin):
+        if bin <= 0:
+            return 0.0
+        return self.sample_rate / bin
+
+    def freq_to_bin(self, freq):
+        return np.int32(np.floor(self.sample_rate / freq))
+
+    @classmethod
+    def difference(cls, x, lag_cnt):
+        """
+        YIN difference function d(lag) = sum (x[j] - x[j+lag])^2 over the first len(x) - lag_cnt samples
+        """
+        x = np.asarray(x, dtype=np.float64)
+        w = len(x) - lag_cnt
+        n = int(2 ** np.ceil(np.log2(len(x) + w)))
+        acf = irfft(np.conj(rfft(x[:w], n)) * rfft(x, n), n)[:lag_cnt]
+        cs = np.concatenate(([0.0], np.cumsum(x * x)))
+        energy = cs[w] - cs[0]
+        lagged = cs[np.arange(lag_cnt) + w] - cs[np.arange(lag_cnt)]
+        return np.maximum(energy + lagged - 2 * acf, 0.0)
+
+    @classmethod
+    def normalize(cls, d):
+        # cumulative mean normalized difference function
+        cmndf = np.ones(len(d))
+        cs = np.cumsum(d[1:])
+        lags = np.arange(1, len(d))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cmndf[1:] = np.where(cs > 0, d[1:] * lags / cs, 1.0)
+        return cmndf
+
+    @classmethod
+    def pick_lag(cls, cmndf, min_lag, max_lag, threshold):
+        """
+        The first dip below the threshold (or the global minimum) refined with parabolic interpolation
+        """
+        region = cmndf[min_lag:max_lag]
+        below = np.nonzero(region < threshold)[0]
+        if len(below):
+            lag = below[0] + min_lag
+            while lag + 1 < max_lag and cmndf[lag + 1] < cmndf[lag]:
+                lag += 1
+        else:
+            lag = int(region.argmin()) + min_lag
+            if cmndf[lag] > 2 * threshold:
+                return None
+
+        if 1 <= lag < len(cmndf) - 1:
+            a, b, c = cmndf[lag-1:lag+2]
+            denom = a - 2*b + c
+            if denom > 0:
+                return lag + 0.5 * (a - c) / denom
+        return float(lag)
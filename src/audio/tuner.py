@@ -2,13 +2,16 @@
 # https://mzucker.github.io/2016/08/07/ukulele-tuner.html
 
 import numpy as np
-from audio.input_device import SDInputDevice, PAInputDevice
-from audio.transforms import STFT, CZT
-from theory import Note
+from audio.input_device import InputDevice, SDInputDevice, PAInputDevice
+from audio.transforms import Transform, STFT, CZT, MultiBandCZT, YIN
+from audio.midi_parser import MIDIParser
+from audio.metrics import Metrics
+from theory import Note, Chord
 import time
-from threading import Thread
-from dataclasses import dataclass
-from typing import Tuple
+from threading import Thread, Event
+from dataclasses import dataclass, replace
+from typing import Tuple, List
+from abc import ABC, abstractmethod
 
 
 @dataclass
@@ -21,6 +24,9 @@ class TunerData:
     delta_freq: float = 0.0
     state: int = 0
     queue_size: int = 0
+    latency_s: float = 0.0  # from the frame arrival to the result
+    midi_nums: tuple = ()   # polyphonic mode only
+    chord: str = ""         # polyphonic mode only
 
 
 @dataclass
@@ -29,57 +35,540 @@ class TunerErrors:
     sample: int = 0
 
 
+class PitchEstimator(ABC):
+    """
+    Base class for the pitch estimators used by the Tuner.
+    An estimator gets the spectrum of the frame (that already passed the noise floor threshold),
+    the frame samples and the transform, and returns the pitch in Hz.
+    The estimator keeps the per-frame cost.  accuracy() measures the accuracy on the known frames.
+    """
+    def __init__(self):
+        self.frame_cnt = 0
+        self.total_time_s = 0.0
+
+    def estimate(self, spectrum: np.array, samples: np.array, transform: Transform,
+                 bin_range: Tuple[int, int]) -> float:
+        start = time.perf_counter()
+        freq = self._estimate(spectrum, samples, transform, bin_range)
+        self.total_time_s += time.perf_counter() - start
+        self.frame_cnt += 1
+        return freq
+
+    @abstractmethod
+    def _estimate(self, spectrum, samples, transform, bin_range):
+        return None
+
+    def transform_freq_range(self, freq_range, sample_rate):
+        """
+        :return: the frequency range the transform has to cover for the tuner's freq_range
+        """
+        return freq_range
+
+    def cost_ms(self):
+        """
+        :return: average time per frame spent in the estimator, ms.  The transform is not included.
+        """
+        if self.frame_cnt == 0:
+            return 0.0
+        return 1000 * self.total_time_s / self.frame_cnt
+
+    def accuracy(self, frames, freqs, transform: Transform, bin_range: Tuple[int, int]):
+        """
+        Measures the accuracy on the frames with the known pitch.
+        :param frames: a list of frames
+        :param freqs: a list of the pitches of the frames, Hz
+        :return: a tuple of (mean, max) absolute errors in cents
+        """
+        errors = []
+        for frame, freq in zip(frames, freqs):
+            samples = np.frombuffer(frame, transform.sample_dtype)
+            spectrum = transform.process(frame)
+            estimate = self.estimate(spectrum, samples, transform, bin_range)
+            if estimate is None or estimate <= 0:
+                errors.append(np.inf)
+                continue
+            errors.append(abs(1200 * np.log2(estimate / freq)))
+        return float(np.mean(errors)), float(np.max(errors))
+
+    @classmethod
+    def _peak_bin(cls, spectrum, bin_range):
+        clipped = spectrum[bin_range[0]:bin_range[1]]
+        return int(clipped.argmax()) + bin_range[0]
+
+
+class PeakEstimator(PitchEstimator):
+    """
+    The frequency of the bin with the highest magnitude.
+    The accuracy is limited by the frequency step of the transform.
+    """
+    def _estimate(self, spectrum, samples, transform, bin_range):
+        return transform.bin_to_freq(self._peak_bin(spectrum, bin_range))
+
+
+class ParabolicPeakEstimator(PitchEstimator):
+    """
+    Fits a parabola through the peak bin and its two neighbours and returns the frequency of the vertex.
+    https://ccrma.stanford.edu/~jos/sasp/Quadratic_Interpolation_Spectral_Peaks.html
+    """
+    def _estimate(self, spectrum, samples, transform, bin_range):
+        peak_bin = self._peak_bin(spectrum, bin_range)
+        return transform.bin_to_freq(peak_bin + self._offset(spectrum, peak_bin))
+
+    def _offset(self, spectrum, peak_bin):
+        if peak_bin < 1 or peak_bin >= len(spectrum) - 1:
+            return 0.0
+        a, b, c = self._values(spectrum[peak_bin-1:peak_bin+2])
+        denom = a - 2*b + c
+        if denom >= 0:
+            return 0.0
+        return 0.5 * (a - c) / denom
+
+    def _values(self, values):
+        return values
+
+
+class GaussianPeakEstimator(ParabolicPeakEstimator):
+    """
+    Parabolic interpolation of the log magnitude which is exact for a Gaussian peak.
+    It is less biased than the parabolic interpolation of the magnitude.
+    """
+    def _values(self, values):
+        return np.log(np.maximum(values, 1e-12))
+
+
+class HPSEstimator(PitchEstimator):
+    """
+    Harmonic product spectrum.  The magnitudes at the first HARMONIC_CNT harmonics of every candidate
+    frequency are multiplied, so the fundamental wins even if an overtone is stronger.
+    The transform has to cover the harmonics, see transform_freq_range().
+    The harmonics that are still out of the transform's range are skipped (geometric mean of the rest).
+    The peak is refined with the Gaussian interpolation.
+    """
+    HARMONIC_CNT = 3
+
+    def __init__(self, harmonic_cnt=HARMONIC_CNT):
+        super().__init__()
+        self.harmonic_cnt = harmonic_cnt
+        self._interpolator = GaussianPeakEstimator()
+        self._bins = None
+        self._mask = None
+        self._key = None
+
+    def transform_freq_range(self, freq_range, sample_rate):
+        return freq_range[0], min(self.harmonic_cnt * freq_range[1], 0.45 * sample_rate)
+
+    def _harmonic_bins(self, transform, bin_range, bin_cnt):
+        key = (id(transform), bin_range, bin_cnt)
+        if key != self._key:
+            candidates = np.arange(bin_range[0], bin_range[1])
+            freqs = np.array([transform.bin_to_freq(b) for b in candidates])
+            bins = [candidates]
+            for h in range(2, self.harmonic_cnt + 1):
+                bins.append(np.array([transform.freq_to_bin(h * f) for f in freqs]))
+            bins = np.stack(bins)
+            self._mask = (bins >= 0) & (bins < bin_cnt)
+            self._bins = np.where(self._mask, bins, 0)
+            self._key = key
+        return self._bins, self._mask
+
+    def _estimate(self, spectrum, samples, transform, bin_range):
+        bins, mask = self._harmonic_bins(transform, bin_range, len(spectrum))
+        log_spectrum = np.log(np.maximum(spectrum, 1e-12))
+        score = np.sum(np.where(mask, log_spectrum[bins], 0.0), axis=0) / np.sum(mask, axis=0)
+        peak_bin = int(score.argmax()) + bin_range[0]
+
+        # climb to the spectrum's peak of the fundamental before the interpolation
+        while 0 < peak_bin < len(spectrum) - 1:
+            if spectrum[peak_bin + 1] > spectrum[peak_bin]:
+                peak_bin += 1
+            elif spectrum[peak_bin - 1] > spectrum[peak_bin]:
+                peak_bin -= 1
+            else:
+                break
+        return transform.bin_to_freq(peak_bin + self._interpolator._offset(spectrum, peak_bin))
+
+
+class YINEstimator(PitchEstimator):
+    """
+    YIN pitch estimator that works on the frame samples and ignores the spectrum.
+    The whole difference function is computed for every frame, see the YIN transform for the streaming version.
+    The frame must be longer than two periods of the lowest frequency.
+    """
+    THRESHOLD = 0.15
+
+    def __init__(self, threshold=THRESHOLD):
+        super().__init__()
+        self.threshold = threshold
+
+    def _estimate(self, spectrum, samples, transform, bin_range):
+        sample_rate = transform.sample_rate
+        f1 = transform.bin_to_freq(bin_range[0])
+        f2 = transform.bin_to_freq(bin_range[1])
+        min_lag = max(2, int(sample_rate / f2))
+        max_lag = min(len(samples) // 2, int(np.ceil(sample_rate / f1)) + 1)
+        if max_lag <= min_lag + 1:
+            return None
+
+        d = YIN.difference(samples, max_lag + 1)
+        cmndf = YIN.normalize(d)
+        lag = YIN.pick_lag(cmndf, min_lag, max_lag, self.threshold)
+        if lag is None:
+            return None
+        return sample_rate / lag
+
+
+class HarmonicSieve:
+    """
+    Polyphonic note detector, finds several simultaneous notes, e.g. a strummed chord.
+    Every MIDI note of the range is a candidate.  The salience of a candidate is the weighted (1/h) sum
+    of the spectrum peaks at its first HARMONIC_CNT harmonics, within TOLERANCE_CENTS of the 12-TET frequency.
+    The notes are picked one by one: the strongest candidate is taken and its partials are removed from
+    the spectrum, limited by the spectral smoothness, so the partials shared with other notes survive.
+    Klapuri, A. Multiple fundamental frequency estimation based on harmonicity and spectral smoothness.
+    IEEE Trans. Speech and Audio Processing 11(6), 804 (2003).
+    The transform has to cover the harmonics, see transform_freq_range().
+    """
+    HARMONIC_CNT = 6
+    MAX_NOTE_CNT = 6
+    TOLERANCE_CENTS = 30
+    THRESHOLD = 0.2           # salience of a note relative to the strongest note
+    FUNDAMENTAL_RATIO = 0.1   # the fundamental relative to the strongest partial of the note
+
+    chords = Chord.semitones_to_chords()
+
+    def __init__(self, note_a_freq_hz=440.0, harmonic_cnt=HARMONIC_CNT, max_note_cnt=MAX_NOTE_CNT,
+                 threshold=THRESHOLD):
+        self.note_a_freq_hz = note_a_freq_hz
+        self.harmonic_cnt = harmonic_cnt
+        self.max_note_cnt = max_note_cnt
+        self.threshold = threshold
+        self.weights = 1 / np.arange(1, harmonic_cnt + 1)
+
+        self.frame_cnt = 0
+        self.total_time_s = 0.0
+
+        self._key = None
+        self._midi = None
+        self._bins = None
+        self._mask = None
+
+    def transform_freq_range(self, freq_range, sample_rate):
+        """
+        :return: the frequency range the transform has to cover for the tuner's freq_range
+        """
+        return freq_range[0], min(self.harmonic_cnt * freq_range[1], 0.45 * sample_rate)
+
+    def cost_ms(self):
+        """
+        :return: average time per frame spent in the detector, ms.  The transform is not included.
+        """
+        if self.frame_cnt == 0:
+            return 0.0
+        return 1000 * self.total_time_s / self.frame_cnt
+
+    def _harmonic_bins(self, transform, bin_range, bin_cnt):
+        key = (id(transform), bin_range, bin_cnt)
+        if key == self._key:
+            return self._midi, self._bins, self._mask
+
+        f1 = transform.bin_to_freq(bin_range[0])
+        f2 = transform.bin_to_freq(bin_range[1])
+        midi = []
+        for m in range(Note.freq_to_midi_number(f1, self.note_a_freq_hz),
+                       Note.freq_to_midi_number(f2, self.note_a_freq_hz) + 1):
+            f0, _, _ = Note.midi_number_to_freq_hz(m, note_a_freq_hz=self.note_a_freq_hz)
+            if f1 <= f0 <= f2:
+                midi.append(m)
+
+        # bins of every harmonic of every candidate, padded to the widest window: [candidates, harmonics, bins]
+        tolerance = 2 ** (HarmonicSieve.TOLERANCE_CENTS / 1200)
+        windows = []
+        for m in midi:
+            f0, _, _ = Note.midi_number_to_freq_hz(m, note_a_freq_hz=self.note_a_freq_hz)
+            for h in range(1, self.harmonic_cnt + 1):
+                lo = int(transform.freq_to_bin(h * f0 / tolerance))
+                hi = max(int(transform.freq_to_bin(h * f0 * tolerance)) + 1, lo + 1)
+                windows.append((max(lo, 0), min(hi, bin_cnt)))
+        width = max(hi - lo for lo, hi in windows)
+        lo = np.array([w[0] for w in windows])[:, np.newaxis]
+        hi = np.array([w[1] for w in windows])[:, np.newaxis]
+        bins = lo + np.arange(width)[np.newaxis, :]
+        mask = bins < hi
+
+        shape = (len(midi), self.harmonic_cnt, width)
+        self._midi = np.array(midi)
+        self._bins = np.where(mask, bins, 0).reshape(shape)
+        self._mask = mask.reshape(shape)
+        self._key = key
+        return self._midi, self._bins, self._mask
+
+    def detect(self, spectrum: np.array, transform: Transform, bin_range: Tuple[int, int]) -> List[int]:
+        """
+        :param spectrum: the magnitude spectrum of the frame
+        :param transform: the transform that produced the spectrum
+        :param bin_range: the bins of the lowest and the highest fundamental
+        :return: a sorted list of MIDI numbers of the notes
+        """
+        start = time.perf_counter()
+        midi, bins, mask = self._harmonic_bins(transform, bin_range, len(spectrum))
+
+        # only the local maxima count, so the skirts of the neighbouring peaks are not taken for the partials
+        spectrum = np.array(spectrum, dtype=np.float64)
+        peaks_only = spectrum.copy()
+        peaks_only[1:-1][(spectrum[1:-1] < spectrum[:-2]) | (spectrum[1:-1] < spectrum[2:])] = 0.0
+
+        available = np.any(mask, axis=2)
+        weight_sum = available @ self.weights
+        picked = np.zeros(len(midi), dtype=bool)
+        notes = []
+        first = None
+        for _ in range(self.max_note_cnt):
+            partials = np.max(np.where(mask, peaks_only[bins], 0.0), axis=2)
+            salience = (partials @ self.weights) / weight_sum
+            salience[picked] = 0.0
+            salience[partials[:, 0] < HarmonicSieve.FUNDAMENTAL_RATIO * partials.max(axis=1)] = 0.0
+
+            best = int(salience.argmax())
+            if salience[best] <= 0.0:
+                break
+            if first is None:
+                first = salience[best]
+            elif salience[best] < self.threshold * first:
+                break
+            picked[best] = True
+            notes.append(int(midi[best]))
+
+            # the partials of the note are removed down to the smoothed envelope of the partials
+            level = partials[best]
+            counts = np.convolve(available[best], np.ones(3), mode="same")
+            smooth = np.convolve(level, np.ones(3), mode="same") / np.maximum(counts, 1)
+            for h in np.nonzero(level > 0.0)[0]:
+                window = bins[best, h][mask[best, h]]
+                gain = 1.0 - min(level[h], smooth[h]) / level[h]
+                spectrum[window] *= gain
+                peaks_only[window] *= gain
+
+        self.total_time_s += time.perf_counter() - start
+        self.frame_cnt += 1
+        return sorted(notes)
+
+    @classmethod
+    def chord_name(cls, midi_nums: List[int]):
+        """
+        Names the chord of the notes regardless of the octaves and the doubled notes.
+        Every pitch class is tried as the root, the bass note is tried first; an inversion is named over the bass.
+        :param midi_nums: a list of MIDI numbers
+        :return: the chord name, e.g. "Am" or "C/E", or None
+        """
+        if len(midi_nums) == 0:
+            return None
+
+        bass = min(midi_nums)
+        pitch_classes = sorted(set((m - bass) % 12 for m in midi_nums))
+        if len(pitch_classes) < 3:
+            return None
+
+        for root in pitch_classes:
+            intervals = sorted((pc - root) % 12 for pc in pitch_classes)
+            chord = cls.chords.get(MIDIParser.semitones(intervals), None)
+            if chord is None:
+                continue
+
+            name = Note(midi_number=bass + root).name() + chord
+            if root != 0:
+                name += "/" + Note(midi_number=bass).name()
+            return Chord(name).name()
+        return None
+
+
+class NoiseTracker:
+    """
+    Per-bin noise estimate by the minimum statistics, updated with every frame.
+    The magnitude of a bin is smoothed over the frames and the noise is the minimum of the smoothed magnitude
+    over the last window_s seconds (SUB_WINDOW_CNT sub-windows), scaled by the bias of the minimum.
+    A note does not hold a bin for the whole window, so the notes do not raise the estimate,
+    while a louder stage raises it within window_s.
+    Martin, R. Noise power spectral density estimation based on optimal smoothing and minimum statistics.
+    IEEE Trans. Speech and Audio Processing 9(5), 504 (2001).
+    The frame passes when a bin of the tuner's range is threshold_db above its noise.  With whiten the pitch
+    estimator gets the spectrum divided by the noise, so the stationary hum and the coloured noise do not
+    bend the peaks.  Frequency domain transforms only (STFT, CZT, multiband CZT).
+    """
+    WINDOW_S = 1.5
+    SUB_WINDOW_CNT = 4
+    SMOOTHING = 0.7      # the weight of the previous frames
+    BIAS = 1.5           # the minimum of the smoothed magnitude is below its mean
+    THRESHOLD_DB = 12
+
+    def __init__(self, window_s=WINDOW_S, threshold_db=THRESHOLD_DB, smoothing=SMOOTHING, bias=BIAS,
+                 whiten=False):
+        self.window_s = window_s
+        self.threshold_db = threshold_db
+        self.smoothing = smoothing
+        self.bias = bias
+        self.whiten = whiten
+        self.noise = None   # the estimate, a magnitude per bin
+        self.sub_window_len = 1
+        self.reset()
+
+    def reset(self, frame_s=None):
+        """
+        :param frame_s: the time between the frames, s
+        """
+        if frame_s is not None:
+            self.sub_window_len = max(1, round(self.window_s / NoiseTracker.SUB_WINDOW_CNT / frame_s))
+        self.noise = None
+        self._smoothed = None
+        self._sub_mins = None
+        self._curr_min = None
+        self._window_min = None
+        self._frame_cnt = 0
+
+    def update(self, spectrum: np.array) -> np.array:
+        """
+        :param spectrum: the magnitude spectrum of the frame
+        :return: the noise estimate
+        """
+        if self._smoothed is None:
+            self._smoothed = np.array(spectrum)
+            self._curr_min = np.array(spectrum)
+            self._sub_mins = np.tile(self._smoothed, (NoiseTracker.SUB_WINDOW_CNT, 1))
+            self._window_min = np.array(spectrum)
+            self.noise = np.empty_like(self._smoothed)
+        else:
+            self._smoothed *= self.smoothing
+            self._smoothed += (1 - self.smoothing) * spectrum
+            np.minimum(self._curr_min, self._smoothed, out=self._curr_min)
+
+        self._frame_cnt += 1
+        if self._frame_cnt % self.sub_window_len == 0:
+            # the oldest sub-window is replaced by the current one
+            idx = (self._frame_cnt // self.sub_window_len) % NoiseTracker.SUB_WINDOW_CNT
+            self._sub_mins[idx] = self._curr_min
+            self._curr_min[:] = self._smoothed
+            self._sub_mins.min(axis=0, out=self._window_min)
+
+        np.minimum(self._window_min, self._curr_min, out=self.noise)
+        self.noise *= self.bias
+        np.maximum(self.noise, np.finfo(self.noise.dtype).tiny, out=self.noise)
+        return self.noise
+
+
 class Tuner:
     INIT_STATE = 0
     PROCESS_STATE = 1
 
+    STFT_TRANSFORM = 0
+    CZT_TRANSFORM = 1
+    YIN_TRANSFORM = 2   # time domain, samples_per_frame is the hop, e.g. 512
+    MULTIBAND_CZT_TRANSFORM = 3   # narrow zooms around band_freqs only, e.g. the strings of an instrument
+
     INIT_TIME_S = 2
+    NOISE_PERCENTILE = 10   # offline, the noise floor is the level of the quiet frames, see measure_noise_floor()
+    GET_TIMEOUT_S = 0.1   # max wait for a frame, the main loop checks for stop() at least this often
     THRESHOLD_DB = 25
+    CATCH_UP_QUEUE_LEN = 2   # in catch-up mode, frames are processed in a batch when the queue is this long
     USE_SD = True
     USE_STFT = False
 
+    FRAMES_PER_FFT = 16   # STFT only
+
     if USE_STFT:
         SAMPLES_PER_FRAME = 2 * 1024
-        FRAMES_PER_FFT = 16
         FREQ_STEP = 1.0
     else:  # CZT
         SAMPLES_PER_FRAME = 2 * 1024
         FREQ_STEP = 0.1
+    TRANSFORM = STFT_TRANSFORM if USE_STFT else CZT_TRANSFORM
 
     def __init__(self, device: int, note_range: Tuple[str, str],
                  samples_per_frame: int = SAMPLES_PER_FRAME, freq_step: float = FREQ_STEP,
-                 note_a_freq_hz: float = 440.0):
+                 note_a_freq_hz: float = 440.0, catch_up: bool = False, estimator: PitchEstimator = None,
+                 transform_type: int = TRANSFORM, band_freqs: List[float] = None, sieve: HarmonicSieve = None,
+                 sample_rate: int = None, metrics: Metrics = None, noise_tracker: NoiseTracker = None,
+                 hop_size: int = None, input_device: InputDevice = None, channel: int = 0):
 
         self.freq_range = Tuner.get_freq_range(note_range, note_a_freq_hz)
         self.threshold = Tuner.THRESHOLD_DB
         self.note_a_freq_hz = note_a_freq_hz
-
+        self.catch_up = catch_up
+        self.sieve = sieve   # polyphonic mode, needs the STFT or CZT transform
+        self.noise_tracker = noise_tracker   # adaptive per-bin noise floor, replaces the one measured at start
+        self.estimator = estimator
+        if self.estimator is None:
+            if transform_type == Tuner.YIN_TRANSFORM:
+                # the lag bins are too coarse for the high notes
+                self.estimator = ParabolicPeakEstimator()
+            else:
+                self.estimator = PeakEstimator()
+
+        # the device delivers hop_size samples and the transform keeps the analysis window of
+        # samples_per_frame samples, so the tuner updates every hop no matter how long the window is
         self.samples_per_frame = samples_per_frame
-
-        self.device = None
-        if Tuner.USE_SD:
-            self.device = SDInputDevice(device=device, samples_per_frame=self.samples_per_frame, queue_data=True)
+        self.hop_size = samples_per_frame if hop_size is None else min(hop_size, samples_per_frame)
+
+        # with the sample rate supplied, no input device is opened and the frames are passed to analyze()
+        # a supplied input device (e.g. a FileInputDevice) queues the hops itself
+        # the frames are (channel, sample), channel is the row that is analyzed.  The device the tuner opens
+        # only delivers that channel.
+        self.channel = channel
+        self.device = input_device
+        if self.device is not None:
+            self.sample_rate = self.device.get_sample_rate()
+        elif sample_rate is not None:
+            self.sample_rate = sample_rate
         else:
-            self.device = PAInputDevice(device=device, samples_per_frame=self.samples_per_frame, queue_data=True)
-
-        self.sample_rate = self.device.get_sample_rate()
-
-        if Tuner.USE_STFT:
-            self.transform = STFT(self.sample_rate, samples_per_frame=self.samples_per_frame,
-                                  frames_per_fft=Tuner.FRAMES_PER_FFT)
+            if Tuner.USE_SD:
+                self.device = SDInputDevice(device=device, channel_cnt=channel + 1, samples_per_frame=self.hop_size,
+                                            queue_data=True, channels=[channel])
+            else:
+                self.device = PAInputDevice(device=device, channel_cnt=channel + 1, samples_per_frame=self.hop_size,
+                                            queue_data=True, channels=[channel])
+            self.sample_rate = self.device.get_sample_rate()
+            self.channel = 0
+
+        if transform_type == Tuner.STFT_TRANSFORM:
+            # the STFT buffer slides by a frame, the hops make the same buffer from more frames
+            self.transform = STFT(self.sample_rate, samples_per_frame=self.hop_size,
+                                  frames_per_fft=Tuner.FRAMES_PER_FFT * self.samples_per_frame // self.hop_size)
+        elif transform_type == Tuner.YIN_TRANSFORM:
+            self.transform = YIN(self.sample_rate, samples_per_frame=self.hop_size,
+                                 freq_range=self.freq_range)
+        elif transform_type == Tuner.MULTIBAND_CZT_TRANSFORM:
+            self.transform = MultiBandCZT(self.sample_rate, samples_per_frame=self.samples_per_frame,
+                                          center_freqs=band_freqs, freq_step=freq_step, hop_size=self.hop_size)
         else:
-            self.transform = CZT(self.sample_rate, samples_per_frame=self.samples_per_frame, freq_range=self.freq_range,
-                                 freq_step=freq_step)
-
-        self.bin_range = (self.transform.freq_to_bin(self.freq_range[0]),
-                          self.transform.freq_to_bin(self.freq_range[1]))
-
-        self._active = False
+            # the polyphonic mode needs the harmonics and the low sidelobes of the windowed frame
+            widen = self.estimator if self.sieve is None else self.sieve
+            transform_range = widen.transform_freq_range(self.freq_range, self.sample_rate)
+            self.transform = CZT(self.sample_rate, samples_per_frame=self.samples_per_frame, freq_range=transform_range,
+                                 freq_step=freq_step, window=self.sieve is not None, hop_size=self.hop_size)
+
+        # YIN bins are lags, they go down as the frequency goes up
+        bins = sorted([self.transform.freq_to_bin(self.freq_range[0]), self.transform.freq_to_bin(self.freq_range[1])])
+        self.bin_range = (bins[0], bins[1] + 1) if transform_type == Tuner.YIN_TRANSFORM else tuple(bins)
+        if transform_type == Tuner.MULTIBAND_CZT_TRANSFORM:
+            # the bands are already limited to the notes
+            self.bin_range = (0, self.transform.band_cnt * self.transform.band_bin_cnt)
+
+        if self.noise_tracker is not None:
+            self.noise_tracker.reset(self.hop_size / self.sample_rate)
+
+        self._stop_event = Event()
         self._thread = None
+        self._frame = None   # the most recent frame that was transformed
 
         self.data = TunerData()
         self.errors = TunerErrors()
 
+        # queue_dwell_s: from the frame capture to the start of processing, transform_s: the transform and
+        # the pitch detection, on_update_s: the front end, latency_s: from the frame capture to the result
+        self.metrics = Metrics() if metrics is None else metrics
+        self.frame_cnt = 0
+        self.metrics.counter("frames", lambda: self.frame_cnt)
+        if self.device is not None:
+            self.metrics.counter("frames_dropped", lambda: self.device.queue_error_cnt)
+
     @classmethod
     def get_freq_range(cls, note_range, note_a_freq_hz):
         f1 = Note.note_name_to_freq_hz(note_range[0], note_a_freq_hz=note_a_freq_hz)
@@ -96,22 +585,21 @@ class Tuner:
 
         self.data.state = Tuner.INIT_STATE
         self.device.start()
-        self._active = True
+        self._stop_event.clear()
         self._thread = Thread(target=self._main_loop)
         self._thread.start()
+        self.metrics.start()
 
     def stop(self):
-        self._active = False
+        self._stop_event.set()
         self.device.stop()
         self._thread.join()
+        self.metrics.stop()
 
     def _main_loop(self):
         start_time = time.time()
 
-        while True:
-            if not self._active:
-                continue
-
+        while not self._stop_event.is_set():
             if self.data.state == Tuner.INIT_STATE:
                 curr_time = time.time()
                 if (curr_time - start_time) > Tuner.INIT_TIME_S:
@@ -119,65 +607,186 @@ class Tuner:
                     self.on_state_change()
                     continue
 
-            self.data.samples = self.device.get_data()
+            # blocks until the frame arrives
+            self.data.samples = self.device.get_data(timeout=Tuner.GET_TIMEOUT_S)
+            if self.data.samples is None:
+                continue
+            self.frame_cnt += 1
 
             if self.data.state == Tuner.INIT_STATE:
                 self._determine_noise_floor(self.data.samples)
                 continue
 
             if self.data.state == Tuner.PROCESS_STATE:
-                peak_freq = self._get_peak_freq(self.data.samples)
-                if peak_freq is None:
+                start = time.monotonic()
+                self.metrics.record("queue_dwell_s", start - self.device.data_timestamp())
+                found = self._process(self.data.samples)
+                self.metrics.record("transform_s", time.monotonic() - start)
+                if not found:
                     continue
+                self._update_queue_stats()
+                self.data.latency_s = time.monotonic() - self.device.data_timestamp()
+                self.metrics.record("latency_s", self.data.latency_s)
 
-                midi_num = Note.freq_to_midi_number(peak_freq, note_a_freq_hz=self.note_a_freq_hz)
-                f0, _, _ = Note.midi_number_to_freq_hz(midi_num, note_a_freq_hz=self.note_a_freq_hz)
-                note = Note.midi_number_to_note_name(midi_num)
-
-                self.data.queue_size = self.device.queue_size()
-                self.errors.queue = self.device.queue_error_cnt
-                self.errors.sample = self.device.sample_error_cnt
-
-                self.data.note = note
-                self.data.midi_num = midi_num
-                self.data.curr_freq = peak_freq
-                self.data.delta_freq = peak_freq - f0
-
+            start = time.monotonic()
             self.on_update()
+            self.metrics.record("on_update_s", time.monotonic() - start)
+
+    def analyze(self, frames):
+        """
+        Offline analysis, the frames come from a file rather than from the input device.
+        The noise floor is not measured, set data.noise_floor (see measure_noise_floor()) to apply the threshold
+        or supply a noise tracker.
+        :param frames: an iterable of frames of hop_size samples
+        :return: a generator of (frame index, TunerData) for the frames with a note, the data is a copy
+        """
+        self.data.state = Tuner.PROCESS_STATE
+        for idx, frame in enumerate(frames):
+            if self._process(frame):
+                yield idx, replace(self.data, samples=None)
+
+    def measure_noise_floor(self, frames, percentile=NOISE_PERCENTILE):
+        """
+        Offline noise floor measurement, e.g. on the first seconds of a recording, for analyze().
+        The level of a frame is the average magnitude of the tuner's range, the floor is a low percentile
+        of the levels, so the notes among the frames do not raise it.  The digitally silent frames are skipped.
+        The frames go through the transform, use a fresh tuner for analyze() with the STFT or the hops.
+        :param frames: an iterable of frames of hop_size samples
+        :return: the noise floor, 0 if there are no frames with a level, it is also set to data.noise_floor
+        """
+        levels = []
+        for frame in frames:
+            spectrum = self._get_spectrum(frame)
+            if spectrum is None:
+                continue
+            level = np.average(spectrum[self.bin_range[0]:self.bin_range[1]])
+            if level > 0:
+                levels.append(level)
+
+        self.data.noise_floor = float(np.percentile(levels, percentile)) if levels else 0.0
+        return self.data.noise_floor
+
+    def _process(self, data):
+        """
+        Updates the tuner data with the note (or the notes in polyphonic mode) of the frame.
+        :return: True if the frame is above the noise floor and the data was updated
+        """
+        if self.sieve is not None:
+            midi_nums = self._get_notes(data)
+            if midi_nums is None:
+                return False
+
+            chord = HarmonicSieve.chord_name(midi_nums)
+            self.data.midi_nums = tuple(midi_nums)
+            self.data.chord = "" if chord is None else chord
+            return True
+
+        peak_freq = self._get_peak_freq(data)
+        if peak_freq is None:
+            return False
+
+        midi_num = Note.freq_to_midi_number(peak_freq, note_a_freq_hz=self.note_a_freq_hz)
+        f0, _, _ = Note.midi_number_to_freq_hz(midi_num, note_a_freq_hz=self.note_a_freq_hz)
+        note = Note.midi_number_to_note_name(midi_num)
+
+        self.data.note = note
+        self.data.midi_num = midi_num
+        self.data.curr_freq = peak_freq
+        self.data.delta_freq = peak_freq - f0
+        return True
+
+    def _update_queue_stats(self):
+        self.data.queue_size = self.device.queue_size()
+        self.errors.queue = self.device.queue_error_cnt
+        self.errors.sample = self.device.sample_error_cnt
+
+    def _get_spectrum(self, data):
+        """
+        Returns the spectrum of the data.
+        In catch-up mode, when frames pile up in the queue, all of them are transformed in one batch
+        and the spectrum of the most recent one is returned.
+        """
+        if data is None:
+            return None
+
+        data = self._channel_samples(data)
+        self._frame = data
+        if self.catch_up and self.device is not None:
+            queue_size = self.device.queue_size()
+            if queue_size is not None and queue_size >= Tuner.CATCH_UP_QUEUE_LEN:
+                # the frames are copied, a frame from the shared memory ring is only valid until the next get
+                frames = [np.array(data)]
+                for _ in range(queue_size):
+                    frame = self.device.get_data()
+                    if frame is None:
+                        break
+                    frames.append(np.array(self._channel_samples(frame)))
+                self._frame = frames[-1]
+                return self.transform.process_batch(frames)[-1]
+
+        return self.transform.process(data)
+
+    def _channel_samples(self, data):
+        # a row of the (channel, sample) frame is contiguous, the transforms take it as is
+        if np.ndim(data) == 2:
+            return data[self.channel]
+        return data
 
     def _determine_noise_floor(self, data):
-        if data is None:
+        spectrum = self._get_spectrum(data)
+        if spectrum is None:
             return
 
-        spectrum = self.transform.process(data)
-        if spectrum is None:
+        if self.noise_tracker is not None:
+            self._track_noise(spectrum)
             return
 
         clipped = spectrum[self.bin_range[0]:self.bin_range[1]]
         self.data.noise_floor = max(self.data.noise_floor, np.average(clipped))
 
-    def _get_peak_freq(self, data):
-        if data is None:
-            return None
-
-        spectrum = self.transform.process(data)
-        if spectrum is None:
-            return None
+    def _track_noise(self, spectrum):
+        noise = self.noise_tracker.update(spectrum)[self.bin_range[0]:self.bin_range[1]]
+        self.data.noise_floor = np.average(noise)
+        return noise
 
+    def _above_noise_floor(self, spectrum):
         clipped = spectrum[self.bin_range[0]:self.bin_range[1]]
+        if self.noise_tracker is not None:
+            snr = np.amax(clipped / self._track_noise(spectrum))
+            return 20 * np.log10(snr) >= self.noise_tracker.threshold_db
+
         max_val = np.amax(clipped)
 
         if self.data.noise_floor > 0:
+            if max_val <= 0:
+                return False
             db = 20 * np.log10(max_val / self.data.noise_floor)
-            if db < self.threshold:
-                return None
+            return db >= self.threshold
+        return max_val >= 0.01
+
+    def _get_peak_freq(self, data):
+        spectrum = self._get_spectrum(data)
+        if spectrum is None or not self._above_noise_floor(spectrum):
+            return None
+
+        sliding_window = getattr(self.transform, "sliding_window", None)
+        if sliding_window is not None:
+            samples = sliding_window.samples()
         else:
-            if max_val < 0.01:
-                return None
+            samples = np.frombuffer(self._frame, self.transform.sample_dtype)
+        return self.estimator.estimate(self._whiten(spectrum), samples, self.transform, self.bin_range)
+
+    def _get_notes(self, data):
+        spectrum = self._get_spectrum(data)
+        if spectrum is None or not self._above_noise_floor(spectrum):
+            return None
+
+        return self.sieve.detect(self._whiten(spectrum), self.transform, self.bin_range)
 
-        peak_bin = clipped.argmax() + self.bin_range[0]
-        peak_freq = self.transform.bin_to_freq(peak_bin)
-        return peak_freq
+    def _whiten(self, spectrum):
+        if self.noise_tracker is None or not self.noise_tracker.whiten:
+            return spectrum
+        return spectrum / self.noise_tracker.noise
 
     def on_state_change(self):
         pass
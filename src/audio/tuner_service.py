@@ -0,0 +1,191 @@
+import os
+import time
+from threading import Thread, Event, Semaphore
+from multiprocessing import Process
+from multiprocessing import Event as MPEvent
+from multiprocessing import Semaphore as MPSemaphore
+from dataclasses import replace
+from typing import Tuple, List
+
+from audio.input_device import SDInputDevice
+from audio.fifo_queue import FIFOQueue
+from audio.tuner import Tuner, TunerData
+
+
+def _worker_loop(channels, note_range, samples_per_frame, sample_rate, tuner_kwargs, init_time_s,
+                 frames, available, readings, stop_event):
+    """
+    The worker keeps a Tuner per channel, the frames of a channel always go to the same worker,
+    so the transforms that keep state between the frames (STFT, YIN) see every frame in order.
+    Every channel has its own frame queue, the available semaphore counts the frames of all the worker's queues.
+    """
+    tuners = {channel: Tuner(None, note_range, samples_per_frame=samples_per_frame, sample_rate=sample_rate,
+                             **tuner_kwargs) for channel in channels}
+    start_time = time.monotonic()
+    next_idx = 0
+
+    while not stop_event.is_set():
+        if not available.acquire(timeout=TunerService.GET_TIMEOUT_S):
+            continue
+
+        # a frame is queued, the channels are taken in turns so a busy channel does not starve the others
+        frame = None
+        for i in range(len(channels)):
+            idx = (next_idx + i) % len(channels)
+            frame = frames[idx].get()
+            if frame is not None:
+                next_idx = idx + 1
+                break
+        if frame is None:
+            continue
+
+        channel = channels[idx]
+        tuner = tuners[channel]
+        if time.monotonic() - start_time <= init_time_s:
+            tuner._determine_noise_floor(frame)
+            continue
+
+        tuner.data.state = Tuner.PROCESS_STATE
+        if tuner._process(frame):
+            latency_s = time.monotonic() - frames[idx].timestamp
+            readings.put((channel, replace(tuner.data, samples=None, latency_s=latency_s)))
+
+
+class TunerService:
+    """
+    Tunes many channels at once, e.g. a rack of instruments.
+    The service opens the input devices (a device might have several channels), the devices de-interleave the frames,
+    and dispatches the channels to a pool of workers, one per core by default.  A channel is bound to a worker
+    (channel % worker_cnt) and keeps a Tuner for each of its channels.  Every channel has its own frame queue,
+    a single-producer shared memory ring for the process workers, and the channel is known by the queue.
+    The readings of all the workers come back through one queue and are published per channel
+    in readings and on_update().  The frames can also be fed with submit(), e.g. from files.
+    The workers are processes, or threads with multiprocess=False (NumPy releases the GIL in the transforms).
+    """
+    GET_TIMEOUT_S = 0.1
+    MAX_QUEUE_LEN = 16   # frames per channel, the frames that do not fit are dropped
+
+    def __init__(self, note_range: Tuple[str, str], inputs: List[Tuple[int, int]] = None,
+                 sample_rate: int = None, channel_cnt: int = 0,
+                 samples_per_frame: int = Tuner.SAMPLES_PER_FRAME, worker_cnt: int = None,
+                 multiprocess: bool = True, max_queue_len: int = MAX_QUEUE_LEN, **tuner_kwargs):
+        """
+        :param note_range: a tuple of the lowest and the highest note, e.g. ("E2", "E6")
+        :param inputs: a list of (device, channel count), the channels are numbered across the devices
+        :param sample_rate: the sample rate of the submitted frames, the devices define it otherwise
+        :param channel_cnt: number of the channels fed by submit() (in addition to the devices' channels)
+        :param samples_per_frame: samples per frame
+        :param worker_cnt: number of the workers, None uses all the CPUs
+        :param multiprocess: process or thread workers
+        :param max_queue_len: the max number of frames waiting in a channel's queue
+        :param tuner_kwargs: the other Tuner parameters, e.g. transform_type
+        """
+        self.note_range = note_range
+        self.samples_per_frame = samples_per_frame
+        self.multiprocess = multiprocess
+        self.init_time_s = Tuner.INIT_TIME_S if inputs else 0.0
+        self.tuner_kwargs = tuner_kwargs
+
+        self.devices = []
+        self.sample_rate = sample_rate
+        self.channel_cnt = 0
+        hop_size = tuner_kwargs.get("hop_size", None) or samples_per_frame
+        for device, cnt in (inputs or []):
+            input_device = SDInputDevice(device=device, channel_cnt=cnt, samples_per_frame=hop_size,
+                                         queue_data=False, multiprocess=False)
+            input_device.set_process_fn(self._dispatch_fn(self.channel_cnt, cnt))
+            if self.sample_rate is None:
+                self.sample_rate = input_device.get_sample_rate()
+            self.devices.append(input_device)
+            self.channel_cnt += cnt
+        self.channel_cnt += channel_cnt
+
+        if worker_cnt is None:
+            worker_cnt = os.cpu_count() or 1
+        self.worker_cnt = max(1, min(worker_cnt, self.channel_cnt))
+
+        self._frames = [FIFOQueue(multiprocess=multiprocess, is_deque=False, max_len=max_queue_len,
+                                  frame_shape=(hop_size,)) for _ in range(self.channel_cnt)]
+        self._available = [MPSemaphore(0) if multiprocess else Semaphore(0) for _ in range(self.worker_cnt)]
+        self._readings = FIFOQueue(multiprocess=multiprocess, is_deque=False, max_len=0)
+        self._stop_event = MPEvent() if multiprocess else Event()
+        self._workers_done = Event()
+        self._workers = []
+        self._thread = None
+
+        self.readings = {}   # the most recent reading of every channel
+
+    def worker(self, channel):
+        return channel % self.worker_cnt
+
+    @property
+    def frame_error_cnt(self):
+        """
+        :return: number of frames dropped because a worker fell behind
+        """
+        return sum(frames.overrun_cnt for frames in self._frames)
+
+    def start(self):
+        self._stop_event.clear()
+        self._workers_done.clear()
+        for worker in range(self.worker_cnt):
+            channels = list(range(worker, self.channel_cnt, self.worker_cnt))
+            args = (channels, self.note_range, self.samples_per_frame, self.sample_rate, self.tuner_kwargs,
+                    self.init_time_s, [self._frames[channel] for channel in channels], self._available[worker],
+                    self._readings, self._stop_event)
+            if self.multiprocess:
+                self._workers.append(Process(target=_worker_loop, args=args, daemon=True))
+            else:
+                self._workers.append(Thread(target=_worker_loop, args=args, daemon=True))
+            self._workers[-1].start()
+
+        self._thread = Thread(target=self._main_loop)
+        self._thread.start()
+        for device in self.devices:
+            device.start()
+
+    def stop(self):
+        for device in self.devices:
+            device.stop()
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._workers_done.set()
+        self._thread.join()
+
+    def submit(self, channel, frame):
+        """
+        Passes a frame of the channel to its worker.
+        :param channel: the channel number
+        :param frame: a mono frame of samples_per_frame samples, or hop_size samples (see Tuner)
+        :return: False if the channel's queue is full and the frame is dropped
+        """
+        if not self._frames[channel].put(frame):
+            return False
+        self._available[self.worker(channel)].release()
+        return True
+
+    def _dispatch_fn(self, first_channel, cnt):
+        # the device's callback, the frame is (channel, sample), every channel is contiguous
+        def dispatch(data):
+            for i in range(cnt):
+                self.submit(first_channel + i, data[i])
+        return dispatch
+
+    def _main_loop(self):
+        # publishes the readings of the workers, after stop() the queue is drained until it is empty
+        # (the size of the MP queue is not known on every platform)
+        while True:
+            item = self._readings.get(timeout=TunerService.GET_TIMEOUT_S)
+            if item is None:
+                if self._workers_done.is_set():
+                    break
+                continue
+
+            channel, data = item
+            self.readings[channel] = data
+            self.on_update(channel, data)
+
+    def on_update(self, channel: int, data: TunerData):
+        pass
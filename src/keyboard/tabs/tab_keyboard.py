@@ -49,6 +49,7 @@ class Keyboard(Tab):
         self.config = config
         self.log = log_fn
         self.notes = set()
+        self.note_timestamp = None   # ingest time of the last note, for the UI latency
 
         self.keyboard_widget = KeyboardWidget(config.key_count, config.start_note, config.show_labels, parent=ui.widget_keyboard)
         self.keyboard_widget.setFocus()
@@ -76,6 +77,10 @@ class Keyboard(Tab):
                 notes_str += "  =  " + str(ch.name())
         self.ui.label_notes.setText(notes_str)
 
+        if self.note_timestamp is not None:
+            self.audio.record_ui_latency(self.note_timestamp)
+            self.note_timestamp = None
+
     def resize_widgets(self):
         w = self.ui.scrollArea_keyboard.width()
         h = self.ui.scrollArea_keyboard.height()
@@ -94,6 +99,7 @@ class Keyboard(Tab):
 
     def note_fn(self, note, is_on):
         self.notes = copy(self.audio.parser.notes)
+        self.note_timestamp = self.audio.parser.timestamp
         self.keyboard_widget.update_key(note, is_on)
 
     def key_press_fn(self, midi_note, is_on):
@@ -0,0 +1,53 @@
+import sys
+import time
+from pathlib import Path
+from termcolor import cprint
+from audio.analyzer import Analyzer
+from audio.tuner import GaussianPeakEstimator
+
+GUITAR_RANGE = ["E2", "D6"]
+SAMPLES_PER_FRAME = 8 * 1024
+FREQ_STEP = 0.2
+FILE_TYPES = [".wav", ".flac"]
+DEFAULT_OUTPUT = "analysis.csv"
+
+
+def find_files(paths):
+    files = []
+    for p in paths:
+        p = Path(p)
+        if p.is_dir():
+            files.extend(sorted(f for f in p.rglob("*") if f.suffix.lower() in FILE_TYPES))
+        else:
+            files.append(p)
+    return files
+
+
+if __name__ == "__main__":
+    if len(sys.argv) <= 1:
+        print("Usage: main_analyzer.py [-o <output .csv or .parquet>] [-r <low note> <high note>] <files or folders>")
+        exit()
+
+    output = DEFAULT_OUTPUT
+    note_range = GUITAR_RANGE
+    paths = []
+    args = sys.argv[1:]
+    while len(args):
+        arg = args.pop(0)
+        if arg.lower() == "-o":
+            output = args.pop(0)
+            continue
+        if arg.lower() == "-r":
+            note_range = [args.pop(0), args.pop(0)]
+            continue
+        paths.append(arg)
+
+    files = find_files(paths)
+    cprint(f"Analyzing {len(files)} files in range {note_range[0]} to {note_range[1]}", "blue")
+
+    start = time.time()
+    analyzer = Analyzer(note_range, samples_per_frame=SAMPLES_PER_FRAME, freq_step=FREQ_STEP,
+                        estimator=GaussianPeakEstimator())
+    rows = analyzer.analyze(files)
+    Analyzer.write(rows, output)
+    cprint(f"{len(rows)} frames written to {output} in {time.time() - start:.1f} s", "green")
@@ -5,6 +5,7 @@ from pprint import pprint
 from termcolor import cprint
 
 from audio import Synth, MIDIRouter, MIDIParser, Tuning
+from audio.midi_router import GET_TIMEOUT_S
 
 PORT_IN = "Arturia"
 if sys.platform == "darwin":
@@ -112,7 +113,7 @@ def main():
     parser = MIDIParser()
 
     while True:
-        parser.parse(midi_router.get_message())
+        parser.parse_batch(midi_router.drain(timeout=GET_TIMEOUT_S))
 
 
 if __name__ == "__main__":
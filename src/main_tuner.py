@@ -1,8 +1,11 @@
 import math
+from pathlib import Path
 from typing import Tuple, List
 from termcolor import cprint, colored
 from audio.input_device import SDInputDevice
-from audio.tuner import Tuner
+from audio.tuner import Tuner, GaussianPeakEstimator
+from audio.transforms import CZT, MultiBandCZT
+from audio.metrics import Metrics, JSONLinesSink, PrometheusSink
 from theory.notes import Note
 
 NF_WARNING_THRESHOLD = 0.6
@@ -14,6 +17,9 @@ UKULELE_NOTES = ["G4", "C4", "E4", "A4"]
 GUITAR_NOTES = ["E2", "A2", "D3", "G3", "B3", "E4"]
 USE_FREQ_INDICATOR = False
 DEBUG_OUTPUT = False
+HOP_SIZE = 2048   # the tuner updates every hop (~23 Hz at 48 kHz) no matter how long the frame is
+PLAN_CACHE_PATH = Path.home() / ".cache" / "music" / "plans"   # None disables the on-disk CZT kernels
+METRICS_PATH = None   # a .jsonl file (every snapshot) or a .prom file (Prometheus text), None disables the export
 
 
 class CLTuner(Tuner):
@@ -54,16 +60,31 @@ class CLTuner(Tuner):
 
         if DEBUG_OUTPUT:
             cprint(f"Note A4 freq: {note_a_freq_hz:5.2f} Hz", "blue")
-            cprint(f"Freq resolution: {self.freq_step:5.2f} Hz  Samples per frame: {samples_per_frame}", "blue")
+            cprint(f"Freq resolution: {self.freq_step:5.2f} Hz  Samples per frame: {samples_per_frame}  "
+                   f"Hop: {min(HOP_SIZE, samples_per_frame)}", "blue")
 
         note_1 = Note.proper_note_name(self.note_range[0])
         note_2 = Note.proper_note_name(self.note_range[-1])
         cprint(f"Tuner for range {note_1} to {note_2}", "blue")
         cprint("\rInitializing...", "yellow", end="")
 
+        # for a note list, only the bands around the notes are transformed
+        transform_type = Tuner.TRANSFORM
+        band_freqs = None
+        if self.note_list is not None:
+            transform_type = Tuner.MULTIBAND_CZT_TRANSFORM
+            band_freqs = [Note.midi_number_to_freq_hz(m, note_a_freq_hz=note_a_freq_hz)[0] for m in self.midi_list]
+
+        metrics = Metrics()
+        if METRICS_PATH is not None:
+            path = Path(METRICS_PATH)
+            metrics.add_sink(PrometheusSink(path) if path.suffix == ".prom" else JSONLinesSink(path))
+
         super().__init__(device=device, note_range=self.tuner_note_range,
                          freq_step=self.freq_step, samples_per_frame=samples_per_frame,
-                         note_a_freq_hz=note_a_freq_hz)
+                         note_a_freq_hz=note_a_freq_hz, estimator=GaussianPeakEstimator(),
+                         transform_type=transform_type, band_freqs=band_freqs, metrics=metrics,
+                         hop_size=HOP_SIZE)
 
     def get_tuner_range(self, init_note_range):
         midi_1 = Note.note_name_to_midi_number(init_note_range[0]) - 2
@@ -89,6 +110,10 @@ class CLTuner(Tuner):
         if self.note_list is None:
             return None
 
+        # the bands are sorted the same way as the MIDI list
+        if isinstance(self.transform, MultiBandCZT):
+            return self.midi_list[self.transform.freq_to_band(freq)]
+
         curr_dist = 20000
         found = None
         for m in self.midi_list:
@@ -120,7 +145,7 @@ class CLTuner(Tuner):
             if len(s):
                 s = "[" + s.rstrip() + "]"
                 s = colored(s, "red")
-            return s
+            return s + f" {1000 * self.data.latency_s:.1f} ms"
 
         def scale(fsd, curr, vc, minv, maxv):
             pos = round(fsd * (curr-vc) / (maxv - minv))
@@ -178,6 +203,8 @@ class CLTuner(Tuner):
 
 
 if __name__ == "__main__":
+    CZT.plan_cache.set_path(PLAN_CACHE_PATH)
+
     # print(SDInputDevice.available_devices())
     tuner = CLTuner(5, note_range=UKULELE_RANGE)
     # tuner = CLTuner(note_list=UKULELE_NOTES)
@@ -0,0 +1,65 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.transforms import CZT
+
+# Per-frame cost of the CZT used by the tuner.
+# The second table is the cost of the sliding window: a long frame for the resolution, a spectrum every hop.
+# Run from the src folder: python tests/bench_czt.py
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = [2048, 4096, 8192]
+FREQ_RANGE = (73.42, 1244.51)    # GUITAR_RANGE E2..D6 widened by 2 semitones, as in CLTuner
+FREQ_STEPS = [0.5, 0.2, 0.1]
+REPEAT_CNT = 50
+HOP_CONFIGS = [(12288, 0.2), (32768, 0.1)]   # the frames CLTuner picks for the guitar and the ukulele
+HOP_SIZES = [4096, 2048, 1024]
+
+
+def make_frame(samples_per_frame, freq=110.0):
+    t = np.arange(samples_per_frame) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def bench_czt(samples_per_frame, freq_step):
+    frame = make_frame(samples_per_frame)
+    czt = CZT(SAMPLE_RATE, samples_per_frame=samples_per_frame, freq_range=FREQ_RANGE, freq_step=freq_step)
+
+    czt.process(frame)   # warm up
+    start = time.perf_counter()
+    for _ in range(REPEAT_CNT):
+        czt.process(frame)
+    return (time.perf_counter() - start) / REPEAT_CNT, czt
+
+
+def bench_hop(samples_per_frame, freq_step, hop_size):
+    hop = make_frame(hop_size)
+    czt = CZT(SAMPLE_RATE, samples_per_frame=samples_per_frame, freq_range=FREQ_RANGE, freq_step=freq_step,
+              hop_size=hop_size)
+
+    czt.process(hop)   # warm up
+    start = time.perf_counter()
+    for _ in range(REPEAT_CNT):
+        czt.process(hop)
+    return (time.perf_counter() - start) / REPEAT_CNT
+
+
+if __name__ == "__main__":
+    print(f"{'samples':>8} {'step Hz':>8} {'bins':>7} {'fft len':>8} {'ms/frame':>9} {'budget ms':>10} {'load':>6}")
+    for spf in SAMPLES_PER_FRAME:
+        budget = spf / SAMPLE_RATE
+        for step in FREQ_STEPS:
+            t, czt = bench_czt(spf, step)
+            print(f"{spf:8d} {step:8.2f} {czt.Nf:7d} {czt.n:8d} {t * 1000:9.3f} {budget * 1000:10.2f} {t / budget:6.1%}")
+
+    print()
+    print(f"{'samples':>8} {'step Hz':>8} {'hop':>6} {'updates Hz':>11} {'ms/hop':>7} {'load':>6}")
+    for spf, step in HOP_CONFIGS:
+        for hop_size in [spf] + HOP_SIZES:
+            t = bench_hop(spf, step, hop_size)
+            budget = hop_size / SAMPLE_RATE
+            print(f"{spf:8d} {step:8.2f} {hop_size:6d} {1 / budget:11.1f} {t * 1000:7.3f} {t / budget:6.1%}")
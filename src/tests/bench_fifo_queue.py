@@ -0,0 +1,65 @@
+import sys
+import time
+from os import path
+from multiprocessing import Process, Value
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.fifo_queue import FIFOQueue
+
+# Cost of passing audio frames from the capturing process to the tuner:
+# the multiprocessing Queue (pickle + pipe) against the shared memory ring (memcpy).
+# Only the successful put() and get() calls are timed, both sides yield the CPU when the queue is full or empty.
+# The Queue pickles the frames in a feeder thread of the capturing process, that cost is not in the put() time.
+# Run from the src folder: python tests/bench_fifo_queue.py
+
+SAMPLES_PER_FRAME = [512, 2048, 8192]
+FRAME_CNT = 2000
+MAX_QUEUE_LEN = 5
+
+
+def producer(queue, samples_per_frame, put_ns):
+    frame = np.random.default_rng(0).standard_normal((samples_per_frame, 1)).astype(np.float32)
+    total = 0
+    for i in range(FRAME_CNT):
+        frame[0, 0] = i
+        # the device callback passes a copy to the queue
+        data = frame.copy()
+        while True:
+            start = time.perf_counter_ns()
+            if queue.put(data):
+                total += time.perf_counter_ns() - start
+                break
+            time.sleep(0.0001)
+    put_ns.value = total // FRAME_CNT
+
+
+def bench(samples_per_frame, shared_ring):
+    frame_shape = (samples_per_frame, 1) if shared_ring else None
+    queue = FIFOQueue(multiprocess=True, max_len=MAX_QUEUE_LEN, frame_shape=frame_shape)
+    put_ns = Value("q", 0)
+    p = Process(target=producer, args=(queue, samples_per_frame, put_ns))
+    p.start()
+
+    get_ns = 0
+    received = 0
+    while received < FRAME_CNT:
+        start = time.perf_counter_ns()
+        frame = queue.get()
+        if frame is None:
+            time.sleep(0.0001)
+            continue
+        get_ns += time.perf_counter_ns() - start
+        assert frame[0, 0] == received
+        received += 1
+    p.join()
+    return put_ns.value / 1000, get_ns / FRAME_CNT / 1000
+
+
+if __name__ == "__main__":
+    print(f"{'samples':>8} {'queue':>12} {'put us':>8} {'get us':>8}")
+    for spf in SAMPLES_PER_FRAME:
+        for shared_ring, name in ((False, "mp.Queue"), (True, "shared ring")):
+            put_us, get_us = bench(spf, shared_ring)
+            print(f"{spf:8d} {name:>12} {put_us:8.1f} {get_us:8.1f}")
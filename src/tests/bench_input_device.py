@@ -0,0 +1,66 @@
+import sys
+import time
+from os import path
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.input_device import GeneratorInputDevice
+from audio.signals import SignalGenerator
+from audio.tuner import Tuner
+
+# Soak test of the tuner's queue with no audio hardware: a GeneratorInputDevice plays the notes
+# at growing speeds (multiples of the real time, 0 is as fast as possible) into the tuner's main loop.
+# frames/s counts the processed frames, the highest speed with no dropped frames is the max sustainable rate.
+# Run from the src folder: python tests/bench_input_device.py
+
+SAMPLE_RATE = 48000
+NOTE_RANGE = ("E2", "E6")
+SAMPLES_PER_FRAME = 8192
+HOP_SIZE = 2048
+FREQ_STEP = 0.5
+MAX_QUEUE_LEN = 5
+FRAME_CNT = 1000
+SPEEDS = [8, 32, 64, 128, 256, 0]
+
+
+def make_source():
+    # the notes are generated up front, a slow source would make the device catch up in bursts
+    generator = SignalGenerator(SAMPLE_RATE)
+    notes = [x for _, _, x in generator.notes(NOTE_RANGE, 0.5)]
+    source = []
+    while sum(len(x) for x in source) < FRAME_CNT * HOP_SIZE:
+        source += notes
+    return source
+
+
+def bench(source, speed):
+    device = GeneratorInputDevice(source, sample_rate=SAMPLE_RATE, samples_per_frame=HOP_SIZE,
+                                  max_queue_len=MAX_QUEUE_LEN, speed=speed)
+    tuner = Tuner(None, NOTE_RANGE, samples_per_frame=SAMPLES_PER_FRAME, freq_step=FREQ_STEP,
+                  hop_size=HOP_SIZE, input_device=device)
+
+    start = time.monotonic()
+    tuner.start()
+    device.wait()
+    while device.queue_size() > 0:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    tuner.stop()
+
+    latency = tuner.metrics.histogram("latency_s")
+    return (tuner.frame_cnt / elapsed, device.queue_error_cnt / device.sample_cnt,
+            latency.percentile(50), latency.percentile(99))
+
+
+if __name__ == "__main__":
+    # no noise floor measurement, the signals are clean
+    Tuner.INIT_TIME_S = 0
+
+    budget = HOP_SIZE / SAMPLE_RATE
+    print(f"CZT {SAMPLES_PER_FRAME} hop {HOP_SIZE}, {FRAME_CNT} frames, queue {MAX_QUEUE_LEN}, "
+          f"real time {1 / budget:.1f} frames/s")
+    source = make_source()
+    print(f"{'speed':>6} {'frames/s':>9} {'dropped':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    for speed in SPEEDS:
+        rate, dropped, p50, p99 = bench(source, speed)
+        name = f"{speed}x" if speed else "max"
+        print(f"{name:>6} {rate:9.0f} {dropped:8.1%} {p50 * 1000:7.2f} {p99 * 1000:7.2f}")
@@ -0,0 +1,77 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+from mido import Message
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.midi_filter import MIDIFilter
+from audio.midi_router import MIDIPort
+
+# Cost of MIDIPort.send() with the message filters on an aftertouch-heavy stream (9 of 10 messages).
+# "list" is the previous filter, a list of the types checked with "in", "types" is the compiled type filter,
+# "full" also masks the channels, the note range and the velocity, and transposes the notes.
+# Run from the src folder: python tests/bench_midi_filter.py
+
+MESSAGE_CNT = 100000
+REPEAT_CNT = 5
+
+
+class NullPort:
+    def send(self, message):
+        pass
+
+
+class ListFilterPort(MIDIPort):
+    # the previous send()
+    def send(self, message):
+        if self.port is None:
+            return
+
+        if self.filter is not None:
+            if message.type in self.filter:
+                return
+
+        try:
+            self.port.send(message)
+        except:
+            pass
+
+
+def make_stream():
+    rng = np.random.default_rng(0)
+    messages = []
+    for i in range(MESSAGE_CNT):
+        if i % 10 == 0:
+            messages.append(Message("note_on", channel=int(rng.integers(0, 2)), note=int(rng.integers(36, 96)),
+                                    velocity=int(rng.integers(0, 128))))
+        else:
+            messages.append(Message("aftertouch", value=int(rng.integers(0, 128))))
+    return messages
+
+
+def bench(port, messages):
+    best = None
+    for _ in range(REPEAT_CNT):
+        start = time.perf_counter()
+        for message in messages:
+            port.send(message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(messages)
+
+
+if __name__ == "__main__":
+    messages = make_stream()
+    list_port = ListFilterPort(port=NullPort())
+    list_port.filter = ["polytouch", "aftertouch"]
+    ports = [("none", MIDIPort(port=NullPort())),
+             ("list", list_port),
+             ("types", MIDIPort(port=NullPort(), message_filter=["polytouch", "aftertouch"])),
+             ("full", MIDIPort(port=NullPort(), message_filter=MIDIFilter(
+                 skip_types=["polytouch", "aftertouch"], channels=[0], note_range=(40, 84), min_velocity=10,
+                 transpose=-12)))]
+    print(f"{'filter':>6} {'ns/msg':>7}")
+    for name, port in ports:
+        print(f"{name:>6} {bench(port, messages) * 1e9:7.0f}")
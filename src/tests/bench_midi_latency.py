@@ -0,0 +1,87 @@
+import sys
+import time
+from os import path
+from threading import Thread
+
+import numpy as np
+from mido import Message
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.midi_router import MIDIRouter, GET_TIMEOUT_S
+from audio.midi_parser import MIDIParser
+from audio.metrics import Metrics
+
+# Latency and jitter of the MIDI path, the same path as AudioSupport: the router's input callback forwards
+# the message to the output and the parser thread gets it from the router.
+# The keyboard plays notes with aftertouch at a human rate, the callback is called from a thread as mido does.
+# With the names of an input and an output port, the real ports are used, play the keyboard for DURATION_S:
+#   python tests/bench_midi_latency.py "Arturia MiniLab mkII" "FLUID Synth"
+# midi_forward_s is the callback's time to hand the message to the output, midi_note_s the time to the parser.
+# Run from the src folder: python tests/bench_midi_latency.py
+
+DURATION_S = 10.0
+NOTES_PER_S = 10
+AFTERTOUCH_PER_NOTE = 10
+
+
+class NullPort:
+    def send(self, message):
+        pass
+
+    def close(self):
+        pass
+
+
+def play(router, stop):
+    # a note with the aftertouch every 1 / NOTES_PER_S, on a jittery schedule
+    rng = np.random.default_rng(0)
+    period_s = 1 / NOTES_PER_S
+    while not stop[0]:
+        note = int(rng.integers(48, 72))
+        router.input_message_handler(Message("note_on", note=note, velocity=90), router.port_in)
+        for i in range(AFTERTOUCH_PER_NOTE):
+            time.sleep(period_s / (2 * AFTERTOUCH_PER_NOTE) * rng.uniform(0.5, 1.5))
+            router.input_message_handler(Message("aftertouch", value=i), router.port_in)
+        router.input_message_handler(Message("note_off", note=note), router.port_in)
+        time.sleep(period_s / 2)
+
+
+def main(port_in=None, port_out=None):
+    metrics = Metrics()
+    router = MIDIRouter(port_in=port_in, port_out=port_out, message_filter=["aftertouch"], metrics=metrics)
+    router.start()
+    if port_out is None:
+        router.port_out.port = NullPort()
+        router.enabled = True
+
+    parser = MIDIParser(enable_print=False, metrics=metrics)
+    stop = [False]
+
+    def parse():
+        while not stop[0]:
+            parser.parse_timestamped(router.drain_timestamped(timeout=GET_TIMEOUT_S))
+
+    threads = [Thread(target=parse)]
+    if port_in is None:
+        threads.append(Thread(target=play, args=(router, stop)))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION_S)
+    stop[0] = True
+    for thread in threads:
+        thread.join()
+    router.stop()
+
+    print(f"{'stage':>15} {'count':>6} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for name in ["midi_forward_s", "midi_note_s", "midi_jitter_s"]:
+        hist = metrics.histogram(name)
+        print(f"{name:>15} {hist.count:6d} {hist.percentile(50) * 1e6:8.1f} {hist.percentile(99) * 1e6:8.1f} "
+              f"{hist.max_s * 1e6:8.1f}")
+    print(f"smoothed jitter {parser.jitter_s * 1e6:.1f} us, dropped {router.drop_cnt}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        main(sys.argv[1], sys.argv[2])
+    else:
+        main()
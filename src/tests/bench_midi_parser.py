@@ -0,0 +1,148 @@
+import re
+import sys
+import time
+from threading import Thread
+from os import path
+
+import numpy as np
+from mido import Message
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.midi_parser import MIDIParser
+from audio.midi_router import MIDIRouter, MAX_MESSAGE_QUEUE_SIZE, GET_TIMEOUT_S
+
+# Messages per second of the MIDI parser on a keyboard performance with dense controller traffic:
+# every note comes with channel aftertouch, the mod wheel, the pitch wheel and the MIDI clock.
+# The regex parser is the previous implementation that matched str(message), kept here as the baseline.
+# The second table is the consumer loop of the router's queue: a message at a time with the polling
+# get_message() (the previous loop) and in batches with the blocking drain(), for the full queue and idle.
+# Run from the src folder: python tests/bench_midi_parser.py
+
+NOTE_CNT = 2000
+CONTROLLERS_PER_NOTE = [0, 8, 32]
+REPEAT_CNT = 5
+IDLE_S = 1.0
+
+NOTE_ON_RE = r"^(note_on) (channel=)(?P<channel>[0-9]{1,2}) (note=)(?P<note>[0-9]{1,3}) (velocity=)(?P<velocity>[0-9]{1,3})"
+NOTE_OFF_RE = r"^(note_off) (channel=)(?P<channel>[0-9]{1,2}) (note=)(?P<note>[0-9]{1,3}) (velocity=)(?P<velocity>[0-9]{1,3})"
+
+
+class RegexParser(MIDIParser):
+    def parse(self, message):
+        if message is None:
+            return
+
+        msg = str(message)
+        n = re.search(NOTE_ON_RE, msg)
+        if n is not None:
+            note_num = int(n.group("note"))
+            self.notes.add(note_num)
+            if self.note_fn is not None:
+                self.note_fn(note_num, True)
+            return
+
+        if len(self.notes) == 0:
+            return
+
+        n = re.search(NOTE_OFF_RE, msg)
+        if n is not None:
+            note_num = int(n.group("note"))
+            self.notes.discard(note_num)
+            if self.note_fn is not None:
+                self.note_fn(note_num, False)
+
+
+def make_stream(controller_cnt):
+    # half of the notes end with note_on velocity 0, as many keyboards send them
+    rng = np.random.default_rng(0)
+    messages = []
+    for i in range(NOTE_CNT):
+        note = int(rng.integers(36, 96))
+        messages.append(Message("note_on", note=note, velocity=int(rng.integers(1, 128))))
+        for j in range(controller_cnt):
+            kind = j % 4
+            if kind == 0:
+                messages.append(Message("aftertouch", value=int(rng.integers(0, 128))))
+            elif kind == 1:
+                messages.append(Message("control_change", control=1, value=int(rng.integers(0, 128))))
+            elif kind == 2:
+                messages.append(Message("pitchwheel", pitch=int(rng.integers(-8192, 8192))))
+            else:
+                messages.append(Message("clock"))
+        if i % 2:
+            messages.append(Message("note_on", note=note, velocity=0))
+        else:
+            messages.append(Message("note_off", note=note, velocity=64))
+    return messages
+
+
+def bench(parser, messages):
+    events = []
+    parser.set_note_on_off_fn(lambda note, on: events.append(on))
+    best = None
+    for _ in range(REPEAT_CNT):
+        events.clear()
+        start = time.perf_counter()
+        for message in messages:
+            parser.parse(message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(messages) / best, events.count(False)
+
+
+def poll_loop(router, parser, active):
+    while active[0]:
+        parser.parse(router.get_message())
+
+
+def drain_loop(router, parser, active):
+    while active[0]:
+        parser.parse_batch(router.drain(timeout=GET_TIMEOUT_S))
+
+
+def bench_queue(loop, messages):
+    # the full queue, as after a burst
+    router = MIDIRouter()
+    parser = MIDIParser(enable_print=False)
+    cnt = 0
+    elapsed = 0.0
+    for start in range(0, len(messages) - MAX_MESSAGE_QUEUE_SIZE + 1, MAX_MESSAGE_QUEUE_SIZE):
+        for message in messages[start:start + MAX_MESSAGE_QUEUE_SIZE]:
+            router.put_message(message)
+        t = time.perf_counter()
+        if loop is poll_loop:
+            while router.subscriber.size():
+                parser.parse(router.get_message())
+        else:
+            while router.subscriber.size():
+                parser.parse_batch(router.drain())
+        elapsed += time.perf_counter() - t
+        cnt += MAX_MESSAGE_QUEUE_SIZE
+
+    # no messages, the CPU time of the process while the loop waits
+    active = [True]
+    thread = Thread(target=loop, args=(router, parser, active))
+    cpu = time.process_time()
+    thread.start()
+    time.sleep(IDLE_S)
+    active[0] = False
+    thread.join()
+    return cnt / elapsed, (time.process_time() - cpu) / IDLE_S
+
+
+if __name__ == "__main__":
+    print(f"{NOTE_CNT} notes, the note offs seen by the regex parser and by the typed parser")
+    print(f"{'ctrl/note':>9} {'messages':>9} {'regex msg/s':>12} {'typed msg/s':>12} {'gain':>6} {'offs':>11}")
+    for controller_cnt in CONTROLLERS_PER_NOTE:
+        messages = make_stream(controller_cnt)
+        rate_re, offs_re = bench(RegexParser(enable_print=False), messages)
+        rate, offs = bench(MIDIParser(enable_print=False), messages)
+        print(f"{controller_cnt:9d} {len(messages):9d} {rate_re:12.0f} {rate:12.0f} {rate / rate_re:6.1f} "
+              f"{offs_re:5d} {offs:5d}")
+
+    print()
+    messages = make_stream(CONTROLLERS_PER_NOTE[-1])
+    print(f"{'loop':>6} {'msg/s':>9} {'idle CPU':>9}")
+    for name, loop in [("poll", poll_loop), ("drain", drain_loop)]:
+        rate, idle = bench_queue(loop, messages)
+        print(f"{name:>6} {rate:9.0f} {idle:9.1%}")
@@ -0,0 +1,64 @@
+import sys
+import time
+from os import path
+from threading import Thread
+
+from mido import Message
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.midi_router import MIDIRouter, MIDIPort
+from audio.metrics import Histogram
+
+# Cost of the router's input callback (the forwarding to the synth and the fan-out to the subscribers)
+# for growing numbers of subscribers.  One subscriber is a slow consumer, e.g. the UI, that sleeps between
+# the drains and drops messages; the synth's output must not see it.
+# Run from the src folder: python tests/bench_midi_router.py
+
+MESSAGE_CNT = 20000
+SUBSCRIBER_CNTS = [1, 2, 4, 16]
+SLOW_CONSUMER_SLEEP_S = 0.02
+
+
+class NullPort:
+    def send(self, message):
+        pass
+
+    def close(self):
+        pass
+
+
+def bench(subscriber_cnt):
+    router = MIDIRouter()
+    router.port_out.port = NullPort()
+    subscribers = [router.subscribe() for _ in range(subscriber_cnt - 1)]
+    router.start()
+    router.enabled = True
+
+    def slow_consumer():
+        while router.enabled:
+            router.drain()
+            time.sleep(SLOW_CONSUMER_SLEEP_S)
+
+    thread = Thread(target=slow_consumer)
+    thread.start()
+
+    hist = Histogram()
+    messages = [Message("aftertouch", value=i % 128) for i in range(MESSAGE_CNT)]
+    for message in messages:
+        start = time.perf_counter()
+        router.input_message_handler(message, router.port_in)
+        hist.record(time.perf_counter() - start)
+        for subscriber in subscribers:
+            subscriber.drain()
+
+    router.enabled = False
+    thread.join()
+    return hist, router.subscriber.drop_cnt
+
+
+if __name__ == "__main__":
+    print(f"{'subscribers':>11} {'p50 us':>7} {'p99 us':>7} {'max us':>7} {'slow drops':>11}")
+    for cnt in SUBSCRIBER_CNTS:
+        hist, drops = bench(cnt)
+        print(f"{cnt:11d} {hist.percentile(50) * 1e6:7.1f} {hist.percentile(99) * 1e6:7.1f} "
+              f"{hist.max_s * 1e6:7.1f} {drops:11d}")
@@ -0,0 +1,46 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.transforms import CZT, MultiBandCZT
+from theory.notes import Note
+
+# Per-frame cost of the multi-band zoom against a CZT over the whole range, for string-set tuning.
+# Run from the src folder: python tests/bench_multiband.py
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = [3072, 4096, 8192]
+FREQ_STEP = 0.2
+GUITAR_NOTES = ["E2", "A2", "D3", "G3", "B3", "E4"]
+RANGES = {"note list": ("D2", "F#4"),     # GUITAR_NOTES widened by 2 semitones, as in CLTuner
+          "guitar range": ("D2", "E6")}   # GUITAR_RANGE widened by 2 semitones
+REPEAT_CNT = 200
+
+
+def time_per_frame(transform, frame):
+    transform.process(frame)   # warm up
+    start = time.perf_counter()
+    for _ in range(REPEAT_CNT):
+        transform.process(frame)
+    return 1000 * (time.perf_counter() - start) / REPEAT_CNT
+
+
+if __name__ == "__main__":
+    freqs = [Note.note_name_to_freq_hz(n)[0] for n in GUITAR_NOTES]
+    rng = np.random.default_rng(0)
+
+    print(f"{'samples':>8} {'transform':>20} {'bins':>7} {'ms/frame':>9} {'speedup':>8}")
+    for spf in SAMPLES_PER_FRAME:
+        frame = (0.3 * rng.standard_normal(spf)).astype(np.float32)
+        mb = MultiBandCZT(SAMPLE_RATE, samples_per_frame=spf, center_freqs=freqs, freq_step=FREQ_STEP)
+        mb_ms = time_per_frame(mb, frame)
+        print(f"{spf:8d} {'multi-band':>20} {mb.band_cnt * mb.band_bin_cnt:7d} {mb_ms:9.3f}")
+
+        for name, note_range in RANGES.items():
+            freq_range = (Note.note_name_to_freq_hz(note_range[0])[0], Note.note_name_to_freq_hz(note_range[1])[0])
+            czt = CZT(SAMPLE_RATE, samples_per_frame=spf, freq_range=freq_range, freq_step=FREQ_STEP)
+            czt_ms = time_per_frame(czt, frame)
+            print(f"{spf:8d} {'CZT ' + name:>20} {czt.Nf:7d} {czt_ms:9.3f} {czt_ms / mb_ms:7.1f}x")
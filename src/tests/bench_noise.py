@@ -0,0 +1,100 @@
+import sys
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.tuner import Tuner, NoiseTracker, GaussianPeakEstimator, HPSEstimator
+from theory.notes import Note
+
+# Note detection on a noisy stage: the noise floor measured at start against the adaptive noise tracker.
+# The stage is quiet for the first seconds (the tuner measures the noise floor), then it gets louder,
+# and the notes are played every other half second RISE_S later.
+# The noise is coloured (1/f) with a mains hum.
+# "detected" is the share of the note frames with the right note, "false" is the share of the noise frames
+# with a note, "rise" is the same right after the noise gets louder, while the tracker adapts.
+# Run from the src folder: python tests/bench_noise.py
+
+SAMPLE_RATE = 48000
+NOTE_RANGE = ("E2", "E4")
+QUIET_S = 2.0
+RISE_S = 2.0
+LOUD_S = 12.0
+NOTE_S = 0.5
+NOTE_LEVEL = 0.08
+QUIET_LEVEL = 0.005
+LOUD_LEVEL = 0.05
+HUM_HZ = 60.0
+HUM_LEVEL = 2.0   # relative to the noise
+HARMONICS = [1.0, 0.6, 0.4, 0.25]
+
+
+def make_signal(rng):
+    n = int((QUIET_S + LOUD_S) * SAMPLE_RATE)
+    # 1/f noise by shaping white noise in the frequency domain
+    spectrum = np.fft.rfft(rng.standard_normal(n))
+    spectrum[1:] /= np.sqrt(np.arange(1, len(spectrum)))
+    noise = np.fft.irfft(spectrum, n)
+    noise /= noise.std()
+    t = np.arange(n) / SAMPLE_RATE
+    noise += HUM_LEVEL * (np.sin(2 * np.pi * HUM_HZ * t) + 0.5 * np.sin(2 * np.pi * 3 * HUM_HZ * t))
+    level = np.where(t < QUIET_S, QUIET_LEVEL, LOUD_LEVEL)
+    x = level * noise
+
+    # the notes, every other NOTE_S of the loud part
+    midi_1 = Note.note_name_to_midi_number(NOTE_RANGE[0])
+    midi_2 = Note.note_name_to_midi_number(NOTE_RANGE[1])
+    truth = np.zeros(n, dtype=int)
+    start = QUIET_S + RISE_S
+    while start + NOTE_S <= QUIET_S + LOUD_S:
+        midi = int(rng.integers(midi_1, midi_2 + 1))
+        freq, _, _ = Note.midi_number_to_freq_hz(midi)
+        i1, i2 = int(start * SAMPLE_RATE), int((start + NOTE_S) * SAMPLE_RATE)
+        tt = t[i1:i2] - start
+        for h, amp in enumerate(HARMONICS, start=1):
+            x[i1:i2] += NOTE_LEVEL * amp * np.sin(2 * np.pi * h * freq * tt)
+        truth[i1:i2] = midi
+        start += 2 * NOTE_S
+    return x.astype(np.float32), truth
+
+
+def bench(samples_per_frame, estimator, noise_tracker, x, truth):
+    tuner = Tuner(None, NOTE_RANGE, samples_per_frame=samples_per_frame, freq_step=0.5,
+                  estimator=estimator, transform_type=Tuner.CZT_TRANSFORM, sample_rate=SAMPLE_RATE,
+                  noise_tracker=noise_tracker)
+    frame_cnt = len(x) // samples_per_frame
+    frames = x[:frame_cnt * samples_per_frame].reshape(frame_cnt, samples_per_frame)
+    init_cnt = int(QUIET_S * SAMPLE_RATE / samples_per_frame)
+    for frame in frames[:init_cnt]:
+        tuner._determine_noise_floor(frame)
+
+    found = {init_cnt + idx: data.midi_num for idx, data in tuner.analyze(frames[init_cnt:])}
+    note_frames = [i for i in range(init_cnt, frame_cnt)
+                   if np.all(truth[i * samples_per_frame:(i + 1) * samples_per_frame] == truth[i * samples_per_frame])]
+    notes = [i for i in note_frames if truth[i * samples_per_frame] > 0]
+    rise_cnt = int((QUIET_S + RISE_S) * SAMPLE_RATE / samples_per_frame)
+    rise = [i for i in note_frames if i < rise_cnt]
+    silent = [i for i in note_frames if i >= rise_cnt and truth[i * samples_per_frame] == 0]
+    detected = sum(found.get(i, 0) == truth[i * samples_per_frame] for i in notes) / len(notes)
+    false = sum(i in found for i in silent) / len(silent)
+    false_rise = sum(i in found for i in rise) / len(rise)
+    return detected, false, false_rise
+
+
+if __name__ == "__main__":
+    x, truth = make_signal(np.random.default_rng(0))
+    configs = [
+        (GaussianPeakEstimator, "start, 25 dB", lambda: None),
+        (GaussianPeakEstimator, "tracker, 12 dB", lambda: NoiseTracker()),
+        (GaussianPeakEstimator, "tracker, 9 dB", lambda: NoiseTracker(threshold_db=9)),
+        (GaussianPeakEstimator, "tracker, 12 dB, white", lambda: NoiseTracker(whiten=True)),
+        (HPSEstimator, "start, 25 dB", lambda: None),
+        (HPSEstimator, "tracker, 12 dB", lambda: NoiseTracker()),
+        (HPSEstimator, "tracker, 12 dB, white", lambda: NoiseTracker(whiten=True)),
+    ]
+    print(f"{'samples':>8} {'estimator':>22} {'noise floor':>22} {'detected':>9} {'false':>7} {'rise':>7}")
+    for spf in (8192, 4096, 2048, 1024):
+        for estimator_cls, name, make_tracker in configs:
+            detected, false, false_rise = bench(spf, estimator_cls(), make_tracker(), x, truth)
+            print(f"{spf:8d} {estimator_cls.__name__:>22} {name:>22} {100 * detected:8.1f}% {100 * false:6.1f}% "
+                  f"{100 * false_rise:6.1f}%")
@@ -0,0 +1,78 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.transforms import CZT
+from audio.tuner import PeakEstimator, ParabolicPeakEstimator, GaussianPeakEstimator, HPSEstimator, YINEstimator
+from theory.notes import Note
+
+# Accuracy and cost of the tuner's pitch estimators for different frame sizes.
+# Every note of the range is played slightly out of tune, with harmonics and noise.
+# Run from the src folder: python tests/bench_pitch.py
+
+SAMPLE_RATE = 48000
+NOTE_RANGE = ("E2", "E4")
+DETUNE_CENTS = 13.0
+HARMONICS = [1.0, 0.6, 0.4, 0.25, 0.15]
+NOISE_LEVEL = 0.02
+
+
+def make_tone(freq, sample_cnt, rng):
+    t = np.arange(sample_cnt) / SAMPLE_RATE
+    x = np.zeros(sample_cnt)
+    for h, amp in enumerate(HARMONICS, start=1):
+        x += amp * np.sin(2 * np.pi * h * freq * t + rng.uniform(0, 2 * np.pi))
+    x = 0.3 * x / np.max(np.abs(x)) + NOISE_LEVEL * rng.standard_normal(sample_cnt)
+    return x.astype(np.float32)
+
+
+def make_frames(sample_cnt):
+    rng = np.random.default_rng(0)
+    freqs = []
+    frames = []
+    midi_1 = Note.note_name_to_midi_number(NOTE_RANGE[0])
+    midi_2 = Note.note_name_to_midi_number(NOTE_RANGE[1])
+    for midi in range(midi_1, midi_2 + 1):
+        f0, _, _ = Note.midi_number_to_freq_hz(midi)
+        freq = f0 * 2 ** (DETUNE_CENTS / 1200)
+        freqs.append(freq)
+        frames.append(make_tone(freq, sample_cnt, rng))
+    return frames, freqs
+
+
+def bench(samples_per_frame, freq_step, estimator):
+    freq_range = (Note.note_name_to_freq_hz("D2")[0], Note.note_name_to_freq_hz("F#4")[0])
+    czt = CZT(SAMPLE_RATE, samples_per_frame=samples_per_frame, freq_step=freq_step,
+              freq_range=estimator.transform_freq_range(freq_range, SAMPLE_RATE))
+    bin_range = (czt.freq_to_bin(freq_range[0]), czt.freq_to_bin(freq_range[1]))
+    frames, freqs = make_frames(samples_per_frame)
+
+    start = time.perf_counter()
+    mean_error, max_error = estimator.accuracy(frames, freqs, czt, bin_range)
+    frame_ms = 1000 * (time.perf_counter() - start) / len(frames)
+    return mean_error, max_error, estimator.cost_ms(), frame_ms
+
+
+if __name__ == "__main__":
+    configs = [
+        (32768, 0.1, PeakEstimator),
+        (8192, 0.1, PeakEstimator),
+        (8192, 1.0, PeakEstimator),
+        (8192, 1.0, ParabolicPeakEstimator),
+        (8192, 1.0, GaussianPeakEstimator),
+        (8192, 1.0, HPSEstimator),
+        (8192, 1.0, YINEstimator),
+        (4096, 1.0, GaussianPeakEstimator),
+        (4096, 1.0, HPSEstimator),
+        (4096, 1.0, YINEstimator),
+    ]
+
+    print(f"{'samples':>8} {'step Hz':>8} {'estimator':>24} {'mean ct':>8} {'max ct':>8} "
+          f"{'est. ms':>8} {'frame ms':>9} {'latency ms':>11}")
+    for spf, step, estimator_cls in configs:
+        mean_err, max_err, est_ms, frame_ms = bench(spf, step, estimator_cls())
+        print(f"{spf:8d} {step:8.2f} {estimator_cls.__name__:>24} {mean_err:8.2f} {max_err:8.2f} "
+              f"{est_ms:8.3f} {frame_ms:9.3f} {1000 * spf / SAMPLE_RATE:11.1f}")
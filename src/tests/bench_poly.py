@@ -0,0 +1,95 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.transforms import CZT
+from audio.tuner import HarmonicSieve
+from theory import Chord
+from theory.notes import Note
+
+# Polyphonic detection of strummed guitar chords: chord names, pitch classes and the cost per frame.
+# Every string is slightly out of tune, with decaying harmonics, random amplitude and phase, and noise.
+# Run from the src folder: python tests/bench_poly.py
+
+SAMPLE_RATE = 48000
+NOTE_RANGE = ("D2", "A4")
+HARMONIC_CNT = 8
+HARMONIC_DECAY = 0.8
+DETUNE_CENTS = 8.0
+NOISE_LEVEL = 0.005
+REPEAT_CNT = 5
+
+# open and barre chord voicings, MIDI numbers from the low string up
+CHORDS = {
+    "E":   [40, 47, 52, 56, 59, 64],
+    "Em":  [40, 47, 52, 55, 59, 64],
+    "E7":  [40, 47, 50, 56, 59, 64],
+    "A":   [45, 52, 57, 61, 64],
+    "Am":  [45, 52, 57, 60, 64],
+    "D":   [50, 57, 62, 66],
+    "Dm":  [50, 57, 62, 65],
+    "G":   [43, 47, 50, 55, 59, 67],
+    "G7":  [43, 47, 50, 55, 59, 65],
+    "C":   [48, 52, 55, 60, 64],
+    "CM7": [48, 52, 55, 59, 64],
+    "F":   [41, 48, 53, 57, 60, 65],
+    "Bm":  [47, 54, 59, 62, 66],
+    "B7":  [47, 51, 57, 59, 66],
+}
+
+
+def make_chord(midi_nums, sample_cnt, rng):
+    t = np.arange(sample_cnt) / SAMPLE_RATE
+    x = np.zeros(sample_cnt)
+    for midi in midi_nums:
+        f0, _, _ = Note.midi_number_to_freq_hz(midi)
+        freq = f0 * 2 ** (rng.uniform(-DETUNE_CENTS, DETUNE_CENTS) / 1200)
+        amp = rng.uniform(0.6, 1.0)
+        for h in range(1, HARMONIC_CNT + 1):
+            x += amp * HARMONIC_DECAY ** (h - 1) * np.sin(2 * np.pi * h * freq * t + rng.uniform(0, 2 * np.pi))
+    x = 0.3 * x / np.max(np.abs(x)) + NOISE_LEVEL * rng.standard_normal(sample_cnt)
+    return x.astype(np.float32)
+
+
+def bench(samples_per_frame, freq_step):
+    rng = np.random.default_rng(0)
+    sieve = HarmonicSieve()
+    freq_range = (Note.note_name_to_freq_hz(NOTE_RANGE[0])[0], Note.note_name_to_freq_hz(NOTE_RANGE[1])[0])
+    czt = CZT(SAMPLE_RATE, samples_per_frame=samples_per_frame, freq_step=freq_step, window=True,
+              freq_range=sieve.transform_freq_range(freq_range, SAMPLE_RATE))
+    bin_range = (czt.freq_to_bin(freq_range[0]), czt.freq_to_bin(freq_range[1]))
+
+    named = 0
+    found = 0
+    missed = 0
+    extra = 0
+    total_s = 0.0
+    for name, midi_nums in CHORDS.items():
+        expected = set(m % 12 for m in midi_nums)
+        for _ in range(REPEAT_CNT):
+            frame = make_chord(midi_nums, samples_per_frame, rng)
+            start = time.perf_counter()
+            notes = sieve.detect(czt.process(frame), czt, bin_range)
+            total_s += time.perf_counter() - start
+
+            detected = set(m % 12 for m in notes)
+            named += HarmonicSieve.chord_name(notes) == Chord(name).name()
+            found += len(detected & expected)
+            missed += len(expected - detected)
+            extra += len(detected - expected)
+
+    frame_cnt = len(CHORDS) * REPEAT_CNT
+    return named / frame_cnt, found / (found + missed), found / (found + extra), 1000 * total_s / frame_cnt, czt.Nf
+
+
+if __name__ == "__main__":
+    print(f"{'samples':>8} {'step Hz':>8} {'bins':>6} {'chords':>7} {'recall':>7} {'precision':>10} "
+          f"{'ms/frame':>9} {'frame ms':>9} {'load':>6}")
+    for spf, step in [(4096, 1.0), (8192, 1.0), (8192, 0.5), (16384, 1.0)]:
+        chords, recall, precision, ms, bins = bench(spf, step)
+        frame_ms = 1000 * spf / SAMPLE_RATE
+        print(f"{spf:8d} {step:8.2f} {bins:6d} {chords:7.0%} {recall:7.0%} {precision:10.0%} "
+              f"{ms:9.3f} {frame_ms:9.1f} {ms / frame_ms:6.1%}")
@@ -0,0 +1,74 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.transforms import Transform, STFT, CZT
+from theory.notes import Note
+
+# Accuracy report of the single precision transforms against the double precision ones.
+# For every note in the range the peak bin of both transforms is compared.
+# The single precision is faster with NumPy 2 only.  The older NumPy computes the FFT in complex128,
+# the single precision transforms only add the casts and ms/frame goes up.
+# Run from the src folder: python tests/bench_precision.py
+
+SAMPLE_RATE = 48000
+NOTE_RANGE = ("E2", "D6")
+NOISE_LEVEL = 0.05
+REPEAT_CNT = 50
+
+
+def make_frame(freq, sample_cnt, rng):
+    t = np.arange(sample_cnt) / SAMPLE_RATE
+    x = 0.5 * np.sin(2 * np.pi * freq * t) + NOISE_LEVEL * rng.standard_normal(sample_cnt)
+    return x.astype(np.float32)
+
+
+def time_per_frame(transform, frame):
+    transform.process(frame)
+    start = time.perf_counter()
+    for _ in range(REPEAT_CNT):
+        transform.process(frame)
+    return (time.perf_counter() - start) / REPEAT_CNT
+
+
+def report(name, make_transform, sample_cnt, feed_cnt=1):
+    rng = np.random.default_rng(0)
+    midi_1 = Note.note_name_to_midi_number(NOTE_RANGE[0])
+    midi_2 = Note.note_name_to_midi_number(NOTE_RANGE[1])
+
+    bin_errors = []
+    mag_errors = []
+    for midi in range(midi_1, midi_2 + 1):
+        freq, _, _ = Note.midi_number_to_freq_hz(midi)
+        frame = make_frame(freq, sample_cnt, rng)
+
+        t64 = make_transform(Transform.PRECISION_DOUBLE)
+        t32 = make_transform(Transform.PRECISION_SINGLE)
+        for _ in range(feed_cnt):
+            s64 = np.array(t64.process(frame))
+            s32 = np.array(t32.process(frame))
+
+        bin_errors.append(abs(int(s64.argmax()) - int(s32.argmax())))
+        mag_errors.append(np.max(np.abs(s64 - s32)) / np.max(s64))
+
+    frame = make_frame(440.0, sample_cnt, rng)
+    ms64 = time_per_frame(make_transform(Transform.PRECISION_DOUBLE), frame) * 1000
+    ms32 = time_per_frame(make_transform(Transform.PRECISION_SINGLE), frame) * 1000
+
+    print(f"{name:28} notes: {len(bin_errors):3d}  peak bin mismatches: {np.count_nonzero(bin_errors):3d}  "
+          f"max bin error: {max(bin_errors):2d}  max rel. magnitude error: {max(mag_errors):.2e}  "
+          f"ms/frame: {ms64:7.3f} -> {ms32:7.3f}")
+
+
+if __name__ == "__main__":
+    freq_range = (Note.note_name_to_freq_hz("D2")[0], Note.note_name_to_freq_hz("E6")[0])
+
+    for spf in [2048, 8192]:
+        report(f"CZT {spf} samples, 0.1 Hz",
+               lambda p: CZT(SAMPLE_RATE, spf, freq_range=freq_range, freq_step=0.1, precision=p), spf)
+
+    report("STFT 2048 x 16 samples",
+           lambda p: STFT(SAMPLE_RATE, samples_per_frame=2048, frames_per_fft=16, precision=p), 2048, feed_cnt=16)
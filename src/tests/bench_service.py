@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.tuner_service import TunerService
+
+# Throughput of the tuner service for different channel and worker counts.
+# Every channel gets FRAME_CNT frames of a tone as fast as the workers take them.
+# "realtime" is how many times faster than the audio the service keeps up with all the channels,
+# a value under 1 means the channels cannot be tuned live with that many workers.
+# Run from the src folder: python tests/bench_service.py
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = 2048
+NOTE_RANGE = ("E2", "E6")
+CHANNEL_CNTS = [1, 2, 4, 8, 16]
+FRAME_CNT = 40
+
+
+class CountingService(TunerService):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reading_cnt = 0
+
+    def on_update(self, channel, data):
+        self.reading_cnt += 1
+
+
+def bench(channel_cnt, worker_cnt, multiprocess):
+    service = CountingService(NOTE_RANGE, sample_rate=SAMPLE_RATE, channel_cnt=channel_cnt,
+                              samples_per_frame=SAMPLES_PER_FRAME, worker_cnt=worker_cnt,
+                              multiprocess=multiprocess, max_queue_len=FRAME_CNT + 1)
+    t = np.arange(SAMPLES_PER_FRAME) / SAMPLE_RATE
+    frames = [(0.3 * np.sin(2 * np.pi * 110.0 * (1 + channel / 12) * t)).astype(np.float32)
+              for channel in range(channel_cnt)]
+
+    service.start()
+    # the plans are computed in the workers, the first frame of every channel is not timed
+    for channel in range(channel_cnt):
+        service.submit(channel, frames[channel])
+    while service.reading_cnt < channel_cnt:
+        time.sleep(0.001)
+
+    start = time.perf_counter()
+    for _ in range(FRAME_CNT):
+        for channel in range(channel_cnt):
+            service.submit(channel, frames[channel])
+    while service.reading_cnt < channel_cnt * (FRAME_CNT + 1):
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    service.stop()
+
+    frame_s = SAMPLES_PER_FRAME / SAMPLE_RATE
+    return channel_cnt * FRAME_CNT / elapsed, FRAME_CNT * frame_s / elapsed
+
+
+if __name__ == "__main__":
+    cpu_cnt = os.cpu_count() or 1
+    worker_cnts = sorted({1, 2, cpu_cnt})
+    print(f"CPUs: {cpu_cnt}")
+    print(f"{'workers':>8} {'mode':>8} {'channels':>9} {'frames/s':>9} {'realtime':>9}")
+    for multiprocess in (True, False):
+        for worker_cnt in worker_cnts:
+            for channel_cnt in CHANNEL_CNTS:
+                fps, realtime = bench(channel_cnt, worker_cnt, multiprocess)
+                mode = "process" if multiprocess else "thread"
+                print(f"{worker_cnt:8d} {mode:>8} {channel_cnt:9d} {fps:9.0f} {realtime:9.1f}")
@@ -0,0 +1,40 @@
+import sys
+import time
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.transforms import STFT
+
+# Per-frame cost of the STFT with the shifted buffer and with the ring buffer
+# for growing averaging windows.
+# Run from the src folder: python tests/bench_stft.py
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = 2048
+FRAMES_PER_FFT = [4, 8, 16, 32, 64]
+REPEAT_CNT = 50
+
+
+def bench_stft(frames_per_fft, ring_buffer):
+    rng = np.random.default_rng(0)
+    frame = (0.5 * rng.standard_normal(SAMPLES_PER_FRAME)).astype(np.float32)
+    stft = STFT(SAMPLE_RATE, samples_per_frame=SAMPLES_PER_FRAME, frames_per_fft=frames_per_fft,
+                ring_buffer=ring_buffer)
+
+    for _ in range(frames_per_fft):
+        stft.process(frame)   # fill the buffer
+    start = time.perf_counter()
+    for _ in range(REPEAT_CNT):
+        stft.process(frame)
+    return (time.perf_counter() - start) / REPEAT_CNT
+
+
+if __name__ == "__main__":
+    budget = SAMPLES_PER_FRAME / SAMPLE_RATE
+    print(f"{'frames':>7} {'samples':>8} {'shift ms':>9} {'ring ms':>8} {'budget ms':>10}")
+    for cnt in FRAMES_PER_FFT:
+        t_shift = bench_stft(cnt, ring_buffer=False)
+        t_ring = bench_stft(cnt, ring_buffer=True)
+        print(f"{cnt:7d} {cnt * SAMPLES_PER_FRAME:8d} {t_shift * 1000:9.3f} {t_ring * 1000:8.3f} {budget * 1000:10.2f}")
@@ -0,0 +1,86 @@
+import gc
+import sys
+import time
+import tracemalloc
+from os import path
+
+import numpy as np
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from audio.signals import SignalGenerator
+from audio.tuner import Tuner, ParabolicPeakEstimator, HPSEstimator
+
+# Speed and accuracy of the tuner's transform configurations on synthetic instrument signals:
+# every note of the range with harmonics, inharmonicity, vibrato and noise, see SignalGenerator.
+# The frames go through Tuner._process(), the same path as the frames of the input device.
+# The frames before the analysis window is full are not scored.
+# hops/s is the processing rate, x rt is that rate relative to the real time, MiB is the peak of the NumPy
+# and Python allocations of a tuner (the transform's buffers and temporaries).
+# A frame is correct within 50 cents of the played note, the cents columns are the errors of the correct frames.
+# Run from the src folder: python tests/bench_transforms.py
+
+SAMPLE_RATE = 48000
+NOTE_RANGE = ("E2", "E6")
+NOTE_S = 1.0
+VIBRATO_CENTS = [0.0, 15.0]
+CONFIGS = [
+    # name, window, Tuner parameters
+    ("STFT 2048x16", 2048 * Tuner.FRAMES_PER_FFT,
+     dict(transform_type=Tuner.STFT_TRANSFORM, samples_per_frame=2048)),
+    ("CZT 8192", 8192, dict(transform_type=Tuner.CZT_TRANSFORM, samples_per_frame=8192, freq_step=0.5)),
+    ("CZT 8192 parabolic", 8192, dict(transform_type=Tuner.CZT_TRANSFORM, samples_per_frame=8192, freq_step=0.5,
+                                      estimator=ParabolicPeakEstimator())),
+    ("CZT 8192 HPS", 8192, dict(transform_type=Tuner.CZT_TRANSFORM, samples_per_frame=8192, freq_step=0.5,
+                                estimator=HPSEstimator())),
+    ("CZT 12288 hop 2048", 12288, dict(transform_type=Tuner.CZT_TRANSFORM, samples_per_frame=12288, freq_step=0.2,
+                                       hop_size=2048)),
+    ("YIN 1024", 1024, dict(transform_type=Tuner.YIN_TRANSFORM, samples_per_frame=1024)),
+]
+
+
+def bench(kwargs, window, generator):
+    generator.reset()
+    errors = []
+    scored_cnt = 0
+    hop_cnt = 0
+    elapsed = 0.0
+    peak = 0
+
+    tracemalloc.start()
+    for _, freq, x in generator.notes(NOTE_RANGE, NOTE_S):
+        # the tuner of the previous note is in a reference cycle (the metrics counters)
+        gc.collect()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        tuner = Tuner(None, NOTE_RANGE, sample_rate=SAMPLE_RATE, **kwargs)
+        hop_size = tuner.hop_size
+        frames = list(SignalGenerator.frames(x, hop_size))
+        start = time.perf_counter()
+        for idx, frame in enumerate(frames):
+            found = tuner._process(frame)
+            if (idx + 1) * hop_size < window:
+                continue
+            scored_cnt += 1
+            if found:
+                errors.append(SignalGenerator.cents(tuner.data.curr_freq, freq))
+        elapsed += time.perf_counter() - start
+        hop_cnt += len(frames)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    errors = np.abs(np.array(errors))
+    correct = errors[errors < 50]
+    hops_per_s = hop_cnt / elapsed
+    return (hops_per_s, hops_per_s * hop_size / SAMPLE_RATE, peak / 2 ** 20, len(correct) / scored_cnt,
+            np.median(correct), np.percentile(correct, 95))
+
+
+if __name__ == "__main__":
+    for vibrato in VIBRATO_CENTS:
+        generator = SignalGenerator(SAMPLE_RATE, vibrato_cents=vibrato)
+        print(f"{NOTE_RANGE[0]}..{NOTE_RANGE[1]}, vibrato {vibrato:g} cents, inharmonicity {generator.inharmonicity:g}")
+        print(f"{'config':>20} {'hops/s':>8} {'x rt':>6} {'MiB':>6} {'correct':>8} {'median c':>9} {'p95 c':>6}")
+        for name, window, kwargs in CONFIGS:
+            hops_per_s, rt, mib, correct, median, p95 = bench(kwargs, window, generator)
+            print(f"{name:>20} {hops_per_s:8.0f} {rt:6.0f} {mib:6.1f} {correct:8.1%} {median:9.2f} {p95:6.2f}")
+        print()
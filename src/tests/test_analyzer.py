@@ -0,0 +1,81 @@
+import os
+import wave
+import unittest
+import tempfile
+import numpy as np
+from audio.analyzer import AudioFileReader, Analyzer
+
+SAMPLE_RATE = 48000
+
+
+def write_wav(path, x, sample_width=2, channel_cnt=1):
+    x = np.repeat(x[:, np.newaxis], channel_cnt, axis=1)
+    if sample_width == 3:
+        data = np.frombuffer((x * 8388607).astype("<i4").tobytes(), dtype=np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        data = (x * 32767).astype("<i2").tobytes()
+
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channel_cnt)
+        f.setsampwidth(sample_width)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(data)
+
+
+def tone(freq, sample_cnt):
+    t = np.arange(sample_cnt) / SAMPLE_RATE
+    return 0.4 * np.sin(2 * np.pi * freq * t)
+
+
+class TestAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_reader_24_bit_stereo(self):
+        path = os.path.join(self.folder.name, "stereo.wav")
+        x = tone(440.0, 5000)
+        write_wav(path, x, sample_width=3, channel_cnt=2)
+
+        with AudioFileReader(path) as reader:
+            self.assertEqual(reader.sample_rate, SAMPLE_RATE)
+            frames = list(reader.frames(1024, start_frame=1))
+        self.assertEqual(len(frames), 3)
+        np.testing.assert_allclose(frames[0], x[1024:2048], atol=1e-6)
+
+    def test_chunks(self):
+        path = os.path.join(self.folder.name, "a2.wav")
+        write_wav(path, tone(110.0 * 2 ** (15 / 1200), 8192 * 10))
+
+        analyzer = Analyzer(("E2", "E4"), samples_per_frame=8192, freq_step=0.2, chunk_s=0.5, process_cnt=1)
+        self.assertEqual([task[1:] for task in analyzer.tasks([path])], [(0, 2), (2, 2), (4, 2), (6, 2), (8, 2)])
+
+        rows = analyzer.analyze([path])
+        self.assertEqual([row["frame"] for row in rows], list(range(10)))
+        for row in rows:
+            self.assertEqual(row["note"], "A2")
+            self.assertAlmostEqual(row["cents"], 15.0, delta=2.0)
+
+        csv_path = os.path.join(self.folder.name, "out.csv")
+        Analyzer.write(rows, csv_path)
+        with open(csv_path) as f:
+            self.assertEqual(len(f.readlines()), 11)
+
+    def test_noise(self):
+        # the silence and the room tone make no rows, the note after them does
+        rng = np.random.default_rng(0)
+        noise = 1e-3 * rng.standard_normal(8192 * 12)
+        path = os.path.join(self.folder.name, "noise.wav")
+        write_wav(path, np.concatenate([np.zeros(8192 * 2), noise, tone(110.0, 8192 * 3) + noise[:8192 * 3]]))
+
+        analyzer = Analyzer(("E2", "E4"), samples_per_frame=8192, freq_step=0.2, chunk_s=None, noise_s=1.0,
+                            process_cnt=1)
+        rows = analyzer.analyze([path])
+        self.assertEqual([row["frame"] for row in rows], [14, 15, 16])
+        self.assertEqual({row["note"] for row in rows}, {"A2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
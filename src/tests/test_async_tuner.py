@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+from unittest import mock
+from threading import Thread, Event
+import numpy as np
+from audio import input_device
+from audio.input_device import InputDevice
+from audio.async_tuner import AsyncTuner
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = 4096
+
+
+class ToneDevice(InputDevice):
+    """
+    Plays a tone through the device callback, a frame every few ms.
+    """
+    def __init__(self, freq, frame_s=0.005):
+        super().__init__(None, channel_cnt=1, samples_per_frame=SAMPLES_PER_FRAME, queue_data=False,
+                         max_queue_len=0, multiprocess=False)
+        t = np.arange(SAMPLES_PER_FRAME) / SAMPLE_RATE
+        self.frame = (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32).reshape(-1, 1)
+        self.frame_s = frame_s
+
+    def _main_loop(self):
+        while not self._stop_event.wait(self.frame_s):
+            self._callback_fn(self.frame, SAMPLES_PER_FRAME, 0, 0)
+
+
+class ToneStream:
+    """
+    Stands in for sounddevice.InputStream, calls back from its own thread as the stream does.
+    """
+    def __init__(self, callback, blocksize, **kwargs):
+        self.callback = callback
+        t = np.arange(blocksize) / SAMPLE_RATE
+        self.frame = (0.3 * np.sin(2 * np.pi * 110.0 * t)).astype(np.float32).reshape(-1, 1)
+        self._stop_event = Event()
+        self._thread = Thread(target=self._run)
+
+    def _run(self):
+        while not self._stop_event.wait(0.005):
+            self.callback(self.frame, len(self.frame), None, 0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop_event.set()
+        self._thread.join()
+
+
+async def read(tuner, cnt):
+    readings = []
+    async for data in tuner.readings():
+        readings.append(data)
+        if len(readings) == cnt:
+            break
+    return readings
+
+
+class TestAsyncTuner(unittest.TestCase):
+    def test_shared_loop(self):
+        tuners = [AsyncTuner(None, ("E2", "E4"), samples_per_frame=SAMPLES_PER_FRAME, input_device=ToneDevice(freq))
+                  for freq in (110.0, 146.83)]
+        for tuner in tuners:
+            # the tone is not a noise floor
+            tuner.init_time_s = 0.0
+
+        async def main():
+            return await asyncio.wait_for(asyncio.gather(*[read(tuner, 3) for tuner in tuners]), 10.0)
+
+        results = asyncio.run(main())
+        for readings, note in zip(results, ("A₂", "D₃")):
+            self.assertEqual([data.note for data in readings], [note] * 3)
+            self.assertTrue(all(data.latency_s >= 0 for data in readings))
+            self.assertIsNone(readings[0].samples)
+
+        # leaving the loop stops the device
+        for tuner in tuners:
+            self.assertFalse(tuner.input_device._thread.is_alive())
+
+    def test_backpressure(self):
+        tuner = AsyncTuner(None, ("E2", "E4"), samples_per_frame=SAMPLES_PER_FRAME, max_queue_len=2,
+                           input_device=ToneDevice(110.0, frame_s=0.001))
+        tuner.init_time_s = 0.0
+
+        async def main():
+            readings = []
+            async for data in tuner.readings():
+                readings.append(data)
+                # a slow consumer
+                await asyncio.sleep(0.05)
+                if len(readings) == 3:
+                    break
+            return readings
+
+        readings = asyncio.run(main())
+        self.assertEqual(len(readings), 3)
+        self.assertLessEqual(max(data.queue_size for data in readings), 2)
+        self.assertGreater(tuner.errors.queue, 0)
+
+    def test_default_device(self):
+        # the tuner opens the sound device, the frames reach the event loop of this process
+        with mock.patch.object(input_device.sd, "query_devices", create=True,
+                               return_value={"default_samplerate": SAMPLE_RATE}), \
+                mock.patch.object(input_device.sd, "InputStream", ToneStream, create=True):
+            tuner = AsyncTuner(0, ("E2", "E4"), samples_per_frame=SAMPLES_PER_FRAME)
+            tuner.init_time_s = 0.0
+            self.assertFalse(tuner.input_device._multiprocess)
+
+            readings = asyncio.run(asyncio.wait_for(read(tuner, 3), 5.0))
+        self.assertEqual([data.note for data in readings], ["A₂"] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
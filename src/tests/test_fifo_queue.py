@@ -0,0 +1,58 @@
+import time
+import unittest
+from threading import Timer
+from multiprocessing import Process
+import numpy as np
+from audio.fifo_queue import FIFOQueue, SharedRingBuffer
+
+
+def fill(queue, cnt):
+    for i in range(cnt):
+        queue.put(np.full((256, 2), i, dtype=np.float32))
+
+
+class TestSharedRingBuffer(unittest.TestCase):
+    def test_overrun(self):
+        ring = SharedRingBuffer((256, 2), max_len=3)
+        fill(ring, 5)
+        self.assertEqual(ring.size(), 3)
+        self.assertEqual(ring.overrun_cnt, 2)
+
+        # the view of the last frame is not overwritten by the next put
+        frame = ring.get()
+        fill(ring, 1)
+        self.assertTrue(np.all(frame == 0))
+        self.assertEqual([ring.get()[0, 0] for _ in range(3)], [1, 2, 0])
+        self.assertIsNone(ring.get())
+        ring.close()
+
+    def test_other_process(self):
+        queue = FIFOQueue(multiprocess=True, max_len=4, frame_shape=(256, 2))
+        p = Process(target=fill, args=(queue, 6))
+        p.start()
+        p.join()
+
+        # the overruns are counted in the producer process and seen here
+        self.assertEqual(queue.size(), 4)
+        self.assertEqual(queue.overrun_cnt, 2)
+        self.assertEqual([queue.get()[0, 0] for _ in range(4)], [0, 1, 2, 3])
+
+
+class TestFIFOQueue(unittest.TestCase):
+    def test_blocking_get(self):
+        for multiprocess, frame_shape in ((False, None), (True, None), (True, (256, 2))):
+            queue = FIFOQueue(multiprocess=multiprocess, max_len=4, frame_shape=frame_shape)
+            start = time.monotonic()
+            self.assertIsNone(queue.get(timeout=0.05))
+            self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+            # the put wakes up the waiting get
+            Timer(0.05, fill, args=(queue, 1)).start()
+            frame = queue.get(timeout=5.0)
+            self.assertIsNotNone(frame)
+            self.assertLess(time.monotonic() - queue.timestamp, 1.0)
+            self.assertGreaterEqual(queue.timestamp, start)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import time
+import unittest
+import tempfile
+import numpy as np
+from audio.input_device import InputDevice, GeneratorInputDevice, FileInputDevice
+from audio.signals import SignalGenerator
+from audio.tuner import Tuner
+
+SAMPLES_PER_FRAME = 256
+
+
+def interleaved(channel_cnt, offset=0):
+    # channel c of sample i is offset + 10 * c + i
+    x = np.arange(SAMPLES_PER_FRAME, dtype=np.float32)[:, np.newaxis] + 10 * np.arange(channel_cnt) + offset
+    return x.astype(np.float32)
+
+
+def device(multiprocess=False, **kwargs):
+    return InputDevice(None, channel_cnt=4, samples_per_frame=SAMPLES_PER_FRAME, queue_data=True,
+                       max_queue_len=3, multiprocess=multiprocess, **kwargs)
+
+
+class TestInputDevice(unittest.TestCase):
+    def test_deinterleave(self):
+        for multiprocess in (False, True):
+            dev = device(multiprocess)
+            data = interleaved(4, offset=1)
+            dev._callback_fn(data, SAMPLES_PER_FRAME, 0, 0)
+            frame = dev.get_data()
+            self.assertEqual(frame.shape, (4, SAMPLES_PER_FRAME))
+            self.assertTrue(frame[2].flags.c_contiguous)
+            np.testing.assert_array_equal(frame, data.T)
+
+    def test_channels(self):
+        dev = device(channels=[3, 1])
+        data = interleaved(4, offset=1)
+        dev._callback_fn(data.tobytes(), SAMPLES_PER_FRAME, 0, 0)   # PyAudio passes the bytes
+        np.testing.assert_array_equal(dev.get_data(), data[:, [3, 1]].T)
+
+        dev.set_channels([0, 1, 2], downmix=True)
+        dev._callback_fn(data, SAMPLES_PER_FRAME, 0, 0)
+        frame = dev.get_data()
+        self.assertEqual(frame.shape, (1, SAMPLES_PER_FRAME))
+        np.testing.assert_allclose(frame[0], data[:, :3].mean(axis=1))
+
+    def test_preallocated(self):
+        dev = device()
+        frames = []
+        for i in range(10):
+            dev._callback_fn(interleaved(4, offset=i + 1), SAMPLES_PER_FRAME, 0, 0)
+            frames.append(dev.get_data())
+            self.assertTrue(any(frames[-1] is buffer for buffer in dev._buffers))
+
+        # the queue keeps the newest frames, the frames are not overwritten until the next get()
+        for i in range(5):
+            dev._callback_fn(interleaved(4, offset=i + 1), SAMPLES_PER_FRAME, 0, 0)
+        frame = dev.get_data()
+        self.assertEqual(frame[0, 0], 3)
+        for i in range(5, 10):
+            dev._callback_fn(interleaved(4, offset=i + 1), SAMPLES_PER_FRAME, 0, 0)
+        self.assertEqual(frame[0, 0], 3)
+        self.assertEqual(dev.queue_error_cnt, 6)
+
+
+class TestGeneratorInputDevice(unittest.TestCase):
+    def test_throughput(self):
+        # the chunks are cut into frames, the incomplete frame at the end is not delivered
+        x = np.arange(10 * SAMPLES_PER_FRAME + 100, dtype=np.float32) + 1
+        chunks = [x[:100], x[100:1000], x[1000:]]
+        dev = GeneratorInputDevice(chunks, samples_per_frame=SAMPLES_PER_FRAME, max_queue_len=20,
+                                   speed=GeneratorInputDevice.THROUGHPUT)
+        dev.start()
+        self.assertTrue(dev.wait(5.0))
+        dev.stop()
+
+        self.assertEqual(dev.queue_size(), 10)
+        for i in range(10):
+            np.testing.assert_array_equal(dev.get_data()[0], x[i * SAMPLES_PER_FRAME:(i + 1) * SAMPLES_PER_FRAME])
+
+    def test_tuner(self):
+        # the tuner runs in real time on the frames of a file
+        gen = SignalGenerator(48000, detune_cents=0.0)
+        _, x = gen.note(57, 48000)   # A3, 1 s
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a3.wav")
+            gen.write_wav(path, x)
+            dev = FileInputDevice(path, samples_per_frame=2048, speed=2.0)
+
+            tuner = Tuner(None, ("E2", "E4"), samples_per_frame=8192, freq_step=0.5, input_device=dev, hop_size=2048)
+            init_time_s = Tuner.INIT_TIME_S
+            Tuner.INIT_TIME_S = 0
+            try:
+                start = time.monotonic()
+                tuner.start()
+                self.assertTrue(dev.wait(5.0))
+                elapsed = time.monotonic() - start
+                tuner.stop()
+            finally:
+                Tuner.INIT_TIME_S = init_time_s
+
+        self.assertGreater(elapsed, 0.4)   # 23 frames of 2048 samples at twice the real time
+        self.assertEqual(tuner.data.note, "A₃")
+        self.assertGreater(tuner.frame_cnt, 15)
+
+    def test_tuner_channel(self):
+        # two strings on two channels, each tuner analyzes its own channel
+        gen = SignalGenerator(48000, detune_cents=0.0)
+        _, a2 = gen.note(45, 48000)
+        _, e3 = gen.note(52, 48000)
+        source = [np.stack([a2, e3], axis=1)]
+
+        notes = []
+        init_time_s = Tuner.INIT_TIME_S
+        Tuner.INIT_TIME_S = 0
+        try:
+            for channel in (0, 1):
+                dev = GeneratorInputDevice(source, channel_cnt=2, samples_per_frame=2048, max_queue_len=30,
+                                           speed=GeneratorInputDevice.THROUGHPUT)
+                tuner = Tuner(None, ("E2", "E4"), samples_per_frame=8192, freq_step=0.5, input_device=dev,
+                              hop_size=2048, channel=channel)
+                tuner.start()
+                self.assertTrue(dev.wait(5.0))
+                while dev.queue_size() > 0:
+                    time.sleep(0.01)
+                tuner.stop()
+                notes.append(tuner.data.note)
+        finally:
+            Tuner.INIT_TIME_S = init_time_s
+
+        self.assertEqual(notes, ["A₂", "E₃"])
+
+
+if __name__ == "__main__":
+    unittest.main()
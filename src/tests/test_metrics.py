@@ -0,0 +1,93 @@
+import os
+import json
+import unittest
+import tempfile
+from unittest import mock
+from pathlib import Path
+from threading import Thread
+import numpy as np
+from audio.metrics import Histogram, Metrics, JSONLinesSink, PrometheusSink
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        values = np.random.default_rng(0).lognormal(np.log(0.002), 1.0, 20000)
+        hist = Histogram()
+        for value in values:
+            hist.record(value)
+
+        self.assertEqual(hist.count, len(values))
+        self.assertAlmostEqual(hist.mean_s, values.mean(), delta=1e-9)
+        self.assertEqual(hist.max_s, values.max())
+        ordered = np.sort(values)
+        for p in (50, 90, 99, 99.9):
+            # the inverted CDF, as np.percentile(method="inverted_cdf") of NumPy 1.22
+            expected = ordered[int(np.ceil(p / 100 * len(values))) - 1]
+            # the bucket's upper bound, within 1% plus a microsecond
+            self.assertAlmostEqual(hist.percentile(p), expected, delta=0.01 * expected + 1e-6)
+
+    def test_resolution(self):
+        # the bucket's upper bound is within 1% from the microseconds to the minutes
+        for value in (1.5e-6, 7.3e-6, 0.0123, 45.6):
+            hist = Histogram()
+            hist.record(value)
+            hist.record(2 * value)
+            self.assertGreaterEqual(hist.percentile(50), value)
+            self.assertLess(hist.percentile(50), 1.01 * value)
+
+    def test_merge(self):
+        h1, h2 = Histogram(), Histogram()
+        h1.record(0.001)
+        h2.record(0.003)
+        h2.record(100.0)
+        h1.merge(h2)
+        self.assertEqual(h1.count, 3)
+        self.assertEqual((h1.min_s, h1.max_s), (0.001, 100.0))
+        self.assertEqual(h1.percentile(100), 100.0)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_sinks(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = Path(path)
+            metrics = Metrics([JSONLinesSink(path / "metrics.jsonl"), PrometheusSink(path / "metrics.prom")])
+            metrics.counter("frames_dropped", lambda: 3)
+            for value in (0.001, 0.002, 0.004):
+                metrics.record("queue_dwell_s", value)
+            metrics.export()
+            metrics.export()
+
+            lines = (path / "metrics.jsonl").read_text().splitlines()
+            self.assertEqual(len(lines), 2)
+            snapshot = json.loads(lines[-1])
+            self.assertEqual(snapshot["counters"]["frames_dropped"], 3)
+            self.assertEqual(snapshot["histograms"]["queue_dwell_s"]["count"], 3)
+
+            prom = (path / "metrics.prom").read_text()
+            self.assertIn("music_audio_frames_dropped_total 3\n", prom)
+            self.assertIn('music_audio_queue_dwell_seconds{quantile="0.5"} 0.002', prom)
+            self.assertIn("music_audio_queue_dwell_seconds_count 3\n", prom)
+
+    def test_write_error(self):
+        with tempfile.TemporaryDirectory() as path:
+            metrics = Metrics([PrometheusSink(Path(path) / "metrics.prom")])
+            metrics.record("latency_s", 0.001)
+            with mock.patch("audio.metrics.os.replace", side_effect=OSError("No space left on device")):
+                metrics.export()
+            self.assertEqual(os.listdir(path), [])
+
+    def test_threads(self):
+        # the records of the threads are not lost
+        metrics = Metrics()
+        threads = [Thread(target=lambda: [metrics.record("latency_s", 0.001) for _ in range(10000)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.histogram("latency_s").count, 40000)
+        self.assertEqual(metrics.histogram("latency_s").counts.sum(), 40000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from mido import Message
+from audio.midi_filter import MIDIFilter
+
+
+class TestMIDIFilter(unittest.TestCase):
+    def test_types(self):
+        f = MIDIFilter.make(["aftertouch", "clock"])
+        note = Message("note_on", note=60, velocity=90)
+        self.assertIs(f(note), note)
+        self.assertIsNone(f(Message("aftertouch", value=10)))
+        self.assertIsNone(f(Message("clock")))
+        self.assertIs(MIDIFilter.make(f), f)
+        self.assertIsNone(MIDIFilter.make(None))
+
+    def test_compiled(self):
+        f = MIDIFilter(skip_types=["aftertouch"], channels=[0, 1], note_range=(48, 72), min_velocity=20,
+                       transpose=12, channel_map={1: 9})
+        note = Message("note_on", channel=1, note=60, velocity=90)
+        out = f(note)
+        self.assertEqual((out.channel, out.note, out.velocity), (9, 72, 90))
+        self.assertEqual((note.channel, note.note), (1, 60))   # the message is not changed in place
+
+        self.assertIsNone(f(Message("note_on", channel=2, note=60, velocity=90)))   # channel
+        self.assertIsNone(f(Message("note_on", note=47, velocity=90)))              # range
+        self.assertIsNone(f(Message("note_on", note=60, velocity=10)))              # soft
+        self.assertEqual(f(Message("note_on", note=60, velocity=0)).note, 72)       # note off
+        self.assertIsNone(f(Message("aftertouch", channel=0, value=5)))
+        self.assertEqual(f(Message("control_change", channel=1, control=1, value=5)).channel, 9)
+        clock = Message("clock")
+        self.assertIs(f(clock), clock)
+
+        # the transposed note must stay in the MIDI range
+        self.assertIsNone(MIDIFilter(transpose=12)(Message("note_on", note=120, velocity=90)))
+
+
+if __name__ == "__main__":
+    unittest.main()
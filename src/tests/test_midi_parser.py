@@ -0,0 +1,55 @@
+import time
+import unittest
+from mido import Message
+from audio.midi_parser import MIDIParser
+from audio.metrics import Metrics
+
+
+class TestMIDIParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = MIDIParser(enable_print=False)
+        self.events = []
+        self.parser.set_note_on_off_fn(lambda note, on: self.events.append((note, on)))
+
+    def test_note_on_off(self):
+        for message in [Message("note_on", note=60, velocity=90), Message("control_change", control=1, value=5),
+                        Message("aftertouch", value=30), Message("note_on", note=64, velocity=80),
+                        Message("note_on", note=60, velocity=0), Message("note_off", note=64, velocity=64),
+                        Message("note_off", note=67, velocity=64), None]:
+            self.parser.parse(message)
+
+        # velocity 0 is note off, the off of a note that is not held is passed on
+        self.assertEqual(self.events, [(60, True), (64, True), (60, False), (64, False), (67, False)])
+        self.assertEqual(self.parser.notes, set())
+
+    def test_channels(self):
+        self.parser.parse(Message("note_on", channel=0, note=60, velocity=90))
+        self.parser.parse(Message("note_on", channel=9, note=60, velocity=90))
+        self.parser.parse(Message("note_off", channel=0, note=60))
+        self.assertEqual(self.parser.notes, {60})
+        self.assertEqual(self.parser.channel_notes[9], {60})
+
+        self.parser.parse(Message("note_off", channel=9, note=60))
+        self.assertEqual(self.parser.notes, set())
+        self.assertEqual(self.events, [(60, True), (60, True), (60, False), (60, False)])
+
+    def test_latency(self):
+        metrics = Metrics()
+        self.parser.metrics = metrics
+        self.parser.set_note_on_off_fn(lambda note, on: self.events.append(self.parser.timestamp))
+        now = time.monotonic()
+        self.parser.parse_timestamped([(now - 0.010, Message("note_on", note=60, velocity=90)),
+                                       (now - 0.010, Message("aftertouch", value=3)),
+                                       (now - 0.004, Message("note_off", note=60))])
+
+        self.assertEqual(self.events, [now - 0.010, now - 0.004])
+        self.assertIsNone(self.parser.timestamp)
+        hist = metrics.histogram("midi_note_s")
+        self.assertEqual(hist.count, 2)
+        self.assertGreaterEqual(hist.min_s, 0.004)
+        self.assertAlmostEqual(metrics.histogram("midi_jitter_s").max_s, 0.006, delta=0.002)
+        self.assertGreater(self.parser.jitter_s, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
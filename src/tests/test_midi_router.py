@@ -0,0 +1,95 @@
+import time
+import unittest
+from threading import Thread
+from mido import Message
+from audio.midi_router import MIDIRouter, MIDIPort
+from audio.metrics import Metrics
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+    def close(self):
+        pass
+
+
+class TestMIDIRouter(unittest.TestCase):
+    def test_drain(self):
+        router = MIDIRouter()
+        for note in range(60, 70):
+            router.put_message(Message("note_on", note=note))
+
+        self.assertEqual([m.note for m in router.drain(max_n=4)], [60, 61, 62, 63])
+        self.assertEqual(len(router.drain(timeout=0.1)), 6)
+
+        start = time.monotonic()
+        self.assertEqual(router.drain(timeout=0.05), [])
+        self.assertGreater(time.monotonic() - start, 0.04)
+
+    def test_iter(self):
+        router = MIDIRouter()
+        router.put_message(Message("note_on", note=60))
+        self.assertEqual([m.note for m in router.iter_messages(timeout=0.05)], [60])
+
+        # stop() ends the blocking iteration
+        notes = []
+        thread = Thread(target=lambda: notes.extend(m.note for m in router))
+        thread.start()
+        router.put_message(Message("note_on", note=61))
+        time.sleep(0.05)
+        router.stop()
+        thread.join(1.0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(notes, [61])
+
+        # the consumer loop of AudioSupport keeps waiting after stop()
+        start = time.monotonic()
+        for _ in range(5):
+            self.assertEqual(router.drain_timestamped(timeout=0.01), [])
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_routes(self):
+        router = MIDIRouter(message_filter=["aftertouch"])
+        router.port_out.port = Recorder()
+        synth = router.port_out.port
+        other = router.add_output(MIDIPort("other", port=Recorder()))
+        port_in_2 = MIDIPort("in 2")
+        router.route(port_in_2, [other])
+        ui = router.subscribe(max_len=2, message_filter=["clock"])
+        router.enabled = True
+
+        messages = [Message("note_on", note=60), Message("aftertouch", value=3), Message("clock"),
+                    Message("note_off", note=60)]
+        for message in messages:
+            router.input_message_handler(message, router.port_in)
+        router.input_message_handler(Message("note_on", note=72), port_in_2)
+
+        # the first input goes to all the outputs, every output and subscriber has its own filter
+        self.assertEqual([m.type for m in synth.messages], ["note_on", "clock", "note_off"])
+        self.assertEqual(len(other.port.messages), 5)
+        # the slow subscriber keeps the newest messages, the default subscriber is not affected
+        self.assertEqual([m.type for m in ui.drain()], ["note_off", "note_on"])
+        self.assertEqual(ui.drop_cnt, 2)
+        self.assertEqual(len(router.drain()), 5)
+        self.assertEqual(router.drop_cnt, 2)
+
+    def test_timestamps(self):
+        metrics = Metrics()
+        router = MIDIRouter(metrics=metrics)
+        router.port_out.port = Recorder()
+        start = time.monotonic()
+        for note in (60, 61):
+            router.put_message(Message("note_on", note=note))
+
+        items = router.drain_timestamped()
+        self.assertEqual([m.note for _, m in items], [60, 61])
+        self.assertTrue(start <= items[0][0] <= items[1][0] <= time.monotonic())
+        self.assertEqual(metrics.histogram("midi_forward_s").count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+from audio.signals import SignalGenerator
+from audio.analyzer import AudioFileReader
+from audio.tuner import Tuner, ParabolicPeakEstimator
+
+SAMPLE_RATE = 48000
+
+
+class TestSignalGenerator(unittest.TestCase):
+    def test_deterministic(self):
+        gen = SignalGenerator(SAMPLE_RATE, vibrato_cents=10.0, seed=3)
+        first = [(freq, x) for _, freq, x in gen.notes(("E2", "G2"), 0.1)]
+        gen.reset()
+        second = [(freq, x) for _, freq, x in gen.notes(("E2", "G2"), 0.1)]
+
+        self.assertEqual(len(first), 4)
+        for (f1, x1), (f2, x2) in zip(first, second):
+            self.assertEqual(f1, f2)
+            np.testing.assert_array_equal(x1, x2)
+        self.assertEqual(first[0][1].dtype, np.float32)
+        self.assertEqual(len(first[0][1]), 4800)
+
+    def test_note(self):
+        # the tuner finds the detuned fundamental of the inharmonic tone, also from the WAV file
+        gen = SignalGenerator(SAMPLE_RATE, inharmonicity=1e-3)
+        freq, x = gen.note(45, 8192)   # A2
+        self.assertLessEqual(abs(SignalGenerator.cents(freq, 110.0)), SignalGenerator.DETUNE_CENTS)
+        self.assertGreater(gen.partial_freqs(freq)[5], 6 * freq)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a2.wav")
+            gen.write_wav(path, x)
+            with AudioFileReader(path) as reader:
+                frame = next(reader.frames(8192))
+
+        tuner = Tuner(None, ("E2", "E4"), samples_per_frame=8192, freq_step=0.5, sample_rate=SAMPLE_RATE,
+                      estimator=ParabolicPeakEstimator())
+        self.assertTrue(tuner._process(frame))
+        self.assertLess(abs(SignalGenerator.cents(tuner.data.curr_freq, freq)), 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
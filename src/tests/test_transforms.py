@@ -0,0 +1,238 @@
+import os
+import unittest
+import tempfile
+from unittest import mock
+import numpy as np
+from audio.transforms import Transform, STFT, CZT, MultiBandCZT, YIN
+from audio.plan_cache import PlanCache
+
+SAMPLE_RATE = 48000
+
+
+def sine(freq, sample_cnt, sample_rate=SAMPLE_RATE):
+    t = np.arange(sample_cnt) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+class TestCZT(unittest.TestCase):
+    def test_czt_matches_dft(self):
+        czt = CZT(SAMPLE_RATE, samples_per_frame=256, freq_range=(100, 400), freq_step=5)
+        x = sine(220, 256).astype(np.float64)
+
+        # direct evaluation of the z-transform on the same frequency points
+        z = czt.A * czt.W ** -czt.M
+        expected = np.array([np.sum(x * zk ** -czt.N) for zk in z])
+        np.testing.assert_allclose(czt.czt(x), expected, rtol=1e-6, atol=1e-6)
+
+    def test_process_matches_czt(self):
+        czt = CZT(SAMPLE_RATE, samples_per_frame=2048, freq_range=(65, 250), freq_step=0.5)
+        x = sine(110, 2048)
+        np.testing.assert_allclose(czt.process(x), np.abs(czt.czt(x)), rtol=1e-9, atol=1e-9)
+
+    def test_peak(self):
+        czt = CZT(SAMPLE_RATE, samples_per_frame=4096, freq_range=(65, 250), freq_step=0.1)
+        spectrum = czt.process(sine(146.83, 4096))
+        self.assertAlmostEqual(czt.bin_to_freq(spectrum.argmax()), 146.83, delta=0.2)
+
+    def test_single_precision(self):
+        czt64 = CZT(SAMPLE_RATE, samples_per_frame=4096, freq_range=(65, 250), freq_step=0.1)
+        czt32 = CZT(SAMPLE_RATE, samples_per_frame=4096, freq_range=(65, 250), freq_step=0.1,
+                    precision=Transform.PRECISION_SINGLE)
+        x = sine(196.0, 4096)
+        s64 = czt64.process(x)
+        s32 = czt32.process(x)
+        self.assertEqual(s32.dtype, np.float32)
+        self.assertEqual(s32.argmax(), s64.argmax())
+        np.testing.assert_allclose(s32, s64, atol=1e-4 * s64.max())
+
+    def test_process_batch(self):
+        czt = CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5)
+        frames = [sine(f, 1024) for f in (82.4, 110.0, 146.8)]
+        spectra = czt.process_batch(np.stack(frames))
+        self.assertEqual(spectra.shape, (3, czt.Nf))
+        for spectrum, frame in zip(spectra, frames):
+            np.testing.assert_allclose(spectrum, czt.process(frame), rtol=1e-9, atol=1e-9)
+
+    def test_hop(self):
+        czt = CZT(SAMPLE_RATE, samples_per_frame=4096, freq_range=(65, 250), freq_step=0.5)
+        hop = CZT(SAMPLE_RATE, samples_per_frame=4096, freq_range=(65, 250), freq_step=0.5, hop_size=1536)
+        x = sine(110.0, 1536 * 8) + sine(175.0, 1536 * 8)
+        for i in range(8):
+            spectrum = hop.process(x[i*1536:(i+1)*1536])
+            # the window is the last 4096 samples, zeros before the first hop
+            window = np.concatenate((np.zeros(4096, dtype=np.float32), x[:(i+1)*1536]))[-4096:]
+            np.testing.assert_allclose(spectrum, czt.process(window), rtol=1e-9, atol=1e-9)
+
+        batch = CZT(SAMPLE_RATE, samples_per_frame=4096, freq_range=(65, 250), freq_step=0.5, hop_size=1536)
+        batch.process(x[:1536])
+        spectra = batch.process_batch(x[1536:].reshape(7, 1536))
+        np.testing.assert_allclose(spectra[-1], spectrum, rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(batch.process(x[:1536]), hop.process(x[:1536]), rtol=1e-9, atol=1e-9)
+
+
+class TestMultiBandCZT(unittest.TestCase):
+    GUITAR_FREQS = [82.41, 110.0, 146.83, 196.0, 246.94, 329.63]
+
+    def test_matches_dtft(self):
+        mb = MultiBandCZT(SAMPLE_RATE, samples_per_frame=4096, center_freqs=self.GUITAR_FREQS, freq_step=0.2)
+        x = sine(111.3, 4096) + 0.6 * sine(222.6, 4096) + 0.4 * sine(333.9, 4096)
+        spectrum = mb.process(x)
+        self.assertEqual(len(spectrum), mb.band_cnt * mb.band_bin_cnt)
+
+        # direct evaluation of the windowed frame's spectrum on the band frequencies
+        band = mb.freq_to_band(111.3)
+        freqs = mb.band_starts[band] + mb.freq_step * np.arange(mb.band_bin_cnt)
+        t = np.arange(4096) / SAMPLE_RATE
+        expected = np.abs(np.exp(-2j * np.pi * np.outer(freqs, t)) @ (x * mb.window))
+        actual = spectrum[band * mb.band_bin_cnt:(band + 1) * mb.band_bin_cnt]
+        np.testing.assert_allclose(actual, expected, atol=0.02 * expected.max())
+        self.assertLessEqual(abs(int(actual.argmax()) - int(expected.argmax())), 1)
+
+    def test_peak(self):
+        mb = MultiBandCZT(SAMPLE_RATE, samples_per_frame=3072, center_freqs=self.GUITAR_FREQS, freq_step=0.2)
+        for freq in self.GUITAR_FREQS:
+            spectrum = mb.process(sine(freq * 1.004, 3072))
+            peak_bin = spectrum.argmax()
+            self.assertAlmostEqual(mb.bin_to_freq(peak_bin), freq * 1.004, delta=0.2)
+            self.assertEqual(peak_bin // mb.band_bin_cnt, self.GUITAR_FREQS.index(freq))
+            self.assertEqual(mb.freq_to_bin(mb.bin_to_freq(peak_bin)), peak_bin)
+
+    def test_hop(self):
+        mb = MultiBandCZT(SAMPLE_RATE, samples_per_frame=3072, center_freqs=self.GUITAR_FREQS, freq_step=0.2)
+        hop = MultiBandCZT(SAMPLE_RATE, samples_per_frame=3072, center_freqs=self.GUITAR_FREQS, freq_step=0.2,
+                           hop_size=1024)
+        x = sine(146.83, 1024 * 5)
+        for i in range(5):
+            spectrum = hop.process(x[i*1024:(i+1)*1024])
+        np.testing.assert_allclose(spectrum, mb.process(x[-3072:]), rtol=1e-6, atol=1e-9)
+
+
+class TestPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = CZT.plan_cache
+        CZT.plan_cache = PlanCache()
+
+    def tearDown(self):
+        CZT.plan_cache = self.cache
+
+    def test_shared_plan(self):
+        czt1 = CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5)
+        czt2 = CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5)
+        self.assertIs(czt1.C, czt2.C)
+        self.assertEqual(CZT.plan_cache.miss_cnt, 1)
+        self.assertEqual(CZT.plan_cache.hit_cnt, 1)
+
+        czt3 = CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5,
+                   precision=Transform.PRECISION_SINGLE)
+        self.assertEqual(czt3.C.dtype, np.complex64)
+        self.assertEqual(CZT.plan_cache.miss_cnt, 2)
+
+    def test_disk_store(self):
+        x = sine(110.0, 1024)
+        with tempfile.TemporaryDirectory() as path:
+            CZT.plan_cache.set_path(path)
+            expected = np.array(CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5).process(x))
+
+            # a new process starts with an empty in-process cache
+            CZT.plan_cache = PlanCache(path=path)
+            czt = CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5)
+            self.assertEqual(CZT.plan_cache.disk_hit_cnt, 1)
+            self.assertEqual(CZT.plan_cache.miss_cnt, 0)
+            np.testing.assert_allclose(czt.process(x), expected, rtol=1e-12)
+
+            # the plans of an older plan format are not loaded
+            CZT.plan_cache = PlanCache(path=path)
+            CZT.plan_cache.PLAN_VERSION = PlanCache.PLAN_VERSION + 1
+            CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5)
+            self.assertEqual(CZT.plan_cache.disk_hit_cnt, 0)
+            self.assertEqual(CZT.plan_cache.miss_cnt, 1)
+
+    def test_disk_error(self):
+        with tempfile.TemporaryDirectory() as path:
+            CZT.plan_cache.set_path(path)
+            with mock.patch("audio.plan_cache.np.savez", side_effect=OSError("No space left on device")):
+                CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=0.5)
+            self.assertEqual(os.listdir(path), [])
+
+    def test_lru(self):
+        CZT.plan_cache.max_len = 2
+        for step in (0.5, 1.0, 2.0):
+            CZT(SAMPLE_RATE, samples_per_frame=1024, freq_range=(65, 250), freq_step=step)
+        self.assertEqual(len(CZT.plan_cache), 2)
+
+
+class TestSTFT(unittest.TestCase):
+    def test_single_precision(self):
+        stft64 = STFT(SAMPLE_RATE, samples_per_frame=1024, frames_per_fft=4)
+        stft32 = STFT(SAMPLE_RATE, samples_per_frame=1024, frames_per_fft=4, precision=Transform.PRECISION_SINGLE)
+        x = sine(440.0, 4096)
+        for i in range(4):
+            s64 = stft64.process(x[i*1024:(i+1)*1024])
+            s32 = stft32.process(x[i*1024:(i+1)*1024])
+        self.assertEqual(s32.dtype, np.float32)
+        self.assertEqual(s32.argmax(), s64.argmax())
+        np.testing.assert_allclose(s32, s64, atol=1e-4 * s64.max())
+
+    def test_ring_buffer(self):
+        stft = STFT(SAMPLE_RATE, samples_per_frame=512, frames_per_fft=4)
+        ring = STFT(SAMPLE_RATE, samples_per_frame=512, frames_per_fft=4, ring_buffer=True)
+        x = sine(330.0, 512 * 11) + sine(1000.0, 512 * 11)
+        for i in range(11):
+            frame = x[i*512:(i+1)*512]
+            np.testing.assert_allclose(ring.process(frame), stft.process(frame), rtol=1e-9, atol=1e-9)
+
+        self.assertIsNone(ring.process(None))
+        self.assertIsNone(stft.process(None))
+        np.testing.assert_allclose(ring.process(x[:512]), stft.process(x[:512]), rtol=1e-9, atol=1e-9)
+
+    def test_process_batch(self):
+        x = sine(330.0, 512 * 9) + sine(1000.0, 512 * 9)
+        frames = x.reshape(9, 512)
+        for ring_buffer in (False, True):
+            stft = STFT(SAMPLE_RATE, samples_per_frame=512, frames_per_fft=4, ring_buffer=ring_buffer)
+            batch = STFT(SAMPLE_RATE, samples_per_frame=512, frames_per_fft=4, ring_buffer=ring_buffer)
+            expected = [np.array(stft.process(frame)) for frame in frames]
+
+            # the batch starts in the middle of the warm up and continues after it
+            spectra = np.concatenate((batch.process_batch(frames[:2]), batch.process_batch(list(frames[2:7])),
+                                      [batch.process(frames[7])], batch.process_batch(frames[8:])))
+            np.testing.assert_allclose(spectra, expected, rtol=1e-9, atol=1e-9)
+
+
+class TestYIN(unittest.TestCase):
+    def test_difference_is_incremental(self):
+        hop = 256
+        yin = YIN(SAMPLE_RATE, samples_per_frame=hop, freq_range=(70, 400), window_size=1000)
+        rng = np.random.default_rng(0)
+        x = rng.standard_normal(hop * 12).astype(np.float32)
+        for i in range(12):
+            yin.process(x[i*hop:(i+1)*hop])
+
+        # the window starts delay_cnt + block_cnt hops before the end
+        start = (12 - yin.delay_cnt - yin.block_cnt) * hop
+        segment = x[start:start + yin.window_size + yin.max_lag + 1]
+        expected = YIN.difference(segment, yin.max_lag + 1)
+        np.testing.assert_allclose(yin.blocks.sum(axis=0), expected, rtol=1e-6, atol=1e-6)
+
+    def test_low_note(self):
+        hop = 512
+        yin = YIN(SAMPLE_RATE, samples_per_frame=hop, freq_range=(70, 400))
+        t = np.arange(hop * 8) / SAMPLE_RATE
+        x = (0.3 * np.sin(2 * np.pi * 82.41 * t) + 0.2 * np.sin(2 * np.pi * 164.82 * t)).astype(np.float32)
+
+        # the window is full after (block_cnt + delay_cnt) hops, under 50 ms for E2
+        ready = yin.block_cnt + yin.delay_cnt
+        self.assertLess(ready * hop / SAMPLE_RATE, 0.05)
+        for i in range(ready):
+            salience = yin.process(x[i*hop:(i+1)*hop])
+        self.assertAlmostEqual(yin.bin_to_freq(salience.argmax()), 82.41, delta=82.41 * 0.01)
+
+    def test_silence(self):
+        yin = YIN(SAMPLE_RATE, samples_per_frame=512, freq_range=(70, 400))
+        for _ in range(6):
+            salience = yin.process(np.zeros(512, dtype=np.float32))
+        self.assertEqual(salience.max(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import numpy as np
+from audio.transforms import CZT
+from audio.tuner import PeakEstimator, ParabolicPeakEstimator, GaussianPeakEstimator, HPSEstimator, YINEstimator
+from audio.tuner import HarmonicSieve, NoiseTracker
+from theory import Note
+
+SAMPLE_RATE = 48000
+FREQ_RANGE = (70.0, 400.0)
+
+
+def tone(freq, sample_cnt, harmonics=(1.0,)):
+    t = np.arange(sample_cnt) / SAMPLE_RATE
+    x = sum(amp * np.sin(2 * np.pi * h * freq * t) for h, amp in enumerate(harmonics, start=1))
+    return (0.3 * x).astype(np.float32)
+
+
+def estimate(estimator, frame, freq_step=1.0):
+    czt = CZT(SAMPLE_RATE, samples_per_frame=len(frame), freq_step=freq_step,
+              freq_range=estimator.transform_freq_range(FREQ_RANGE, SAMPLE_RATE))
+    bin_range = (czt.freq_to_bin(FREQ_RANGE[0]), czt.freq_to_bin(FREQ_RANGE[1]))
+    return estimator.estimate(czt.process(frame), frame, czt, bin_range)
+
+
+class TestPitchEstimators(unittest.TestCase):
+    def test_peak(self):
+        self.assertAlmostEqual(estimate(PeakEstimator(), tone(110.4, 8192)), 110.4, delta=1.0)
+
+    def test_interpolation(self):
+        for estimator in (ParabolicPeakEstimator(), GaussianPeakEstimator()):
+            self.assertAlmostEqual(estimate(estimator, tone(110.4, 8192)), 110.4, delta=0.05)
+            self.assertEqual(estimator.frame_cnt, 1)
+            self.assertGreater(estimator.cost_ms(), 0.0)
+
+    def test_hps_strong_overtone(self):
+        frame = tone(98.0, 8192, harmonics=(0.4, 1.0, 0.8))
+        self.assertAlmostEqual(estimate(PeakEstimator(), frame), 196.0, delta=1.0)
+        self.assertAlmostEqual(estimate(HPSEstimator(), frame), 98.0, delta=0.5)
+
+    def test_yin(self):
+        frame = tone(82.41, 4096, harmonics=(1.0, 0.5, 0.3))
+        self.assertAlmostEqual(estimate(YINEstimator(), frame), 82.41, delta=0.1)
+
+    def test_accuracy(self):
+        estimator = GaussianPeakEstimator()
+        czt = CZT(SAMPLE_RATE, samples_per_frame=8192, freq_range=FREQ_RANGE, freq_step=1.0)
+        bin_range = (0, czt.Nf)
+        frames = [tone(f, 8192) for f in (100.0, 200.0)]
+        mean_error, max_error = estimator.accuracy(frames, [100.0, 200.0], czt, bin_range)
+        self.assertLess(max_error, 1.0)
+        self.assertLessEqual(mean_error, max_error)
+
+
+class TestHarmonicSieve(unittest.TestCase):
+    def test_detect_chord(self):
+        sieve = HarmonicSieve()
+        freq_range = (70.0, 500.0)
+        czt = CZT(SAMPLE_RATE, samples_per_frame=8192, freq_step=1.0, window=True,
+                  freq_range=sieve.transform_freq_range(freq_range, SAMPLE_RATE))
+        bin_range = (czt.freq_to_bin(freq_range[0]), czt.freq_to_bin(freq_range[1]))
+
+        # C major: C3 E3 G3 C4 with harmonics, G3 is also the 3rd harmonic of C3
+        midi_nums = [48, 52, 55, 60]
+        frame = sum(tone(Note.midi_number_to_freq_hz(m)[0], 8192, harmonics=(1.0, 0.6, 0.4, 0.3)) for m in midi_nums)
+        notes = sieve.detect(czt.process(frame), czt, bin_range)
+        self.assertEqual(notes, midi_nums)
+        self.assertEqual(HarmonicSieve.chord_name(notes), "C")
+
+    def test_chord_name(self):
+        self.assertEqual(HarmonicSieve.chord_name([40, 47, 52, 56, 59, 64]), "E")    # open E, doubled notes
+        self.assertEqual(HarmonicSieve.chord_name([45, 52, 57, 60, 64]), "Am")
+        self.assertEqual(HarmonicSieve.chord_name([52, 55, 60]), "C/E")
+        self.assertIsNone(HarmonicSieve.chord_name([45, 57]))
+
+
+class TestNoiseTracker(unittest.TestCase):
+    def test_tracking(self):
+        rng = np.random.default_rng(0)
+        czt = CZT(SAMPLE_RATE, samples_per_frame=2048, freq_step=1.0, freq_range=FREQ_RANGE)
+        tracker = NoiseTracker()
+        tracker.reset(2048 / SAMPLE_RATE)
+        frame_cnt = int(tracker.window_s * SAMPLE_RATE / 2048)
+
+        def run(level, cnt, freq=None):
+            for _ in range(cnt):
+                x = level * rng.standard_normal(2048).astype(np.float32)
+                if freq is not None:
+                    x += tone(freq, 2048)
+                spectrum = czt.process(x)
+                noise = tracker.update(spectrum)
+            return spectrum, np.array(noise)
+
+        _, quiet = run(0.01, 2 * frame_cnt)
+        # a note shorter than the window does not raise the noise
+        spectrum, noise = run(0.01, frame_cnt // 2, freq=110.0)
+        peak = czt.freq_to_bin(110.0)
+        self.assertGreater(spectrum[peak] / noise[peak], 100)
+        self.assertLess(noise[peak], 2 * quiet[peak])
+
+        # the stage gets louder
+        _, loud = run(0.1, 2 * frame_cnt)
+        self.assertAlmostEqual(np.median(loud / quiet), 10.0, delta=3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import time
+import unittest
+import numpy as np
+from audio.tuner_service import TunerService
+
+SAMPLE_RATE = 48000
+SAMPLES_PER_FRAME = 4096
+
+
+def tone(freq):
+    t = np.arange(SAMPLES_PER_FRAME) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+class TestTunerService(unittest.TestCase):
+    FREQS = [82.41, 110.0, 146.83, 196.0, 246.94]
+    NOTES = ["E₂", "A₂", "D₃", "G₃", "B₃"]
+
+    def run_service(self, multiprocess):
+        service = TunerService(("E2", "E4"), sample_rate=SAMPLE_RATE, channel_cnt=len(self.FREQS),
+                               samples_per_frame=SAMPLES_PER_FRAME, worker_cnt=2, multiprocess=multiprocess)
+        self.assertEqual(service.worker_cnt, 2)
+        service.start()
+        for channel, freq in enumerate(self.FREQS):
+            self.assertTrue(service.submit(channel, tone(freq)))
+
+        deadline = time.monotonic() + 10.0
+        while len(service.readings) < len(self.FREQS) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        service.stop()
+
+        self.assertEqual([service.readings[channel].note for channel in range(len(self.FREQS))], self.NOTES)
+        self.assertEqual(service.frame_error_cnt, 0)
+
+    def test_threads(self):
+        self.run_service(multiprocess=False)
+
+    def test_processes(self):
+        self.run_service(multiprocess=True)
+
+
+if __name__ == "__main__":
+    unittest.main()